@@ -1,18 +1,21 @@
 import time
 import os
 import json
-import threading
+import hashlib
 import tempfile
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask import (
     Flask, Response,
     jsonify, render_template, stream_with_context, send_from_directory,
-    request, session
+    send_file, abort, request, session
 )
-import io
-import zipfile
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
+from services.jobs import JobStore, start_workers, JOB_WORKERS, JOB_DATA_DIR, JOB_HEARTBEAT_SECONDS, JOB_STALE_SECONDS
+from services.workspaces import Workspace
+from services.answer_key import ANSWER_KEY_NAME
 
 # Initialize App
 app = Flask(__name__)
@@ -24,11 +27,102 @@ CORS(app)
 # Storage
 login_activity = {}
 otp_store = {}
-audio_tasks = {}
 
 AUDIO_TEMP_DIR = os.path.join("static", "generated_audio")
 os.makedirs(AUDIO_TEMP_DIR, exist_ok=True)
 
+# ----------------- Jobs -----------------
+# Generation, audio, regeneration and marking run as durable jobs in worker processes (services/jobs.py).
+# The workers load and warm up the heavy models; the web process only queues jobs and reports on them.
+job_store = JobStore()
+JOB_MAX_ATTEMPTS = {"generate": 2, "regenerate": 2, "audio": 3, "marking": 2}
+WARM_UP = os.getenv("WARM_UP", "1") == "1"
+# A progress stream ends with an error after this many seconds, or once no worker has been alive for JOB_STALE_SECONDS
+JOB_STREAM_TIMEOUT = float(os.getenv("JOB_STREAM_TIMEOUT", 1800))
+
+# Worker processes re-import this module as __mp_main__, they must not start workers of their own
+if JOB_WORKERS > 0 and __name__ != "__mp_main__":
+    start_workers(JOB_WORKERS, warm_up=WARM_UP)
+
+# Streamed responses keep the app context until the stream ends, so the connection outlives them
+@app.teardown_appcontext
+def close_job_store(exception=None):
+    job_store.close()
+
+def enqueue_job(kind, payload):
+    return job_store.enqueue(kind, payload, max_attempts=JOB_MAX_ATTEMPTS.get(kind, 3))
+
+def job_summary(job):
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "progress": job["progress"],
+        "result": job["result"] if job["status"] == "completed" else None,
+        "error": job["error"],
+        "created": job["created"],
+        "updated": job["updated"]
+    }
+
+@app.route("/api/jobs/<job_id>")
+def get_job(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_summary(job))
+
+# Ready once every live worker has loaded the resources of the jobs it runs
+@app.route("/api/ready")
+def readiness():
+    workers = job_store.live_workers()
+    ready_workers = [w for w in workers if w["resources"] and all(r["state"] == "ready" for r in w["resources"].values())]
+    ready = bool(workers) and len(ready_workers) == len(workers)
+    resources = {}
+    for worker in workers:
+        for name, state in worker["resources"].items():
+            if name not in resources or state["state"] != "ready":
+                resources[name] = state
+    body = {"ready": ready, "workers": len(workers), "resources": resources}
+    return jsonify(body), (200 if ready else 503)
+
+# ----------------- Workspaces -----------------
+# Each generation works in its own directory (services/workspaces.py), named after its job.
+# Requests pick it by ?job=<id> (or "job" in a JSON body), otherwise the session's latest generation.
+def current_workspace(job_id=None):
+    job_id = job_id or request.args.get("job") or session.get('generation_job')
+    try:
+        workspace = Workspace(job_id) if job_id else None
+    except ValueError:
+        abort(404)
+    return workspace if workspace and workspace.exists() else None
+
+# Audio of the current workspace, or the shared directory of older generations
+def current_audio_dir(job_id=None):
+    workspace = current_workspace(job_id)
+    return workspace.audio_dir if workspace else AUDIO_TEMP_DIR
+
+# Questions of the latest generation: session, then the workspace (which has regenerated parts), then the temp file
+def latest_generated_questions(job_id=None):
+    if session.get('generated_questions'):
+        return session['generated_questions']
+    workspace = current_workspace(job_id)
+    temp_path = workspace.questions_path if workspace else os.path.join("static", "temp", "temp_generated_questions.json")
+    if os.path.exists(temp_path):
+        with open(temp_path, "r", encoding="utf-8") as f:
+            temp_data = json.load(f)
+        return temp_data[list(temp_data.keys())[0]]
+    return None
+
+def latest_generation_setting(name):
+    if session.get(name) is not None:
+        return session.get(name)
+    job = job_store.get(session['generation_job']) if session.get('generation_job') else None
+    if job and job["status"] == "completed":
+        return job["result"].get(name)
+    return None
+
 # ----------------- Templates Routes -----------------
 @app.route("/")
 def index():
@@ -56,14 +150,9 @@ def automated_marking():
 
 # ----------------- Utility Functions -----------------
 def get_latest_set_folder():
-    base_path = os.path.join("static", "output")
-    if not os.path.exists(base_path):
-        return None
-    folders = [f for f in os.listdir(base_path) if f.startswith("set")]
-    if not folders:
-        return None
-    folders.sort(key=lambda x: int(x.replace("set", "")))
-    return os.path.join(base_path, folders[-1])
+    from services.set_index import get_set_index
+    latest = get_set_index().latest()
+    return latest["folder"] if latest else None
 
 # ----------------- Login & Auth -----------------
 @app.route("/login", methods=["POST"])
@@ -125,13 +214,9 @@ def get_config():
 
 @app.route("/api/generate-questions", methods=["POST"])
 def api_generate_questions():
-    from services.question_generator import generate_full_set, generate_specific_part
-    from services.convertion import generate_files, export_full_pdf
-    from services.audio import generate_section_audio, save_full_audio
-    from pydub import AudioSegment
-
     user_input = request.json
     generate_with_audio = user_input.get("generateWithAudio", False)
+    generation_mode = user_input.get("generationMode")
 
     section_choices = {
         "Themes": user_input.get("Themes", user_input.get("themes", ["General"])),
@@ -148,262 +233,313 @@ def api_generate_questions():
             "number_of_questions": part_data.get("number_of_questions", [])
         }
 
+    job_id = enqueue_job("generate", {
+        "section_choices": section_choices,
+        "generation_mode": generation_mode,
+        "with_audio": generate_with_audio,
+        "user_id": session.get('user_id')
+    })
+    # Stored before streaming starts, so later requests find this generation's results
+    session['generation_job'] = job_id
+    session.pop('generated_questions', None)
+    session['section_choices'] = section_choices
+    session['generation_mode'] = generation_mode
+
+    # Relays the job's progress as SSE until it completes or fails, no worker is left to run it, or it times out
     def generate_stream():
-        try:
-            yield f"data: {json.dumps({'progress': 10, 'status': 'Initializing', 'task': 'Formatting request...'})}\n\n"
-            yield f"data: {json.dumps({'progress': 20, 'status': 'Generating Questions', 'task': 'Calling AI model...'})}\n\n"
-
-            full_set_output = generate_full_set(section_choices)
-            if not full_set_output:
-                raise Exception("No questions generated.")
-
-            timestamp_key = list(full_set_output.keys())[0]
-            questions_list = full_set_output[timestamp_key]
-            if not questions_list:
-                raise Exception("Generated questions list empty.")
-
-            session['generated_questions'] = questions_list
-            session['section_choices'] = section_choices
-
-            yield f"data: {json.dumps({'progress': 50, 'status': 'Questions Generated', 'task': f'Generated {len(questions_list)} question sets'})}\n\n"
-
-            target_set_folder = generate_files()
-
-            if generate_with_audio:
-                yield f"data: {json.dumps({'progress': 60, 'status': 'Generating Audio', 'task': 'Synthesizing voices...'})}\n\n"
-                part_audios = []
-                parts_dict = {}
-                for item in questions_list:
-                    section = item.get("Section", "")
-                    try:
-                        part_num = int(section.replace("Part", "").strip())
-                        parts_dict.setdefault(part_num, []).append(item)
-                    except:
-                        part_num = len(parts_dict) + 1
-                        parts_dict.setdefault(part_num, []).append(item)
-
-                for part_num in range(1, 5):
-                    yield f"data: {json.dumps({'progress': 60 + (part_num * 8), 'task': f'Processing Part {part_num} audio...'})}\n\n"
-                    transcript = "\n\n".join([i.get("Transcript", "") for i in parts_dict.get(part_num, [])])
-                    audio_seg = generate_section_audio(transcript, f"Part {part_num}") if transcript else AudioSegment.silent(1000)
-                    temp_part_path = os.path.join(AUDIO_TEMP_DIR, f"part_{part_num}.wav")
-                    audio_seg.export(temp_part_path, format="wav")
-                    part_audios.append(audio_seg)
-
-                if part_audios:
-                    save_full_audio(part_audios, target_set_folder)
-
-            yield f"data: {json.dumps({'progress': 100, 'success': True, 'status': 'Completed', 'task': 'Material ready!'})}\n\n"
-
-        except Exception as e:
-            print(f"Error: {e}")
-            yield f"data: {json.dumps({'progress': 0, 'error': str(e)})}\n\n"
+        yield f"data: {json.dumps({'progress': 10, 'status': 'Initializing', 'task': 'Formatting request...', 'job_id': job_id})}\n\n"
+        last_progress = None
+        started = last_worker_seen = last_worker_check = time.time()
+        while True:
+            job = job_store.get(job_id)
+            if job is None:
+                yield f"data: {json.dumps({'progress': 0, 'error': 'Generation job not found', 'job_id': job_id})}\n\n"
+                return
+            if job["progress"] and job["progress"] != last_progress:
+                last_progress = job["progress"]
+                yield f"data: {json.dumps(last_progress)}\n\n"
+
+            if job["status"] == "completed":
+                yield f"data: {json.dumps({'progress': 100, 'success': True, 'status': 'Completed', 'task': 'Material ready!', 'job_id': job_id})}\n\n"
+                return
+            if job["status"] == "failed":
+                print(f"Error: {job['error']}")
+                yield f"data: {json.dumps({'progress': 0, 'error': job['error'], 'job_id': job_id})}\n\n"
+                return
+
+            now = time.time()
+            if now - last_worker_check >= JOB_HEARTBEAT_SECONDS:
+                last_worker_check = now
+                if job_store.live_workers():
+                    last_worker_seen = now
+            if now - last_worker_seen > JOB_STALE_SECONDS:
+                error = 'No job worker is running. The generation will start once a worker is available.'
+                yield f"data: {json.dumps({'progress': 0, 'error': error, 'job_id': job_id})}\n\n"
+                return
+            if now - started > JOB_STREAM_TIMEOUT:
+                error = 'The generation is taking longer than expected, check back on it later.'
+                yield f"data: {json.dumps({'progress': 0, 'error': error, 'job_id': job_id})}\n\n"
+                return
+            time.sleep(0.25)
 
     return Response(stream_with_context(generate_stream()), mimetype='text/event-stream')
 
 # ----------------- Regenerate Part -----------------
 @app.route("/api/regenerate-part", methods=["POST"])
 def regenerate_part():
-    from services.question_generator import generate_specific_part
-    from services.audio import generate_section_audio
-    from services.convertion import export_full_pdf
-    from pydub import AudioSegment
     data = request.json
-    part_num = data.get("part")
-    new_spec = data.get("spec")
-    section_choices = session.get('section_choices')
-    updated_part_wrapper = generate_specific_part(part_num, new_spec, section_choices)
-    timestamp_key = list(updated_part_wrapper.keys())[0]
-    updated_json = updated_part_wrapper[timestamp_key][0]
-
-    audio_seg = generate_section_audio(updated_json.get("Transcript", ""), f"Part {part_num}")
-    audio_seg.export(os.path.join(AUDIO_TEMP_DIR, f"part_{part_num}.wav"), format="wav")
-
-    try:
-        temp_folder = os.path.join("static", "temp")
-        os.makedirs(temp_folder, exist_ok=True)
-        export_full_pdf(temp_folder, 0, temp_folder)
-    except Exception as e:
-        print(f"Error regenerating preview PDF: {e}")
-
-    return jsonify({"success": True, "updated_data": updated_json})
+    workspace = current_workspace(data.get("job"))
+    if workspace is None:
+        return jsonify({"success": False, "error": "No generated set to regenerate"}), 400
+    job_id = enqueue_job("regenerate", {
+        "part": data.get("part"),
+        "spec": data.get("spec"),
+        "section_choices": latest_generation_setting('section_choices'),
+        "generation_mode": data.get("mode", latest_generation_setting('generation_mode')),
+        "workspace": workspace.id
+    })
+    return jsonify({"success": True, "job_id": job_id}), 202
 
 # ----------------- Audio Generation -----------------
 @app.route("/api/generate-audio-background", methods=["POST"])
 def api_audio_background():
-    from services.audio import generate_section_audio, save_full_audio
-    from pydub import AudioSegment
-
-    task_id = datetime.now().strftime("%H%M%S")
-    audio_tasks[task_id] = "processing"
-
-    generated_questions = session.get('generated_questions')
-    if not generated_questions:
-        try:
-            temp_path = os.path.join("model", "temp", "temp_generated_questions.json")
-            if os.path.exists(temp_path):
-                with open(temp_path, "r", encoding="utf-8") as f:
-                    temp_data = json.load(f)
-                    timestamp_key = list(temp_data.keys())[0]
-                    generated_questions = temp_data[timestamp_key]
-                    session['generated_questions'] = generated_questions
-        except Exception as e:
-            print(f"Error loading questions from temp file: {e}")
-            return jsonify({"error": "No generated questions found"}), 400
+    from services.audio_stream import reset_stream
 
+    job = (request.get_json(silent=True) or {}).get("job")
+    try:
+        generated_questions = latest_generated_questions(job)
+    except Exception as e:
+        print(f"Error loading generated questions: {e}")
+        generated_questions = None
     if not generated_questions:
         return jsonify({"error": "No generated questions found"}), 400
 
-    def run_background_tts(questions, tid):
-        try:
-            part_audios = []
-            parts_dict = {}
-            for item in questions:
-                section = item.get("Section", "")
-                try:
-                    part_num = int(section.replace("Part", "").strip())
-                    parts_dict.setdefault(part_num, []).append(item)
-                except:
-                    part_num = len(parts_dict) + 1
-                    parts_dict.setdefault(part_num, []).append(item)
-
-            for part_num in range(1, 5):
-                transcript = "\n\n".join([i.get("Transcript", "") for i in parts_dict.get(part_num, [])])
-                audio_seg = generate_section_audio(transcript, f"Part {part_num}") if transcript else AudioSegment.silent(1000)
-                audio_seg.export(os.path.join(AUDIO_TEMP_DIR, f"part_{part_num}.wav"), format="wav")
-                part_audios.append(audio_seg)
-
-            if part_audios:
-                save_full_audio(part_audios, AUDIO_TEMP_DIR)
-
-            audio_tasks[tid] = "completed"
-        except Exception as e:
-            print(f"Background Audio Error: {e}")
-            audio_tasks[tid] = f"error: {str(e)}"
-
-    thread = threading.Thread(target=run_background_tts, args=(generated_questions, task_id))
-    thread.daemon = True
-    thread.start()
+    # Streams are reset before the task id is returned, so /stream_audio never serves the previous set
+    workspace = current_workspace(job)
+    audio_dir = workspace.audio_dir if workspace else AUDIO_TEMP_DIR
+    for part_num in range(1, 5):
+        reset_stream(audio_dir, part_num)
+
+    payload = {"questions": generated_questions}
+    payload.update({"workspace": workspace.id} if workspace else {"audio_dir": audio_dir})
+    task_id = enqueue_job("audio", payload)
     return jsonify({"task_id": task_id})
 
 # ----------------- Check Audio Status -----------------
 @app.route("/api/audio-task-status/<task_id>")
 def audio_task_status(task_id):
-    status = audio_tasks.get(task_id, "not_found")
+    job = job_store.get(task_id)
+    if job is None:
+        status = "not_found"
+    elif job["status"] == "completed":
+        status = "completed"
+    elif job["status"] == "failed":
+        status = f"error: {job['error']}"
+    else:
+        status = "processing"
     return jsonify({"task_id": task_id, "status": status})
 
+# Serves a WAV or one of its compressed copies, chosen by ?format= or the Accept header.
+# Responses carry a strong ETag and honour Range / If-Range, so seeking does not re-download the file.
+def send_audio(wav_path):
+    from services.audio_encoding import FORMATS, select_variant, file_etag
+
+    choice = select_variant(wav_path, request.accept_mimetypes, request.args.get("format")) if wav_path else None
+    if choice is None:
+        abort(404)
+    fmt, path = choice
+    response = send_file(os.path.abspath(path), mimetype=FORMATS[fmt]["mimetype"], etag=file_etag(path), conditional=True)
+    response.headers["Vary"] = "Accept"
+    return response
+
 @app.route("/get_audio/<int:part_num>")
 def get_audio(part_num):
-    return send_from_directory(AUDIO_TEMP_DIR, f"part_{part_num}.wav")
+    return send_audio(os.path.join(current_audio_dir(), f"part_{part_num}.wav"))
+
+@app.route("/get_set_audio/<set_name>")
+def get_set_audio(set_name):
+    return send_audio(safe_join(os.path.join("static", "output"), set_name, "full_set_audio.wav"))
+
+# Plays a part while it is still being synthesized, falls back to the finished WAV
+@app.route("/stream_audio/<int:part_num>")
+def stream_audio(part_num):
+    from services.audio_stream import stream_state, iter_part_stream
+    from services.audio import SAMPLE_RATE
+
+    audio_dir = current_audio_dir()
+    if stream_state(audio_dir, part_num) is None:
+        return send_audio(os.path.join(audio_dir, f"part_{part_num}.wav"))
+    return Response(
+        stream_with_context(iter_part_stream(audio_dir, part_num, SAMPLE_RATE)),
+        mimetype="audio/wav",
+        headers={"Cache-Control": "no-store"}
+    )
 
 # ----------------- File Download -----------------
 @app.route("/generate_pdf_preview")
 def generate_pdf_preview():
-    directory = os.path.join("static/temp")
-    return send_from_directory(directory, "full_set.pdf")
+    workspace = current_workspace()
+    directory = workspace.path if workspace else os.path.join("static/temp")
+    return send_from_directory(os.path.abspath(directory), "full_set.pdf")
+
+# Streams a zip of the entries, or serves the set's prebuilt bundle when the entries are exactly one
+def send_zip(set_folder, entries, download_name):
+    from services.bundles import matching_bundle, cached_bundle, build_bundles_in_background, iter_zip, zip_etag
+    from services.audio_encoding import file_etag
+
+    bundle = matching_bundle(set_folder, entries) if all(os.path.dirname(p) == set_folder for _, p in entries) else None
+    if bundle:
+        path = cached_bundle(set_folder, bundle)
+        if path:
+            return send_file(path, mimetype="application/zip", as_attachment=True, download_name=download_name, etag=file_etag(path), conditional=True)
+        build_bundles_in_background(set_folder)
+
+    etag = zip_etag(entries)
+    if request.method in ("GET", "HEAD") and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    response = Response(
+        stream_with_context(iter_zip(entries)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{download_name}"'}
+    )
+    response.set_etag(etag)
+    return response
 
 @app.route("/api/download-files", methods=["POST"])
 def download_files():
+    from services.bundles import DOWNLOAD_FILES
+
     try:
         data = request.get_json()
         selected_filenames = data.get("files", [])
         if not selected_filenames:
             return jsonify({"success": False, "error": "No files requested"}), 400
 
-        latest_set = get_latest_set_folder()
+        # The set and audio of the requested generation, else the newest set
+        workspace = current_workspace(data.get("job"))
+        job = job_store.get(workspace.id) if workspace else None
+        latest_set = job["result"]["set_folder"] if job and job["status"] == "completed" else get_latest_set_folder()
+        audio_dir = workspace.audio_dir if workspace else AUDIO_TEMP_DIR
         if not latest_set:
             return jsonify({"success": False, "error": "No generated set folder found"}), 400
 
-        file_mapping = {
-            "Full_Set.pdf": "full_set.pdf",
-            "Question.pdf": "questions.pdf",
-            "Question.txt": "questions.txt",
-            "Transcript.txt": "transcript.txt",
-            "Audio Part 1": "part_1.wav",
-            "Audio Part 2": "part_2.wav",
-            "Audio Part 3": "part_3.wav",
-            "Audio Part 4": "part_4.wav",
-            "Full Audio": "full_set_audio.wav"
-        }
-
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            found_any = False
-            for req in selected_filenames:
-                fname = file_mapping.get(req)
-                if not fname:
-                    continue
-                local1 = os.path.join(latest_set, fname)
-                local2 = os.path.join(AUDIO_TEMP_DIR, fname)
-                if os.path.exists(local1):
-                    zf.write(local1, arcname=fname)
-                    found_any = True
-                elif os.path.exists(local2):
-                    zf.write(local2, arcname=fname)
-                    found_any = True
-
-            if not found_any:
-                return jsonify({"success": False, "error": "No matching files found"}), 404
-
-        zip_buffer.seek(0)
-        return send_from_directory(latest_set, "full_set.zip")
+        entries = {}
+        for req in selected_filenames:
+            fname = DOWNLOAD_FILES.get(req)
+            if not fname or fname in entries:
+                continue
+            for folder in (latest_set, audio_dir):
+                if os.path.exists(os.path.join(folder, fname)):
+                    entries[fname] = os.path.join(folder, fname)
+                    break
+
+        if not entries:
+            return jsonify({"success": False, "error": "No matching files found"}), 404
+        return send_zip(latest_set, list(entries.items()), f"{os.path.basename(latest_set)}.zip")
     except Exception as e:
         print(f"Download files error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Prebuilt bundles of a set: all, pdf or audio
+@app.route("/api/download-bundle/<set_name>/<bundle>")
+def download_bundle(set_name, bundle):
+    from services.bundles import BUNDLES, bundle_entries
+    from services.set_index import get_set_index
+
+    entry = get_set_index().get_by_name(set_name)
+    if bundle not in BUNDLES or entry is None:
+        abort(404)
+    set_folder = entry["folder"]
+    entries = bundle_entries(set_folder, bundle)
+    if not entries:
+        abort(404)
+    return send_zip(set_folder, entries, f"{set_name}_{bundle}.zip")
+
 # ----------------- History -----------------
+# Served from the set index a page at a time: ?limit=, ?cursor= (the previous page's next_cursor),
+# ?user= ("me" for the logged-in user), ?theme=, ?from= / ?to= (dates, inclusive).
+# The ETag changes only when a set is added or updated, so unchanged pages are answered with 304.
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+def parse_history_date(value, end=False):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    # A bare date covers the whole day
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.timestamp()
+
 @app.route("/api/get-history")
 def get_user_history():
+    from services.set_index import get_set_index
+
     try:
-        base = os.path.join("static", "output")
-        if not os.path.exists(base):
-            return jsonify({"success": True, "history": []})
-        sets = [d for d in os.listdir(base) if os.path.isdir(os.path.join(base, d)) and d.startswith("set")]
-        sets.sort(key=lambda x: int(x.replace("set", "")), reverse=True)
+        set_index = get_set_index()
+        user_id = request.args.get("user")
+        if user_id == "me":
+            user_id = session.get('user_id') or ""
+
+        etag = hashlib.sha256(json.dumps([set_index.version(), sorted(request.args.items()), user_id]).encode()).hexdigest()[:32]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        try:
+            limit = min(max(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+            cursor = request.args.get("cursor", type=int)
+            since = parse_history_date(request.args.get("from"))
+            until = parse_history_date(request.args.get("to"), end=True)
+        except ValueError as e:
+            return jsonify({"success": False, "error": f"Invalid filter: {e}"}), 400
+
+        sets, next_cursor = set_index.history(limit, cursor, user_id, since, until, request.args.get("theme"))
         history_list = []
-        for s in sets:
-            folder = os.path.join(base, s)
-            ts = os.path.getctime(folder)
-            dt = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
-            files = {fname.replace('.', '_'): f"/static/output/{s}/{fname}" for fname in os.listdir(folder) if os.path.isfile(os.path.join(folder, fname))}
-            history_list.append({"timestamp": dt, "folder_name": s, "files": files})
-        return jsonify({"success": True, "history": history_list})
+        for entry in sets:
+            dt = datetime.fromtimestamp(entry["created"]).strftime("%Y-%m-%d %H:%M:%S")
+            files = {fname.replace('.', '_'): f"/static/output/{entry['name']}/{fname}" for fname in entry["files"]}
+            history_list.append({
+                "timestamp": dt,
+                "folder_name": entry["name"],
+                "files": files,
+                "themes": ((entry["params"].get("section_choices") or {}).get("Themes") or [])
+            })
+
+        response = jsonify({"success": True, "history": history_list, "next_cursor": next_cursor})
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 # ----------------- Automated Marking -----------------
 @app.route("/api/automated-marking", methods=["POST"])
 def automated_marking_api():
-    from services.automated_marking import extract_text_from_pdf, extract_text_from_upload, mark_batch_answers, export_results_to_pdf
     set_name = request.form.get("set_name")
     files = request.files.getlist("files")
     if not set_name or not files:
         return jsonify({"success": False, "error": "Missing data"}), 400
 
-    set_dir = os.path.join("static", "output", set_name)
-    full_pdf_path = os.path.join(set_dir, "full_set.pdf")
-    if not os.path.exists(full_pdf_path):
+    set_folder = safe_join(os.path.join("static", "output"), set_name)
+    if not set_folder or not any(os.path.exists(os.path.join(set_folder, name)) for name in (ANSWER_KEY_NAME, "full_set.pdf")):
         return jsonify({"success": False, "error": "Official full_set.pdf not found"}), 404
 
-    official_text = extract_text_from_pdf(full_pdf_path)
-    student_texts = []
-    with tempfile.TemporaryDirectory() as tmp:
-        for file in files:
-            path = os.path.join(tmp, file.filename)
-            file.save(path)
-            student_texts.append(extract_text_from_upload(path))
-
-    raw_result = mark_batch_answers(official_text, student_texts)
-    try:
-        results = json.loads(raw_result)
-    except Exception as e:
-        return jsonify({"success": False, "error": f"AI output parsing failed: {e}"}), 500
-
-    dir = "static/marking_data"
-    os.makedirs(dir, exist_ok=True)
-    output_pdf = os.path.join(dir, "marking_result.pdf")
-    export_results_to_pdf(results, full_pdf_path, output_pdf)
-    return jsonify({"success": True, "pdf_url": f"/static/marking_data/marking_result.pdf"})
+    # Uploads are kept until the marking job has used them
+    uploads_root = os.path.join(JOB_DATA_DIR, "uploads")
+    os.makedirs(uploads_root, exist_ok=True)
+    upload_dir = tempfile.mkdtemp(prefix="marking_", dir=uploads_root)
+    names = []
+    for i, file in enumerate(files):
+        name = f"{i}_{secure_filename(file.filename) or 'upload'}"
+        file.save(os.path.join(upload_dir, name))
+        names.append(name)
+
+    job_id = enqueue_job("marking", {"set_name": set_name, "upload_dir": upload_dir, "files": names})
+    return jsonify({"success": True, "job_id": job_id}), 202
 
 # ----------------- Feedback -----------------
 @app.route("/api/submit-feedback", methods=["POST"])
@@ -0,0 +1,77 @@
+# Answer marking benchmark: marks a class of synthetic answer sheets (right answers in other spellings,
+# number words, wrong answers, slips, over-long answers, OCR-style run-on text) against a set's answer
+# key with the local matcher, and compares what the model is sent with the previous single prompt (the
+# full set PDF's text plus every sheet). The model is not called: ambiguous answers are counted and
+# rejected.
+# Run from the project root: python benchmarks/answer_marking.py [--students 40]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import convertion, automated_marking
+from services.answer_key import build_answer_key
+from services.answer_matching import NUMBER_UNITS
+
+DIGIT_WORDS = {str(value): word for word, value in NUMBER_UNITS.items() if value < 10}
+
+def variant(answer, rng):
+    roll = rng.random()
+    if roll < 0.55:
+        return answer
+    if roll < 0.65:
+        return answer.upper() if rng.random() < 0.5 else f"  {answer.capitalize()} "
+    if roll < 0.72 and answer.isdigit():
+        return " ".join(DIGIT_WORDS[d] for d in answer)
+    if roll < 0.78 and len(answer) > 4:
+        i = rng.randrange(1, len(answer) - 1)
+        return answer[:i] + answer[i + 1:]
+    if roll < 0.82:
+        return f"{answer} and more words"
+    if roll < 0.92:
+        return rng.choice(["C", "tickets", "garden", "42", "blue"])
+    return ""
+
+def sheet(name, answers, rng):
+    lines = [f"Name: {name}"] + [f"{n}. {variant(a, rng)}" for n, a in enumerate(answers, 1)]
+    # Some sheets come from OCR, with every line run together
+    return (" " if rng.random() < 0.25 else "\n").join(lines)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", default=convertion.TEMP_JSON)
+    parser.add_argument("--students", type=int, default=40)
+    args = parser.parse_args()
+
+    qset = convertion.load_question_set(args.json, 1)
+    key = build_answer_key(qset.sections, 1, qset.date)
+    rng = random.Random(7)
+    sheets = [sheet(f"Student {i + 1}", [q["answer"] for q in key["questions"]], rng) for i in range(args.students)]
+
+    sent = []
+    def judge_ambiguous_answers(items):
+        sent.extend(items)
+        return {i: False for i in range(len(items))}
+    automated_marking.judge_ambiguous_answers = judge_ambiguous_answers
+
+    start = time.perf_counter()
+    results = automated_marking.mark_answers(key, sheets)
+    elapsed = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as folder:
+        convertion.render_full_pdf(qset, os.path.join(folder, "full_set.pdf"))
+        official_text = automated_marking.extract_text_from_pdf(os.path.join(folder, "full_set.pdf"))
+    previous_prompt = len(official_text) + sum(len(s) for s in sheets)
+    sent_prompt = sum(len(str(accepted)) + len(answer) for accepted, answer in sent)
+
+    answers = len(sheets) * len(key["questions"])
+    print(f"{len(results)} sheets, {answers} answers marked locally in {elapsed * 1000:.0f} ms")
+    print(f"  answers sent to the model  {len(sent)} distinct ({len(sent) / answers:.1%} of all answers)")
+    print(f"  model input                previous ~{previous_prompt / 1000:.0f} KB in one prompt, now ~{sent_prompt / 1000:.1f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Audio assembly benchmark: builds a full set from synthetic utterances with the previous AudioSegment
+# concatenation and with the preallocated buffer in services.audio, and reports CPU time and peak memory.
+# Run from the project root: python benchmarks/audio_assembly.py [--minutes 30] [--skip-legacy]
+import os
+import io
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("AUDIO_FORMATS", "")
+
+from services.audio import SAMPLE_RATE, LEAD_MS, PART_GAP_MS, assemble, pause_after, save_full_audio
+
+def synthetic_parts(minutes, parts=4, seconds_per_line=4.0):
+    rng = np.random.default_rng(0)
+    lines_per_part = int(minutes * 60 / seconds_per_line / parts)
+    words = "the library opens at nine on weekdays and closes early on sunday afternoons".split()
+    result = []
+    for _ in range(parts):
+        lines = []
+        for _ in range(lines_per_part):
+            spoken = " ".join(rng.choice(words, size=int(rng.integers(8, 30))))
+            n = int(SAMPLE_RATE * seconds_per_line * rng.uniform(0.7, 1.3))
+            lines.append((spoken, (rng.standard_normal(n) * 0.1).astype(np.float32)))
+        result.append(lines)
+    return result
+
+def legacy(parts, output_dir):
+    from pydub import AudioSegment
+    part_audios = []
+    for lines in parts:
+        section_audio = AudioSegment.silent(LEAD_MS)
+        for spoken, audio_np in lines:
+            wav_buffer = io.BytesIO()
+            sf.write(wav_buffer, audio_np, SAMPLE_RATE, format="wav")
+            wav_buffer.seek(0)
+            section_audio += AudioSegment.from_wav(wav_buffer)
+            section_audio += AudioSegment.silent(pause_after(spoken))
+        part_audios.append(section_audio)
+
+    combined = AudioSegment.empty()
+    for i, audio in enumerate(part_audios, 1):
+        audio.export(os.path.join(output_dir, f"part_{i}.wav"), format="wav")
+        combined += audio
+        combined += AudioSegment.silent(PART_GAP_MS)
+    full_audio_path = os.path.join(output_dir, "full_set_audio.wav")
+    combined.export(full_audio_path, format="wav")
+    return full_audio_path
+
+def buffered(parts, output_dir):
+    part_audios = [assemble([(audio_np, pause_after(spoken)) for spoken, audio_np in lines], lead_ms=LEAD_MS) for lines in parts]
+    return save_full_audio(part_audios, output_dir)
+
+def measure(fn, parts):
+    tracemalloc.start()
+    start_cpu = time.process_time()
+    with tempfile.TemporaryDirectory() as output_dir:
+        size = os.path.getsize(fn(parts, output_dir))
+        cpu = time.process_time() - start_cpu
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak, size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    parts = synthetic_parts(args.minutes)
+    lines = sum(len(p) for p in parts)
+    print(f"{args.minutes:g} minutes of audio, {lines} utterances in {len(parts)} parts\n")
+
+    runs = [("buffer", buffered)] if args.skip_legacy else [("AudioSegment", legacy), ("buffer", buffered)]
+    for name, fn in runs:
+        cpu, peak, size = measure(fn, parts)
+        print(f"  {name:14s} cpu {cpu:7.2f}s   peak {peak / 1e6:8.1f} MB   wav {size / 1e6:6.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Part regeneration benchmark: time to refresh the full set PDF after one part changed, rendering every
+# page again (previous behaviour) vs re-rendering that part's fragments and stitching them with the
+# cached ones (services.convertion render_set with a fragment folder).
+# Run from the project root: python benchmarks/part_regeneration.py [--part 3] [--runs 5]
+import os
+import sys
+import time
+import copy
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import convertion
+from services.resources import registry
+
+# The set with the part's instructions and transcript changed, as a regeneration would
+def regenerated(qset, part, run):
+    qset = copy.deepcopy(qset)
+    for section in qset.sections:
+        if convertion.section_name(section) == f"Part {part}":
+            section["Instructions"] = f"{section.get('Instructions', '')} ({run})"
+            section["Transcript"] = f"{section.get('Transcript', '')} ({run})"
+    return qset
+
+def measure(fn, qset, part, runs):
+    timings = []
+    for run in range(runs):
+        changed = regenerated(qset, part, run)
+        start = time.perf_counter()
+        fn(changed)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", default=convertion.TEMP_JSON)
+    parser.add_argument("--part", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    qset = convertion.load_question_set(args.json, 1)
+    registry.get("pdf_assets")
+    print(f"{args.json}, Part {args.part} changed, {args.runs} runs\n")
+
+    with tempfile.TemporaryDirectory() as folder:
+        full = lambda changed: convertion.render_full_pdf(changed, os.path.join(folder, "full_set.pdf"))
+        # The fragments of the set as generated are in the fragment folder already
+        convertion.render_set(qset, folder, None, ["full_set.pdf"])
+        incremental = lambda changed: convertion.render_set(changed, folder, None, ["full_set.pdf"])
+
+        for name, fn in [("full render", full), ("incremental", incremental)]:
+            timings = measure(fn, qset, args.part, args.runs)
+            print(f"  {name:12s} median {statistics.median(timings) * 1000:7.1f} ms   min {min(timings) * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
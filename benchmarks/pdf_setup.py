@@ -0,0 +1,78 @@
+# PDF setup micro-benchmark: time to create a PDF with the fonts registered and draw the title page,
+# parsing the TTFs and decoding the logo for every document (previous behaviour) vs copying them from
+# the cached assets in services.convertion. Also reports a full set render both ways.
+# Run from the project root: python benchmarks/pdf_setup.py [--runs 20]
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import convertion
+from services.resources import registry
+
+def uncached_pdf():
+    pdf = convertion.PDF()
+    for family, style, path in convertion.PDF_FONTS:
+        pdf.add_font(family, style, path)
+    pdf.set_left_margin(25)
+    pdf.set_right_margin(25)
+    pdf.set_top_margin(10)
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.alias_nb_pages()
+    return pdf
+
+def title_only(new_pdf):
+    pdf = new_pdf()
+    pdf.add_page()
+    pdf.title_page(1, "01 January 2025")
+    pdf.output(io.BytesIO())
+
+def full_set(new_pdf, qset, folder):
+    # The renderers call convertion.new_pdf, swapped for the duration of the run
+    previous, convertion.new_pdf = convertion.new_pdf, new_pdf
+    try:
+        convertion.render_full_pdf(qset, os.path.join(folder, "full_set.pdf"))
+        convertion.render_questions_pdf(qset, os.path.join(folder, "questions.pdf"))
+    finally:
+        convertion.new_pdf = previous
+
+def measure(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--json", default=convertion.TEMP_JSON)
+    args = parser.parse_args()
+
+    cached_pdf = convertion.new_pdf
+    start = time.perf_counter()
+    registry.get("pdf_assets")
+    print(f"Loading the cached assets once: {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+    setup_uncached = measure(uncached_pdf, args.runs)
+    setup_cached = measure(cached_pdf, args.runs)
+    title_uncached = measure(lambda: title_only(uncached_pdf), args.runs)
+    title_cached = measure(lambda: title_only(cached_pdf), args.runs)
+    print(f"  new PDF with fonts    uncached {setup_uncached * 1000:7.1f} ms   cached {setup_cached * 1000:7.1f} ms")
+    print(f"  title page PDF        uncached {title_uncached * 1000:7.1f} ms   cached {title_cached * 1000:7.1f} ms")
+
+    qset = convertion.load_question_set(args.json, 1)
+    runs = max(1, args.runs // 5)
+    with tempfile.TemporaryDirectory() as folder:
+        set_uncached = measure(lambda: full_set(uncached_pdf, qset, folder), runs)
+        set_cached = measure(lambda: full_set(cached_pdf, qset, folder), runs)
+    print(f"  both set PDFs         uncached {set_uncached * 1000:7.1f} ms   cached {set_cached * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
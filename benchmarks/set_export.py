@@ -0,0 +1,74 @@
+# Set export benchmark: renders the four set files (full set PDF, questions PDF, questions TXT,
+# transcript TXT) for a set folder and a preview folder, with the exporters from before the render
+# pipeline (benchmarks/baseline_convertion.py: each exporter parses the JSON and writes its file to
+# both folders) and with the render pipeline in services.convertion (one parse, each file rendered
+# once and linked, PDFs in worker processes). It also compares the page layout of the PDFs: page
+# count and the text of each page.
+# Run from the project root: python benchmarks/set_export.py [--json static/temp/temp_generated_questions.json] [--runs 5]
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import fitz
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import baseline_convertion
+from services import convertion
+from services.resources import registry
+
+def previous(json_path, set_folder, temp_folder):
+    baseline_convertion.TEMP_JSON = json_path
+    baseline_convertion.export_full_pdf(set_folder, 1, temp_folder)
+    baseline_convertion.export_questions_pdf(set_folder, 1, temp_folder)
+    baseline_convertion.export_question_txt(set_folder, 1, temp_folder)
+    baseline_convertion.export_transcript_txt(set_folder, 1, temp_folder)
+
+def pipeline(json_path, set_folder, temp_folder):
+    convertion.render_set(convertion.load_question_set(json_path, 1), set_folder, temp_folder)
+
+# Page count of each PDF from both ways, and the pages whose text differs
+def compare_layout(json_path):
+    with tempfile.TemporaryDirectory() as old, tempfile.TemporaryDirectory() as new, tempfile.TemporaryDirectory() as temp_folder:
+        previous(json_path, old, temp_folder)
+        pipeline(json_path, new, temp_folder)
+        for name in convertion.PDF_ARTIFACTS:
+            with fitz.open(os.path.join(old, name)) as a, fitz.open(os.path.join(new, name)) as b:
+                differing = [i + 1 for i in range(max(a.page_count, b.page_count))
+                             if i >= min(a.page_count, b.page_count) or a[i].get_text().split() != b[i].get_text().split()]
+                print(f"  {name:14s} {a.page_count} pages previous, {b.page_count} pipeline, text differs on pages {differing or 'none'}")
+
+def measure(fn, json_path, runs):
+    timings = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as set_folder, tempfile.TemporaryDirectory() as temp_folder:
+            start = time.perf_counter()
+            fn(json_path, set_folder, temp_folder)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json", default=convertion.TEMP_JSON)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.json}, {args.runs} runs, {os.cpu_count()} CPUs, PDF_RENDER_WORKERS={convertion.PDF_RENDER_WORKERS}\n")
+
+    # The worker pool is started (and its first render done) before timing, as in a running job worker
+    start = time.perf_counter()
+    registry.get("pdf_pool")
+    measure(pipeline, args.json, 1)
+    print(f"  pool start + first render {time.perf_counter() - start:.2f}s\n")
+
+    compare_layout(args.json)
+    print()
+
+    for name, fn in [("previous", previous), ("pipeline", pipeline)]:
+        timings = measure(fn, args.json, args.runs)
+        print(f"  {name:10s} median {statistics.median(timings):6.2f}s   min {min(timings):6.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Cold-start benchmark: how long until the web process can answer, and how long each resource takes to warm up.
+# Run from the project root: python benchmarks/startup.py [--timeout SECONDS]
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+IMPORT_SNIPPET = """
+import time, json
+t = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - t}}))
+"""
+
+RESPONSIVE_SNIPPET = """
+import time, json
+t = time.perf_counter()
+import app
+client = app.app.test_client()
+client.get("/api/ready")
+print(json.dumps({"seconds": time.perf_counter() - t}))
+"""
+
+WARM_UP_SNIPPET = """
+import time, json
+t = time.perf_counter()
+import app
+client = app.app.test_client()
+body = {{}}
+while time.perf_counter() - t < {timeout}:
+    body = client.get("/api/ready").get_json()
+    resources = body.get("resources") or {{}}
+    if resources and all(r["state"] in ("ready", "error") for r in resources.values()):
+        break
+    time.sleep(0.2)
+print(json.dumps({{"seconds": time.perf_counter() - t, "resources": body.get("resources") or {{}}}}))
+"""
+
+def run(snippet, warm_up):
+    # With warm-up a single job worker loads the models; without it no workers are started
+    env = dict(os.environ, WARM_UP="1" if warm_up else "0", JOB_WORKERS="1" if warm_up else "0", PYTHONWARNINGS="ignore")
+    out = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, env=env, capture_output=True, text=True)
+    lines = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if not lines:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "no output")
+    return json.loads(lines[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    print("Import time (fresh interpreter, no warm-up)")
+    for module in ["app", "services.question_generator", "services.audio", "services.automated_marking", "services.convertion"]:
+        try:
+            print(f"  {module:32s} {run(IMPORT_SNIPPET.format(module=module), False)['seconds']:.3f}s")
+        except Exception as e:
+            print(f"  {module:32s} failed: {e}")
+
+    result = run(RESPONSIVE_SNIPPET, True)
+    print(f"\nFirst response from /api/ready      {result['seconds']:.3f}s")
+
+    result = run(WARM_UP_SNIPPET.format(timeout=args.timeout), True)
+    print(f"\nWorker warm-up finished after       {result['seconds']:.3f}s")
+    for name, info in result["resources"].items():
+        detail = f"{info['seconds']:.3f}s" if "seconds" in info else info.get("error", "")
+        print(f"  {name:32s} {info['state']:8s} {detail}")
+
+if __name__ == "__main__":
+    main()
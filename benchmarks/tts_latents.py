@@ -0,0 +1,79 @@
+# Per-utterance synthesis benchmark: TTS.tts(text, speaker) against Xtts.inference with the cached
+# speaker latents used by services.audio (sentence split and padded like TTS.tts), with the length of
+# the audio both produce. Needs the XTTS model; the utterance cache is bypassed.
+# Run from the project root: python benchmarks/tts_latents.py [--lines 10] [--repeats 2]
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("AUDIO_FORMATS", "")
+
+from services import audio
+from services.resources import registry
+
+LINES = [
+    "Good morning, city library, how can I help you?",
+    "I'd like to renew a book I borrowed last month.",
+    "Of course. Could I have your membership number, please?",
+    "It's four, seven, two, nine, B.",
+    "Thank you. The new return date is the fourteenth of March.",
+    "Is there a fee if I bring it back late?",
+    "Yes, it's twenty pence per day for adult members.",
+    "Today's lecture looks at how coastal erosion shapes the landscape over several centuries.",
+    "First, we'll consider the role of wave energy, and then turn to human intervention.",
+    "Finally, please remember that your assignments are due on Friday afternoon.",
+]
+
+def timed(fn, lines, voice, repeats):
+    times = []
+    for _ in range(repeats):
+        for line in lines:
+            start = time.perf_counter()
+            fn(line, voice)
+            times.append(time.perf_counter() - start)
+    return np.array(times)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=len(LINES))
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    lines = LINES[:args.lines]
+    tts = registry.get("tts")
+    voice = audio.narrator_voice()
+
+    start = time.perf_counter()
+    latents = registry.get("speaker_latents")
+    print(f"Speaker latents for {len(latents)} voices in {time.perf_counter() - start:.2f}s")
+    if voice not in latents:
+        print("No cached latents for the narrator voice, nothing to compare")
+        return
+
+    def baseline(text, speaker):
+        return np.asarray(tts.tts(text=text, speaker=speaker, language=audio.LANGUAGE), dtype=np.float32)
+
+    # Warm both paths once so the first-call setup is not counted
+    baseline(lines[0], voice)
+    audio.synthesize_uncached(lines[0], voice)
+
+    results = {
+        "TTS.tts": timed(baseline, lines, voice, args.repeats),
+        "cached latents": timed(audio.synthesize_uncached, lines, voice, args.repeats),
+    }
+    print(f"\n{len(lines)} lines x {args.repeats} repeats, voice {voice}")
+    for name, times in results.items():
+        print(f"  {name:16s} mean {times.mean() * 1000:8.1f} ms   median {np.median(times) * 1000:8.1f} ms")
+    saving = results["TTS.tts"].mean() - results["cached latents"].mean()
+    print(f"\nSaving per utterance: {saving * 1000:.1f} ms")
+
+    # Both paths pad every sentence with the same silence, so the audio lengths should be close
+    text = " ".join(lines[-3:])
+    for name, fn in [("TTS.tts", baseline), ("cached latents", audio.synthesize_uncached)]:
+        print(f"  {name:16s} {len(fn(text, voice)) / audio.SAMPLE_RATE:6.2f}s of audio for {len(lines[-3:])} sentences")
+
+if __name__ == "__main__":
+    main()
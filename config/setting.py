@@ -1,17 +1,28 @@
-import os 
-import google.generativeai as genai
+import os
 
-from TTS.api import TTS
+from services.resources import registry, LazyResource
 
 API_KEY = os.getenv("API_KEY2")
 GMAIL_PASSWORD = os.getenv("GMAIL_PASSWORD")
 
 # Configure API key
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel(
-    model_name='gemini-2.5-flash',
-    generation_config={"response_mime_type": "application/json"}
-)
+def load_model():
+    import google.generativeai as genai
+    genai.configure(api_key=API_KEY)
+    return genai.GenerativeModel(
+        model_name='gemini-2.5-flash',
+        generation_config={"response_mime_type": "application/json"}
+    )
 
 model_name = "tts_models/multilingual/multi-dataset/xtts_v2"
-tts = TTS(model_name)
\ No newline at end of file
+
+def load_tts():
+    from TTS.api import TTS
+    return TTS(model_name)
+
+registry.register("gemini", load_model)
+registry.register("tts", load_tts)
+
+# Loaded on first use (or by the warm-up thread), not at import
+model = LazyResource("gemini")
+tts = LazyResource("tts")
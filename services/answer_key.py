@@ -0,0 +1,92 @@
+# Import necessary libraries
+import os
+import re
+import json
+import threading
+
+from collections import OrderedDict
+
+# Answer keys.
+# Every generated set has an answer_key.json next to its files: one entry per question with its number,
+# part, question type, accepted answers and word limit, so marking reads a few kilobytes of JSON instead
+# of extracting the text of full_set.pdf. Keys are kept in an in-process LRU, reloaded when the file
+# changes.
+ANSWER_KEY_NAME = "answer_key.json"
+ANSWER_KEY_CACHE_SIZE = int(os.getenv("ANSWER_KEY_CACHE_SIZE", 64))
+
+# "/" separates alternatives ("colour/color"), except between digits ("24/7", "12/05")
+ALTERNATIVE_SEPARATOR = re.compile(r"(?<!\d)/|/(?!\d)")
+LIMIT_WORDS = {"ONE": 1, "TWO": 2, "THREE": 3, "FOUR": 4}
+
+# "A / B" are whole alternative answers; inside a word, "two/2 boxes" -> "two boxes", "2 boxes"
+def split_alternatives(answer):
+    answer = " ".join(str(answer).split())
+    alternatives = []
+    for option in re.split(r" / ", answer):
+        variants = [""]
+        for token in option.split(" "):
+            choices = [c for c in ALTERNATIVE_SEPARATOR.split(token) if c] or [token]
+            variants = [f"{v} {c}".strip() for v in variants for c in choices]
+        alternatives += [v for v in variants if v and v not in alternatives]
+    return alternatives or [answer]
+
+# (max words or None, whether a number is allowed) from "Write NO MORE THAN TWO WORDS AND/OR A NUMBER"
+def parse_word_limit(instructions):
+    text = " ".join(str(instructions or "").upper().split())
+    number_allowed = bool(re.search(r"\bA NUMBER\b", text))
+    match = re.search(r"\b(ONE|TWO|THREE|FOUR) WORDS?\b", text)
+    if match:
+        return LIMIT_WORDS[match.group(1)], number_allowed
+    return (0 if number_allowed else None), number_allowed
+
+# sections: the generated set's question groups, in order; question numbers run across them
+def build_answer_key(sections, set_number=None, date=None):
+    questions = []
+    for section in sections:
+        part = str(section.get("Section", "")).strip()
+        type_code = str(section.get("Type", "")).split()[0] if section.get("Type") else ""
+        max_words, number_allowed = parse_word_limit(section.get("Instructions"))
+        for answer in section.get("Answers", []):
+            questions.append({
+                "number": len(questions) + 1,
+                "part": part,
+                "type": type_code,
+                "answer": str(answer).strip(),
+                "accepted": split_alternatives(answer),
+                "max_words": max_words,
+                "number_allowed": number_allowed
+            })
+    return {"set": set_number, "date": date, "questions": questions}
+
+# Prompt text of a key: one line per question, alternatives separated by " / "
+def format_answer_key(key):
+    lines = ["ANSWER KEY (question number: accepted answers, alternatives separated by ' / ')"]
+    for question in key["questions"]:
+        lines.append(f"{question['number']}: {' / '.join(question['accepted'])}")
+    return "\n".join(lines)
+
+answer_keys = OrderedDict()
+answer_keys_lock = threading.Lock()
+
+# The set's answer key, or None for sets generated before keys were written
+def load_answer_key(set_folder):
+    path = os.path.join(set_folder, ANSWER_KEY_NAME)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_size, st.st_mtime_ns)
+    with answer_keys_lock:
+        cached = answer_keys.get(path)
+        if cached and cached[0] == stamp:
+            answer_keys.move_to_end(path)
+            return cached[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        key = json.load(f)
+    with answer_keys_lock:
+        answer_keys[path] = (stamp, key)
+        answer_keys.move_to_end(path)
+        while len(answer_keys) > ANSWER_KEY_CACHE_SIZE:
+            answer_keys.popitem(last=False)
+    return key
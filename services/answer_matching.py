@@ -0,0 +1,223 @@
+# Import necessary libraries
+import re
+import difflib
+
+# Local answer matching for the marking.
+# Answers are compared with the set's answer key after normalising case, whitespace, punctuation,
+# hyphens and numbers ("Twenty-four" == "24", "six nine two four one one" == "692411"), with the key's
+# alternatives and word limit applied. Each answer is settled as correct or incorrect, or left as
+# ambiguous (spelling slips, extra or missing words, a letter question answered with the option text)
+# for the model to decide.
+NEAR_MISS_RATIO = 0.8
+
+NUMBER_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19
+}
+NUMBER_TENS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90}
+NUMBER_SCALES = {"thousand": 1000, "million": 1000000}
+# "second" is left alone, it is more often a unit of time; judge_answer still lets it stand for "2nd"
+ORDINALS = {
+    "first": "1st", "third": "3rd", "fourth": "4th", "fifth": "5th", "sixth": "6th", "seventh": "7th",
+    "eighth": "8th", "ninth": "9th", "tenth": "10th", "eleventh": "11th", "twelfth": "12th"
+}
+
+TOKEN = re.compile(r"\d+(?:[.:/]\d+)*(?:st|nd|rd|th)?|[a-z]+")
+ANSWER_LINE = re.compile(r"^\s*(?:q(?:uestion)?\s*)?(\d{1,2})\s*[.):\-]?\s+(.*?)\s*$", re.I)
+NAME_LABEL = re.compile(r"(?:candidate(?:'s)?\s*)?name\s*[:\-]?\s*(.*)", re.I)
+
+def is_number(token):
+    return token[:1].isdigit()
+
+# The value of a number token: "24th" -> "24", "8:30" -> "8.30"
+def number_value(token):
+    return re.sub(r"(st|nd|rd|th)$", "", token).replace(":", ".")
+
+# The numbers in a normalised answer, in any order; with_second also reads "second" as "2nd"
+def answer_numbers(normalised, with_second=False):
+    tokens = normalised.split()
+    if with_second:
+        tokens = ["2nd" if t == "second" else t for t in tokens]
+    return sorted(number_value(t) for t in tokens if is_number(t))
+
+# Number words -> digits; single digits read out one by one ("six nine two") become one number
+def numbers_to_digits(tokens):
+    out, i = [], 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ORDINALS:
+            out.append(ORDINALS[token])
+            i += 1
+            continue
+        if token not in NUMBER_UNITS and token not in NUMBER_TENS and not (token == "hundred" or token in NUMBER_SCALES):
+            out.append(token)
+            i += 1
+            continue
+
+        total, current, last = 0, 0, None
+        while i < len(tokens):
+            token = tokens[i]
+            if token in NUMBER_UNITS and last not in ("unit", "teen"):
+                current += NUMBER_UNITS[token]
+                last = "teen" if NUMBER_UNITS[token] >= 10 else "unit"
+            elif token in NUMBER_TENS and last in (None, "hundred", "scale"):
+                current += NUMBER_TENS[token]
+                last = "tens"
+            elif token == "hundred" and last != "hundred":
+                current = (current or 1) * 100
+                last = "hundred"
+            elif token in NUMBER_SCALES and last != "scale":
+                total += (current or 1) * NUMBER_SCALES[token]
+                current = 0
+                last = "scale"
+            elif token == "and" and last in ("hundred", "scale") and i + 1 < len(tokens) and (tokens[i + 1] in NUMBER_UNITS or tokens[i + 1] in NUMBER_TENS):
+                pass
+            else:
+                break
+            i += 1
+        number = str(total + current)
+        if tokens[i:i + 3] == ["and", "a", "half"]:
+            number += ".5"
+            i += 3
+        out.append(number)
+
+    # Adjacent numbers are one number read or written in groups ("692 411", "six nine two")
+    merged = []
+    for token in out:
+        if merged and token.isdigit() and merged[-1].isdigit():
+            merged[-1] += token
+        else:
+            merged.append(token)
+    return merged
+
+def answer_tokens(text, join_hyphens=False):
+    text = str(text or "").lower().replace("’", "'").replace("'", "")
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text)
+    text = re.sub(r"[-–—]", "" if join_hyphens else " ", text)
+    return numbers_to_digits(TOKEN.findall(text))
+
+def normalise_answer(text):
+    return " ".join(answer_tokens(text))
+
+# IELTS word limits: hyphenated words count once, and "AND/OR A NUMBER" allows one number on top
+def within_word_limit(answer, max_words, number_allowed):
+    if max_words is None:
+        return True
+    tokens = answer_tokens(answer, join_hyphens=True)
+    numbers = [t for t in tokens if is_number(t)]
+    words = [t for t in tokens if not is_number(t)]
+    if number_allowed:
+        return len(words) <= max_words and len(numbers) <= 1
+    return len(tokens) <= max_words
+
+# True / False when settled, None when the model has to decide
+def judge_answer(question, answer):
+    normalised = normalise_answer(answer)
+    if not normalised:
+        return False
+    accepted = [normalise_answer(a) for a in question["accepted"]]
+    if normalised in accepted:
+        return True
+
+    # The limit is only enforced when the key's own answers keep to it
+    max_words, number_allowed = question.get("max_words"), question.get("number_allowed")
+    if all(within_word_limit(a, max_words, number_allowed) for a in question["accepted"]):
+        if not within_word_limit(answer, max_words, number_allowed):
+            return False
+
+    # Letter questions: another letter or a number is wrong, words (e.g. the option's text) are for the model
+    if all(len(a) == 1 and a.isalpha() for a in accepted):
+        return False if len(normalised) == 1 or any(is_number(t) for t in normalised.split()) else None
+
+    numbers = answer_numbers(normalised)
+    words = sorted(t for t in normalised.split() if not is_number(t))
+    for candidate in accepted:
+        if answer_numbers(candidate) != numbers:
+            # "2nd floor" / "second floor": the same number, written as a word the tokens keep
+            if answer_numbers(candidate, True) == answer_numbers(normalised, True):
+                return None
+            # A different or missing number is wrong however alike the rest looks
+            continue
+        # The same numbers in another form or order ("24th June" / "June 24", "8:30" / "8.30")
+        if numbers and sorted(t for t in candidate.split() if not is_number(t)) == words:
+            return None
+        if candidate.replace(" ", "") == normalised.replace(" ", ""):
+            return None
+        if f" {candidate} " in f" {normalised} " or f" {normalised} " in f" {candidate} ":
+            return None
+        if difflib.SequenceMatcher(None, candidate, normalised).ratio() >= NEAR_MISS_RATIO:
+            return None
+    return False
+
+def sheet_name(preamble):
+    lines = [line.strip() for line in preamble.splitlines() if line.strip()]
+    for line in lines:
+        match = NAME_LABEL.match(line)
+        if match and match.group(1).strip():
+            return match.group(1).strip()
+    if lines and not re.search(r"\d", lines[0]) and 1 <= len(lines[0].split()) <= 6:
+        return lines[0]
+    return "Unknown"
+
+# One answer per line: "1. router", "Q2) 18", "3 setup"
+def parse_answer_lines(text, count):
+    answers, first_line = {}, None
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        match = ANSWER_LINE.match(line)
+        if match and 1 <= int(match.group(1)) <= count and int(match.group(1)) not in answers:
+            answers[int(match.group(1))] = match.group(2)
+            first_line = index if first_line is None else first_line
+    preamble = "\n".join(lines[:first_line]) if first_line is not None else text
+    return answers, preamble
+
+# Answers run together, as OCR returns them: "Name John 1. router 2. 18 3. setup"
+def parse_answer_run(text, count):
+    found, position = [], 0
+    for number in range(1, count + 1):
+        match = re.compile(rf"(?<![\w.,/:])(?:q(?:uestion)?\s*)?{number}\s*[.):]\s*", re.I).search(text, position)
+        if match:
+            found.append((number, match))
+            position = match.end()
+    answers = {}
+    for index, (number, match) in enumerate(found):
+        end = found[index + 1][1].start() if index + 1 < len(found) else len(text)
+        answers[number] = text[match.end():end].strip()
+    preamble = text[:found[0][1].start()] if found else text
+    return answers, preamble
+
+# (candidate name, {question number: answer}) from an answer sheet's text
+def parse_answer_sheet(text, count):
+    answers, preamble = parse_answer_lines(text, count)
+    if len(answers) < count:
+        run_answers, run_preamble = parse_answer_run(text, count)
+        if len(run_answers) > len(answers):
+            answers, preamble = run_answers, run_preamble
+    return sheet_name(preamble), answers
+
+# Answers the matcher must not mark wrong: (accepted answer, candidate's answer, verdict)
+CHECKS = [
+    ("24 June", "24th June", None),
+    ("24th June", "24 June", None),
+    ("24th June", "June 24", None),
+    ("8.30", "8:30", None),
+    ("second floor", "2nd floor", None),
+    ("2nd floor", "second floor", None),
+    ("8:30", "8.30", None),
+    ("1.5 metres", "one and a half metres", True),
+    ("692411", "six nine two four one one", True),
+    ("two/2 boxes", "three boxes", False),
+    ("24 June", "25 June", False)
+]
+
+# python -m services.answer_matching
+if __name__ == "__main__":
+    from services.answer_key import split_alternatives
+
+    failed = 0
+    for key, answer, expected in CHECKS:
+        verdict = judge_answer({"accepted": split_alternatives(key)}, answer)
+        failed += verdict != expected
+        print(f"{'ok' if verdict == expected else 'FAIL':4s} {key!r} vs {answer!r}: {verdict} (expected {expected})")
+    raise SystemExit(1 if failed else 0)
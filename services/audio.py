@@ -1,55 +1,131 @@
 # Import necessary libraries
 import os
-import io
-import nltk
+import json
 import soundfile as sf
 import numpy as np
+import multiprocessing
 
-from pydub import AudioSegment
-from config.setting import model, tts
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
-nltk.download("punkt")
+from config.setting import model, tts, model_name
+from services.resources import registry
+from services.tts_cache import UtteranceCache
+from services.audio_stream import PartStreamWriter, reset_stream
+from services.audio_encoding import encode_in_background
+from services.gender_resolver import GenderResolver, parse_genders
 
-# Determine Speaker
-all_speakers = tts.speakers
+SAMPLE_RATE = 22050
+LANGUAGE = "en"
 
-male_speakers = [s for s in all_speakers if any(n in s.lower() for n in [
-    "david","andrew","badr","damien","gilberto","ilkin","kazuhiko",
-    "ludvig","torcull","viktor","zacharie","xavier","luis","marcos"
-])]
+# On-disk cache of synthesized lines, so unchanged lines are not synthesized again
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE", "1") == "1"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join("cache", "tts"))
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", 500))
 
-female_speakers = [s for s in all_speakers if any(n in s.lower() for n in [
-    "claribel","daisy","tammie","alison","ana","annmarie","asya","brenda",
-    "gitta","henriette","sofia","tammy","tanja","nova","maja","uta",
-    "lidiya","chandra","szofi","camilla","lilya","zofija"
-])]
+# Parts are synthesized in worker processes, each holding its own TTS model.
+# TTS_WORKERS=1 keeps synthesis in-process. The worker count is capped by CPU count and by
+# available memory, assuming TTS_WORKER_MEMORY_MB per loaded model.
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", 1))
+TTS_WORKER_MEMORY_MB = float(os.getenv("TTS_WORKER_MEMORY_MB", 2500))
+
+# Speaker genders come from a bundled first-name table, then a memo of earlier model answers
+GENDER_TABLE_PATH = os.path.join("model", "data", "name_genders.json")
+GENDER_MEMO_PATH = os.getenv("GENDER_MEMO", os.path.join("cache", "name_genders.json"))
+
+def load_utterance_cache():
+    return UtteranceCache(TTS_CACHE_DIR, int(TTS_CACHE_MAX_MB * 1024 * 1024))
+
+def load_punkt():
+    import nltk
+    nltk.download("punkt", quiet=True)
+    return True
+
+# Determine Speaker (needs the TTS model, so the lists are built when it loads)
+def load_voices():
+    all_speakers = tts.speakers
+
+    male_speakers = [s for s in all_speakers if any(n in s.lower() for n in [
+        "david","andrew","badr","damien","gilberto","ilkin","kazuhiko",
+        "ludvig","torcull","viktor","zacharie","xavier","luis","marcos"
+    ])]
+
+    female_speakers = [s for s in all_speakers if any(n in s.lower() for n in [
+        "claribel","daisy","tammie","alison","ana","annmarie","asya","brenda",
+        "gitta","henriette","sofia","tammy","tanja","nova","maja","uta",
+        "lidiya","chandra","szofi","camilla","lilya","zofija"
+    ])]
+
+    return male_speakers, female_speakers
+
+def load_gender_resolver():
+    return GenderResolver(GENDER_TABLE_PATH, GENDER_MEMO_PATH)
+
+registry.register("nltk_punkt", load_punkt)
+registry.register("gender_resolver", load_gender_resolver)
+registry.register("voices", load_voices)
+registry.register("utterance_cache", load_utterance_cache)
 
 male_index = 0
 female_index = 0
 
 # Utility Function
-def detect_gender(name):
+# One model call for every name the table and memo do not know, None if the call fails
+def ask_gender_model(names):
     try:
         r = model.generate_content(
-            f"Determine gender (male or female). Name: {name}. Answer only male or female."
+            "Determine the gender (male or female) of each speaker name from a listening test. "
+            "Answer with a JSON object mapping each name exactly as given to \"male\", \"female\" or \"unknown\".\n"
+            f"Names: {json.dumps(names, ensure_ascii=False)}"
         )
-        t = r.text.lower()
-        if "male" in t: return "male"
-        if "female" in t: return "female"
-    except:
-        pass
-    return None
+        return parse_genders(r.text)
+    except Exception as e:
+        print(f"[AUDIO] Gender lookup failed for {len(names)} name(s): {e}")
+        return None
+
+def detect_gender(name):
+    return registry.get("gender_resolver").resolve(name, ask_gender_model)
+
+# Transcript line -> (speaker, spoken, named); narrator lines and lines without a speaker are not named
+def parse_line(line):
+    if line.lower().startswith("narrator:"):
+        return "narrator", line.split(":", 1)[1].strip(), False
+    if ":" in line:
+        speaker, spoken = line.split(":", 1)
+        return speaker.strip(), spoken.strip(), True
+    return "unknown", line, False
+
+# Genders of every named speaker in the transcripts, resolved with at most one model call
+def resolve_speaker_genders(transcripts):
+    names = []
+    for transcript in transcripts:
+        for line in (transcript or "").strip().split('\n'):
+            speaker, _, named = parse_line(line.strip())
+            if named:
+                names.append(speaker)
+    if not names:
+        return {}
+    return registry.get("gender_resolver").resolve_many(names, ask_gender_model)
 
 def narrator_voice():
+    _, female_speakers = registry.get("voices")
     for s in female_speakers:
         if "daisy" in s.lower():
             return s
     return female_speakers[0]
 
-def assign_voice(name):
+# Voices rotate from a fixed offset per part, so a regenerated part gets the same voices
+def reset_voice_rotation(section_label):
+    global male_index, female_index
+    digits = "".join(ch for ch in str(section_label) if ch.isdigit())
+    male_index = female_index = max(0, int(digits) - 1) if digits else 0
+
+# genders: names already resolved for this set (see resolve_speaker_genders)
+def assign_voice(name, genders=None):
 
     global male_index, female_index
-    gender = detect_gender(name)
+    male_speakers, female_speakers = registry.get("voices")
+    gender = genders[name] if genders is not None and name in genders else detect_gender(name)
 
     if gender == "male":
         v = male_speakers[male_index % len(male_speakers)]
@@ -70,9 +146,144 @@ def assign_voice(name):
         female_index += 1
         return v
     
-def generate_section_audio(transcript_text, section_label):
+# XTTS conditioning latents
+# Every voice we use gets its GPT conditioning latent and speaker embedding fetched once, moved to the
+# model's device and kept in memory; synthesis then calls Xtts.inference with them directly instead of
+# going through TTS.tts, splitting sentences and padding them with silence the way TTS.tts does.
+# XTTS_LATENTS_PATH (optional) keeps them on disk between runs.
+XTTS_LATENTS_PATH = os.getenv("XTTS_LATENTS_PATH")
+# Silence the coqui Synthesizer adds after every sentence, in samples
+SENTENCE_PAD_SAMPLES = 10000
+
+def xtts_model():
+    synthesizer = getattr(registry.get("tts"), "synthesizer", None)
+    xtts = getattr(synthesizer, "tts_model", None)
+    if xtts is None or not hasattr(xtts, "inference") or not hasattr(xtts, "speaker_manager"):
+        return None
+    return xtts
+
+def xtts_inference_settings(xtts):
+    cfg = xtts.config
+    return {
+        "temperature": cfg.temperature,
+        "length_penalty": cfg.length_penalty,
+        "repetition_penalty": cfg.repetition_penalty,
+        "top_k": cfg.top_k,
+        "top_p": cfg.top_p
+    }
+
+def load_speaker_latents():
+    xtts = xtts_model()
+    if xtts is None:
+        print("[AUDIO] TTS model has no XTTS inference API, using TTS.tts")
+        return {}
+    import torch
+
+    male_speakers, female_speakers = registry.get("voices")
+    voices = list(dict.fromkeys(male_speakers + female_speakers))
+
+    stored = {}
+    if XTTS_LATENTS_PATH and os.path.exists(XTTS_LATENTS_PATH):
+        data = torch.load(XTTS_LATENTS_PATH, map_location="cpu")
+        if data.get("model") == model_name:
+            stored = data.get("latents", {})
+
+    latents = {}
+    for voice in voices:
+        entry = stored.get(voice) or xtts.speaker_manager.speakers.get(voice)
+        if entry is None:
+            continue
+        latents[voice] = (entry["gpt_cond_latent"].to(xtts.device), entry["speaker_embedding"].to(xtts.device))
+
+    if XTTS_LATENTS_PATH and len(stored) < len(latents):
+        os.makedirs(os.path.dirname(XTTS_LATENTS_PATH) or ".", exist_ok=True)
+        torch.save({"model": model_name, "latents": {
+            voice: {"gpt_cond_latent": g.cpu(), "speaker_embedding": e.cpu()} for voice, (g, e) in latents.items()
+        }}, XTTS_LATENTS_PATH)
+    return latents
+
+registry.register("speaker_latents", load_speaker_latents)
+
+# "latents" when the speaker's utterances go through Xtts.inference, else "tts"
+def synthesis_path(speaker):
+    return "latents" if speaker in registry.get("speaker_latents") else "tts"
+
+def synthesize_uncached(text, speaker):
+    latents = registry.get("speaker_latents").get(speaker)
+    if latents is None:
+        return np.asarray(tts.tts(text=text, speaker=speaker, language=LANGUAGE), dtype=np.float32)
+
+    import torch
+    xtts = xtts_model()
+    synthesizer = registry.get("tts").synthesizer
+    settings = xtts_inference_settings(xtts)
+    pieces = []
+    with torch.inference_mode():
+        for sentence in synthesizer.split_into_sentences(text):
+            wav = xtts.inference(sentence, LANGUAGE, latents[0], latents[1], **settings)["wav"]
+            if hasattr(wav, "cpu"):
+                wav = wav.cpu().numpy()
+            pieces += [np.asarray(wav, dtype=np.float32).reshape(-1), np.zeros(SENTENCE_PAD_SAMPLES, dtype=np.float32)]
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+
+def synthesize(text, speaker):
+    key = None
+    utterance_cache = registry.get("utterance_cache") if TTS_CACHE_ENABLED else None
+    if utterance_cache is not None:
+        key = UtteranceCache.make_key(text, speaker, LANGUAGE, model_name, SAMPLE_RATE, synthesis_path(speaker))
+        cached = utterance_cache.get(key)
+        if cached is not None:
+            return cached
+
+    audio_np = synthesize_uncached(text, speaker)
+    if key is not None:
+        utterance_cache.put(key, audio_np)
+    return audio_np
+
+# Audio assembly: utterances and pauses are laid out once into a single preallocated int16 buffer
+LEAD_MS = 1000
+PART_GAP_MS = 2000
+
+def pause_after(spoken):
+    return 400 if len(spoken.split()) > 18 else 300
+
+def ms_to_samples(ms):
+    return int(SAMPLE_RATE * ms / 1000)
+
+def silence(ms):
+    return np.zeros(ms_to_samples(ms), dtype=np.int16)
+
+# pieces: (samples, pause_ms) pairs; float samples in [-1, 1] are converted to int16 in place
+def assemble(pieces, lead_ms=0):
+    pieces = [(np.asarray(samples).reshape(-1), ms_to_samples(pause_ms)) for samples, pause_ms in pieces]
+    total = ms_to_samples(lead_ms) + sum(len(samples) + pause for samples, pause in pieces)
+    buffer = np.zeros(total, dtype=np.int16)
+
+    pos = ms_to_samples(lead_ms)
+    for samples, pause in pieces:
+        n = len(samples)
+        if samples.dtype == np.int16:
+            buffer[pos:pos + n] = samples
+        else:
+            np.multiply(np.clip(samples, -1.0, 1.0), 32767.0, out=buffer[pos:pos + n], casting="unsafe")
+        pos += n + pause
+    return buffer
+
+# Compressed copies are encoded in the background once the WAV is on disk
+def write_wav(path, samples):
+    sf.write(path, samples, SAMPLE_RATE, subtype="PCM_16")
+    encode_in_background(path)
+    return path
+
+# With a stream, each line is also appended to the part's growing PCM file as soon as it is synthesized
+def generate_section_audio(transcript_text, section_label, stream=None, genders=None):
     voices = {}
-    section_audio = AudioSegment.silent(1000)
+    reset_voice_rotation(section_label)
+    if genders is None:
+        genders = resolve_speaker_genders([transcript_text])
+    pieces = []
+    if stream is not None:
+        stream.write(silence(LEAD_MS))
     
     lines = transcript_text.strip().split('\n')
     
@@ -80,41 +291,151 @@ def generate_section_audio(transcript_text, section_label):
         line = line.strip()
         if not line: continue
 
-        if line.lower().startswith("narrator:"):
-            speaker, spoken = "narrator", line.split(":", 1)[1].strip()
-            if speaker not in voices: voices[speaker] = narrator_voice()
-        elif ":" in line:
-            speaker, spoken = line.split(":", 1)
-            speaker, spoken = speaker.strip(), spoken.strip()
-            if speaker not in voices: voices[speaker] = assign_voice(speaker)
-        else:
-            speaker, spoken = "unknown", line
-            if speaker not in voices: voices[speaker] = narrator_voice()
+        speaker, spoken, named = parse_line(line)
+        if speaker not in voices:
+            voices[speaker] = assign_voice(speaker, genders) if named else narrator_voice()
 
-        audio_np = np.asarray(tts.tts(text=spoken, speaker=voices[speaker], language="en"))
-        
-        wav_buffer = io.BytesIO()
-        sf.write(wav_buffer, audio_np, 22050, format="wav")
+        piece = (synthesize(spoken, voices[speaker]), pause_after(spoken))
+        if stream is not None:
+            piece = (assemble([piece]), 0)
+            stream.write(piece[0])
+        pieces.append(piece)
 
-        wav_buffer.seek(0)
-        section_audio += AudioSegment.from_wav(wav_buffer)
-        
-        section_audio += AudioSegment.silent(400 if len(spoken.split()) > 18 else 300)
+    return assemble(pieces, lead_ms=LEAD_MS)
 
-    return section_audio
+# Synthesizes a part, streaming it to stream_dir/part_N.stream.pcm when stream_dir is given
+def generate_part_audio(transcript_text, part_num, stream_dir=None, genders=None):
+    stream = PartStreamWriter(stream_dir, part_num) if stream_dir else None
+    try:
+        if not transcript_text or not transcript_text.strip():
+            audio = silence(LEAD_MS)
+            if stream is not None:
+                stream.write(audio)
+            return audio
+        return generate_section_audio(transcript_text, f"Part {part_num}", stream, genders)
+    finally:
+        if stream is not None:
+            stream.close()
 
 def save_full_audio(part_audios, output_dir):
-    combined = AudioSegment.empty()
     for i, audio in enumerate(part_audios, 1):
-        part_path = os.path.join(output_dir, f"part_{i}.wav")
-        audio.export(part_path, format="wav")
-        
-        # Build the combined version
-        combined += audio
-        combined += AudioSegment.silent(2000)
-    
-    # Export the full set audio to the set folder with standardized name
+        write_wav(os.path.join(output_dir, f"part_{i}.wav"), audio)
+
+    # Export the full set audio to the set folder with standardized name, streamed part by part
     full_audio_path = os.path.join(output_dir, "full_set_audio.wav")
-    combined.export(full_audio_path, format="wav")
+    gap = silence(PART_GAP_MS)
+    with sf.SoundFile(full_audio_path, "w", SAMPLE_RATE, 1, "PCM_16") as f:
+        for audio in part_audios:
+            f.write(audio)
+            f.write(gap)
+    encode_in_background(full_audio_path)
+
+    return full_audio_path
+
+# Parallel synthesis
+def available_memory_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def tts_worker_count(jobs=None):
+    workers = max(1, min(TTS_WORKERS, os.cpu_count() or 1))
+    free_mb = available_memory_mb()
+    if free_mb is not None:
+        workers = min(workers, max(1, int(free_mb // TTS_WORKER_MEMORY_MB)))
+    if jobs is not None:
+        workers = min(workers, max(1, jobs))
+    return workers
+
+def init_tts_worker(threads):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    registry.get("tts")
+    registry.get("speaker_latents")
+
+def synthesize_part(transcript, part_num, stream_dir=None, genders=None):
+    return generate_part_audio(transcript, part_num, stream_dir, genders)
+
+def load_tts_pool():
+    workers = tts_worker_count()
+    if workers <= 1:
+        return None
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"[AUDIO] Starting {workers} TTS workers ({threads} threads each)")
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_tts_worker,
+        initargs=(threads,)
+    )
+    # Start every worker now, so their models load during warm-up rather than on the first request
+    for _ in range(workers):
+        pool.submit(int)
+    return pool
+
+registry.register("tts_pool", load_tts_pool)
+
+# Joins the transcripts of each part, keyed 1-4, in the order the entries were generated
+def transcripts_by_part(questions):
+    parts_dict = {}
+    for item in questions:
+        section = item.get("Section", "")
+        try:
+            part_num = int(section.replace("Part", "").strip())
+        except (ValueError, AttributeError):
+            part_num = len(parts_dict) + 1
+        parts_dict.setdefault(part_num, []).append(item)
+    return {
+        part_num: "\n\n".join(i.get("Transcript", "") for i in parts_dict.get(part_num, []))
+        for part_num in range(1, 5)
+    }
+
+# Yields (part_num, audio) as each part finishes, in completion order.
+# With stream_dir, every part can be played progressively from its stream file while it is synthesized.
+def iter_parts_audio(transcripts, stream_dir=None):
+    pending = {p: t for p, t in transcripts.items() if t and t.strip()}
+    if stream_dir:
+        # Parts still queued must not be served from a previous run's stream
+        for part_num in transcripts:
+            reset_stream(stream_dir, part_num)
+    for part_num in transcripts:
+        if part_num not in pending:
+            yield part_num, generate_part_audio("", part_num, stream_dir)
+
+    # Speakers of the whole set are resolved up front, so unknown names cost one model call per set
+    genders = resolve_speaker_genders(pending.values())
+
+    pool = registry.get("tts_pool") if len(pending) > 1 else None
+    if pool is None:
+        for part_num, transcript in pending.items():
+            yield part_num, generate_part_audio(transcript, part_num, stream_dir, genders)
+        return
+
+    futures = {pool.submit(synthesize_part, t, p, stream_dir, genders): p for p, t in pending.items()}
+    try:
+        for future in as_completed(futures):
+            part_num = futures[future]
+            yield part_num, future.result()
+            pending.pop(part_num)
+    except BrokenProcessPool as e:
+        # A worker died (usually out of memory): finish in-process and start a fresh pool next time
+        print(f"[AUDIO] TTS worker pool failed ({e}), synthesizing {len(pending)} part(s) in-process")
+        registry.discard("tts_pool")
+        pool.shutdown(wait=False, cancel_futures=True)
+        for part_num, transcript in pending.items():
+            yield part_num, generate_part_audio(transcript, part_num, stream_dir, genders)
 
-    return full_audio_path
\ No newline at end of file
+def generate_parts_audio(transcripts, stream_dir=None):
+    results = dict(iter_parts_audio(transcripts, stream_dir))
+    return [results[part_num] for part_num in sorted(results)]
@@ -0,0 +1,167 @@
+# Import necessary libraries
+import os
+import shutil
+import hashlib
+import threading
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Compressed copies of the WAV outputs (part_N.opus, full_set_audio.mp3, ...), encoded with ffmpeg
+# in the background after each WAV is written. The order of AUDIO_FORMATS is the order of preference
+# when a client accepts several formats; an empty list turns encoding off.
+# Each copy has a hidden .<name>.source file with the size and mtime of the WAV it was encoded from; a
+# copy is served only while the WAV still matches it, and a stale copy is encoded again.
+AUDIO_FORMATS = [f.strip() for f in os.getenv("AUDIO_FORMATS", "mp3,opus").split(",") if f.strip()]
+AUDIO_ENCODE_WORKERS = int(os.getenv("AUDIO_ENCODE_WORKERS", 2))
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+FORMATS = {
+    "opus": {"ext": ".opus", "mimetype": "audio/ogg", "args": ["-c:a", "libopus", "-b:a", "32k", "-application", "voip"]},
+    "mp3": {"ext": ".mp3", "mimetype": "audio/mpeg", "args": ["-c:a", "libmp3lame", "-b:a", "64k"]},
+    "wav": {"ext": ".wav", "mimetype": "audio/wav", "args": None},
+}
+
+encoder = ThreadPoolExecutor(max_workers=AUDIO_ENCODE_WORKERS)
+pending = {}
+pending_lock = threading.Lock()
+warned_missing = False
+
+def ffmpeg_path():
+    return shutil.which(FFMPEG_BINARY)
+
+def variant_path(wav_path, fmt):
+    return os.path.splitext(wav_path)[0] + FORMATS[fmt]["ext"]
+
+def source_stamp_path(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f".{name}.source")
+
+def wav_stamp(wav_path):
+    st = os.stat(wav_path)
+    return f"{st.st_size} {st.st_mtime_ns}"
+
+def read_source_stamp(path):
+    try:
+        with open(source_stamp_path(path), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+# Temporary names carry the process and thread ids: thread ids are only unique within a process, and the
+# job workers encode into the same folders
+def encode_file(wav_path, fmt):
+    out_path = variant_path(wav_path, fmt)
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp{FORMATS[fmt]['ext']}"
+    cmd = [ffmpeg_path(), "-y", "-loglevel", "error", "-i", wav_path, *FORMATS[fmt]["args"], tmp_path]
+    try:
+        # Stamped before encoding: a WAV rewritten meanwhile no longer matches the copy
+        stamp = wav_stamp(wav_path)
+        subprocess.run(cmd, check=True, capture_output=True)
+        os.replace(tmp_path, out_path)
+        stamp_tmp = f"{source_stamp_path(out_path)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(stamp_tmp, "w", encoding="utf-8") as f:
+            f.write(stamp)
+        os.replace(stamp_tmp, source_stamp_path(out_path))
+        return out_path
+    except subprocess.CalledProcessError as e:
+        print(f"[AUDIO] {fmt} encoding of {wav_path} failed: {e.stderr.decode(errors='ignore').strip()}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return None
+
+def encode_audio(wav_path, formats=None):
+    return [p for p in (encode_file(wav_path, fmt) for fmt in formats or AUDIO_FORMATS) if p]
+
+# Queues the compressed versions of a WAV, returns the future (None when encoding is off)
+def encode_in_background(wav_path, formats=None):
+    global warned_missing
+    formats = [f for f in (formats or AUDIO_FORMATS) if f in FORMATS and f != "wav"]
+    if not formats:
+        return None
+    if ffmpeg_path() is None:
+        if not warned_missing:
+            print(f"[AUDIO] {FFMPEG_BINARY} not found, only WAV audio will be served")
+            warned_missing = True
+        return None
+
+    future = encoder.submit(encode_audio, wav_path, formats)
+    with pending_lock:
+        pending[wav_path] = future
+    future.add_done_callback(lambda f: finish_pending(wav_path, f))
+    return future
+
+def finish_pending(wav_path, future):
+    with pending_lock:
+        if pending.get(wav_path) is future:
+            pending.pop(wav_path)
+
+def wait_for_encoding(timeout=None):
+    with pending_lock:
+        futures = list(pending.values())
+    for future in futures:
+        future.result(timeout=timeout)
+
+# Variants encoded from the WAV as it is now, most preferred first, WAV last.
+# Stale copies (or copies without a source stamp) are queued to be encoded again.
+def available_variants(wav_path):
+    try:
+        current = wav_stamp(wav_path)
+    except OSError:
+        return []
+    variants, stale = [], []
+    for fmt in AUDIO_FORMATS:
+        if fmt not in FORMATS or fmt == "wav":
+            continue
+        path = variant_path(wav_path, fmt)
+        if not os.path.exists(path):
+            continue
+        if read_source_stamp(path) == current:
+            variants.append((fmt, path))
+        else:
+            stale.append(fmt)
+    if stale:
+        with pending_lock:
+            encoding = wav_path in pending
+        if not encoding:
+            encode_in_background(wav_path, stale)
+    variants.append(("wav", wav_path))
+    return variants
+
+# Picks a variant from an explicit format name, otherwise from the Accept header (werkzeug MIMEAccept).
+# Without an Accept header the most preferred variant is served.
+def select_variant(wav_path, accept=None, requested=None):
+    variants = available_variants(wav_path)
+    if not variants:
+        return None
+    if requested:
+        for fmt, path in variants:
+            if fmt == requested:
+                return fmt, path
+    if not accept:
+        return variants[0]
+    # Highest quality wins, ties go to the preferred (earlier) variant
+    qualities = [accept.quality(FORMATS[fmt]["mimetype"]) for fmt, _ in variants]
+    best = max(qualities)
+    return variants[qualities.index(best)] if best > 0 else variants[-1]
+
+# Strong ETags: a content hash, recomputed only when the file's size or mtime changes
+etag_memo = {}
+etag_lock = threading.Lock()
+
+def file_etag(path):
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    with etag_lock:
+        cached = etag_memo.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    etag = digest.hexdigest()[:32]
+    with etag_lock:
+        etag_memo[path] = (stamp, etag)
+    return etag
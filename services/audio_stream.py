@@ -0,0 +1,77 @@
+# Import necessary libraries
+import os
+import time
+import struct
+
+# Progressive part audio.
+# While a part is synthesized its PCM samples are appended to part_N.stream.pcm; part_N.stream.done
+# is created once the part is finished. Readers tail the growing file behind a streaming WAV header.
+STREAM_POLL_SECONDS = 0.2
+STREAM_IDLE_TIMEOUT = 300
+
+def stream_paths(stream_dir, part_num):
+    base = os.path.join(stream_dir, f"part_{part_num}.stream")
+    return f"{base}.pcm", f"{base}.done"
+
+# Empties the part's stream and marks it in progress
+def reset_stream(stream_dir, part_num):
+    pcm_path, done_path = stream_paths(stream_dir, part_num)
+    os.makedirs(stream_dir, exist_ok=True)
+    if os.path.exists(done_path):
+        os.remove(done_path)
+    open(pcm_path, "wb").close()
+
+class PartStreamWriter:
+    def __init__(self, stream_dir, part_num):
+        reset_stream(stream_dir, part_num)
+        self.pcm_path, self.done_path = stream_paths(stream_dir, part_num)
+        self.file = open(self.pcm_path, "ab")
+
+    # samples: int16 array
+    def write(self, samples):
+        self.file.write(samples.tobytes())
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.close()
+        open(self.done_path, "w").close()
+
+def stream_state(stream_dir, part_num):
+    pcm_path, done_path = stream_paths(stream_dir, part_num)
+    if not os.path.exists(pcm_path):
+        return None
+    return "complete" if os.path.exists(done_path) else "streaming"
+
+# RIFF and data sizes are left at their maximum, so players read until the connection closes
+def streaming_wav_header(sample_rate, channels=1, bits=16):
+    block_align = channels * bits // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+def iter_part_stream(stream_dir, part_num, sample_rate, chunk_size=64 * 1024):
+    pcm_path, done_path = stream_paths(stream_dir, part_num)
+    yield streaming_wav_header(sample_rate)
+
+    idle_since = time.time()
+    with open(pcm_path, "rb") as f:
+        pending = b""
+        while True:
+            # Check for completion before reading, so the last bytes written are always sent
+            done = os.path.exists(done_path)
+            data = f.read(chunk_size)
+            if data:
+                data = pending + data
+                # Only whole 16-bit samples are sent
+                cut = len(data) - len(data) % 2
+                pending = data[cut:]
+                idle_since = time.time()
+                yield data[:cut]
+                continue
+            if done or time.time() - idle_since > STREAM_IDLE_TIMEOUT:
+                return
+            time.sleep(STREAM_POLL_SECONDS)
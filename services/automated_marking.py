@@ -1,14 +1,20 @@
 import os
 import fitz
-import easyocr
 import json
-import google.generativeai as genai
 
 from datetime import datetime
 from fpdf import FPDF
 from config.setting import model
+from services.resources import registry, LazyResource
+from services.answer_key import format_answer_key
+from services.answer_matching import parse_answer_sheet, judge_answer
 
-reader = easyocr.Reader(['en'])
+def load_ocr_reader():
+    import easyocr
+    return easyocr.Reader(['en'])
+
+registry.register("ocr_reader", load_ocr_reader)
+reader = LazyResource("ocr_reader")
 
 def get_ielts_grade(mark_str):
     try:
@@ -51,9 +57,9 @@ def mark_batch_answers(official_key_text, student_data_list):
         students_input_str += f"\n--- STUDENT {i+1} ---\n{text}\n"
 
     prompt = f"""
-    You are an IELTS Examiner. Use the provided Official Question Set as the absolute source of truth.
+    You are an IELTS Examiner. Use the provided Official Answers as the absolute source of truth.
     
-    OFFICIAL SET (Questions and Answers):
+    OFFICIAL ANSWERS (the set's answer key, or its full question set with answers):
     {official_key_text}
     
     TASK:
@@ -78,6 +84,83 @@ def mark_batch_answers(official_key_text, student_data_list):
     response = model.generate_content(prompt)
     return response.text
 
+# Answers the local matcher left open, for all students in one call; items: [(accepted answers, answer)].
+# Returns {index: True/False}.
+def judge_ambiguous_answers(items):
+    payload = [{"id": str(i), "accepted": accepted, "answer": answer} for i, (accepted, answer) in enumerate(items)]
+    prompt = f"""
+    You are an IELTS Listening Examiner. For each item, decide whether the candidate's answer should be
+    accepted for the question's accepted answers. Spelling must be correct (British or American), and
+    words that change or add to the meaning make the answer wrong.
+
+    ITEMS (JSON):
+    {json.dumps(payload, ensure_ascii=False)}
+
+    OUTPUT FORMAT (Strict JSON Object): {{ "0": true, "1": false }}
+    """
+    response = model.generate_content(prompt)
+    try:
+        decisions = json.loads(response.text)
+    except Exception as e:
+        raise Exception(f"AI output parsing failed: {e}")
+    return {i: bool(decisions.get(str(i), False)) for i in range(len(items))}
+
+# Marks answer sheets against a set's answer key. Answers are settled locally where they can be; the
+# ambiguous ones (each distinct one once) go to the model in one call, and sheets whose answers could
+# not be read go to the model whole. Returns results in the format of mark_batch_answers.
+def mark_answers(answer_key, student_texts):
+    questions = answer_key["questions"]
+    sheets, unread = [], []
+    ambiguous = {}
+    for index, text in enumerate(student_texts):
+        name, answers = parse_answer_sheet(text, len(questions))
+        if len(answers) < len(questions) / 2:
+            sheets.append(None)
+            unread.append(index)
+            continue
+        verdicts = {}
+        for question in questions:
+            answer = answers.get(question["number"], "").strip()
+            verdicts[question["number"]] = judge_answer(question, answer)
+            if verdicts[question["number"]] is None:
+                ambiguous.setdefault((tuple(question["accepted"]), answer), []).append((index, question["number"]))
+        sheets.append((name, answers, verdicts))
+
+    if ambiguous:
+        print(f"[MARKING] {len(ambiguous)} ambiguous answer(s) sent to the model")
+        items = list(ambiguous)
+        decisions = judge_ambiguous_answers([(list(accepted), answer) for accepted, answer in items])
+        for i, item in enumerate(items):
+            for index, number in ambiguous[item]:
+                sheets[index][2][number] = decisions[i]
+
+    results = []
+    for name, answers, verdicts in (sheet for sheet in sheets if sheet is not None):
+        correct, incorrect = {}, {}
+        for question in questions:
+            answer = answers.get(question["number"], "").strip()
+            if verdicts[question["number"]]:
+                correct[str(question["number"])] = answer
+            else:
+                incorrect[str(question["number"])] = {"student_answer": answer, "correct_answer": question["answer"]}
+        results.append({
+            "candidate_name": name,
+            "total_marks": f"{len(correct)}/{len(questions)}",
+            "correct_answers": correct,
+            "incorrect_answers": incorrect
+        })
+
+    if unread:
+        print(f"[MARKING] {len(unread)} answer sheet(s) could not be read locally, marked by the model")
+        try:
+            fallback = json.loads(mark_batch_answers(format_answer_key(answer_key), [student_texts[i] for i in unread]))
+        except Exception as e:
+            raise Exception(f"AI output parsing failed: {e}")
+        # Back in upload order
+        for index, entry in zip(unread, fallback):
+            results.insert(index, entry)
+    return results
+
 def export_results_to_pdf(results, official_file_path, output_filename="Marking_Summary.pdf"):
     folder_dir = os.path.dirname(official_file_path)
     folder_name = os.path.basename(folder_dir.rstrip('/'))
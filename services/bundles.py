@@ -0,0 +1,152 @@
+# Import necessary libraries
+import os
+import json
+import hashlib
+import zipfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Zip downloads of a set's files.
+# Archives are streamed to the client while they are written: files are read in blocks, media is STORED
+# (it does not compress any further) and text is DEFLATEd, so memory stays bounded whatever the size of
+# the set. The common bundles are also built once per set in the background, as setN/bundles/<bundle>.zip,
+# and served as files with ETags until one of their files changes.
+ZIP_CHUNK_SIZE = 1024 * 1024
+DEFLATED_EXTENSIONS = {".txt", ".json"}
+BUNDLE_DIR = "bundles"
+BUNDLE_WORKERS = int(os.getenv("BUNDLE_WORKERS", 1))
+
+# Download label (as sent by the result page) -> file name in the set
+DOWNLOAD_FILES = {
+    "Full_Set.pdf": "full_set.pdf",
+    "Question.pdf": "questions.pdf",
+    "Question.txt": "questions.txt",
+    "Transcript.txt": "transcript.txt",
+    "Audio Part 1": "part_1.wav",
+    "Audio Part 2": "part_2.wav",
+    "Audio Part 3": "part_3.wav",
+    "Audio Part 4": "part_4.wav",
+    "Full Audio": "full_set_audio.wav"
+}
+
+AUDIO_FILES = ["part_1.wav", "part_2.wav", "part_3.wav", "part_4.wav", "full_set_audio.wav"]
+BUNDLES = {
+    "all": ["full_set.pdf", "questions.pdf", "questions.txt", "transcript.txt"] + AUDIO_FILES,
+    "pdf": ["full_set.pdf", "questions.pdf"],
+    "audio": AUDIO_FILES
+}
+
+builder = ThreadPoolExecutor(max_workers=BUNDLE_WORKERS)
+building = set()
+building_lock = threading.Lock()
+
+# Write-only file object for zipfile; what was written is taken out after each block
+class ZipStream:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def compress_type(name):
+    return zipfile.ZIP_DEFLATED if os.path.splitext(name)[1].lower() in DEFLATED_EXTENSIONS else zipfile.ZIP_STORED
+
+# entries: [(name in the archive, path)]; yields the archive's bytes
+def iter_zip(entries):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w") as zf:
+        for arcname, path in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = compress_type(arcname)
+            with open(path, "rb") as src, zf.open(info, "w") as dest:
+                for block in iter(lambda: src.read(ZIP_CHUNK_SIZE), b""):
+                    dest.write(block)
+                    data = stream.take()
+                    if data:
+                        yield data
+            data = stream.take()
+            if data:
+                yield data
+    yield stream.take()
+
+def zip_signature(entries):
+    signature = []
+    for arcname, path in entries:
+        st = os.stat(path)
+        signature.append([arcname, st.st_size, st.st_mtime_ns])
+    return signature
+
+def zip_etag(entries):
+    return hashlib.sha256(json.dumps(zip_signature(entries)).encode()).hexdigest()[:32]
+
+# The files of a bundle that exist in the set folder
+def bundle_entries(set_folder, bundle):
+    return [(name, os.path.join(set_folder, name)) for name in BUNDLES[bundle] if os.path.isfile(os.path.join(set_folder, name))]
+
+def bundle_paths(set_folder, bundle):
+    base = os.path.join(set_folder, BUNDLE_DIR, bundle)
+    return f"{base}.zip", f"{base}.json"
+
+# The bundle whose files are exactly the requested ones, if any
+def matching_bundle(set_folder, entries):
+    requested = sorted(entries)
+    for bundle in BUNDLES:
+        if sorted(bundle_entries(set_folder, bundle)) == requested:
+            return bundle
+    return None
+
+# Path of the prebuilt bundle while it still matches the set's files, else None
+def cached_bundle(set_folder, bundle):
+    zip_path, meta_path = bundle_paths(set_folder, bundle)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(zip_path) or meta.get("signature") != zip_signature(bundle_entries(set_folder, bundle)):
+        return None
+    return zip_path
+
+def build_bundle(set_folder, bundle):
+    entries = bundle_entries(set_folder, bundle)
+    if not entries or cached_bundle(set_folder, bundle):
+        return None
+    zip_path, meta_path = bundle_paths(set_folder, bundle)
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+    signature = zip_signature(entries)
+    tmp_path = f"{zip_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for data in iter_zip(entries):
+            f.write(data)
+    os.replace(tmp_path, zip_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"signature": signature}, f)
+    return zip_path
+
+def build_bundles(set_folder):
+    try:
+        for bundle in BUNDLES:
+            build_bundle(set_folder, bundle)
+    except Exception as e:
+        print(f"[BUNDLES] Building bundles for {set_folder} failed: {e}")
+    finally:
+        with building_lock:
+            building.discard(set_folder)
+
+# Queues the set's bundles; a set already queued is not queued twice
+def build_bundles_in_background(set_folder):
+    with building_lock:
+        if set_folder in building:
+            return None
+        building.add(set_folder)
+    return builder.submit(build_bundles, set_folder)
@@ -1,10 +1,26 @@
 # Import necessary libraries
+import io
 import os
-import re
+import copy
 import json
+import fitz
+import hashlib
+import shutil
+import tempfile
+import threading
+import multiprocessing
 
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from fpdf import FPDF
+from fpdf.fonts import TTFFont, SubsetMap
+from fpdf.image_parsing import preload_image
+from fontTools import ttLib
+
+from services.resources import registry
+from services.set_index import get_set_index
+from services.answer_key import ANSWER_KEY_NAME, build_answer_key
 
 # --- ABSOLUTE PATH LOGIC ---
 # This finds the folder where convertion.py lives, then goes up to the project root
@@ -16,32 +32,21 @@ DEJAVUSANS_FONT = os.path.join(BASE_DIR, "static", "fonts", "DejaVuSans.ttf")
 SPACEMONO_FONT = os.path.join(BASE_DIR, "static", "fonts", "SpaceMono-Regular.ttf")
 IELTS_LOGO = os.path.join(BASE_DIR, "static", "images", "ielts_logo.png")
 
-def get_set_folder():
-   
-    base_folder = os.path.join(BASE_DIR, "static", "output")
-    os.makedirs(base_folder, exist_ok=True)
-
-    # Find existing set numbers
-    existing = [
-        int(re.search(r"set(\d+)", d).group(1)) 
-        for d in os.listdir(base_folder) 
-        if re.match(r"set\d+", d)
-    ]
-    next_set_num = max(existing, default=0) + 1
-    
-    target_folder = os.path.join(base_folder, f"set{next_set_num}")
-    os.makedirs(target_folder, exist_ok=True)
+def get_set_folder(temp_folder=None, params=None, user_id=None):
+    # Set numbers come from the set index, safe under concurrent generations
+    next_set_num, target_folder = get_set_index().allocate(params, user_id)
 
-    temp_folder = os.path.join(BASE_DIR, "static", "temp")
+    temp_folder = temp_folder or os.path.join(BASE_DIR, "static", "temp")
+    os.makedirs(temp_folder, exist_ok=True)
 
     return target_folder, next_set_num, temp_folder
 
-def get_key_and_sections():
+def get_key_and_sections(json_path=TEMP_JSON):
     # Verify file exists before opening
-    if not os.path.exists(TEMP_JSON):
-        raise FileNotFoundError(f"Missing JSON: {TEMP_JSON}. Ensure generator saved it first.")
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(f"Missing JSON: {json_path}. Ensure generator saved it first.")
 
-    with open(TEMP_JSON, "r", encoding="utf-8") as file:
+    with open(json_path, "r", encoding="utf-8") as file:
         data = json.load(file)
 
     if not isinstance(data, dict):
@@ -68,10 +73,13 @@ def format_date_from_key(key):
 
 class PDF(FPDF):
     LEFT_CONTENT_MARGIN = 20 
+    # Fragments without the title page show the logo from their first page; stitching adds the page numbers
+    LOGO_FROM_PAGE = 2
+    PAGE_NUMBERS = True
 
     # Header
     def header(self):
-        if self.page_no() > 1:  
+        if self.page_no() >= self.LOGO_FROM_PAGE:
             self.image(IELTS_LOGO, x=20, y=20, w=20)
         self.set_y(30)
 
@@ -115,8 +123,6 @@ class PDF(FPDF):
         )
         self.multi_cell(box_w - 20, 6, instructions_text)
 
-        self.add_page()
-
     # Part Header
     def part_header(self, part_number):
         self.set_font("DejaVu", "B", 16)
@@ -264,8 +270,9 @@ class PDF(FPDF):
         self.set_line_width(0.8)
         self.rect(10, 10, 190, 277)
         self.set_y(-25)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+        if self.PAGE_NUMBERS:
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
     # Break Line
     def break_line(self):
@@ -274,33 +281,138 @@ class PDF(FPDF):
         self.multi_cell(0, 6, "-------------------------------------------------------------------------------------------")
         self.ln(2)
 
-# Full Set -> Question + Answers + Transcript PDF
-def export_full_pdf(set_folder, next_set, temp_folder):
-    key, sections = get_key_and_sections()
-    full_pdf_path = os.path.join(set_folder, "full_set.pdf")
-    temp_pdf_path = os.path.join(temp_folder, "full_set.pdf")
-    formatted_date = format_date_from_key(key)
-
-    pdf = PDF()
-    pdf.add_font("DejaVu", "", DEJAVUSANS_FONT, uni=True)
-    pdf.add_font("DejaVu", "B", DEJAVUSANS_FONT, uni=True)
-    pdf.add_font("SpaceMono", "", SPACEMONO_FONT, uni=True)
+# ----------------- Render pipeline -----------------
+# A question set is parsed once into a QuestionSet and handed to every renderer. Each artifact is
+# rendered once, through a temporary file replaced into place, then hard-linked (or copied) into the
+# preview folder. The fragments the PDFs are stitched from are rendered in parallel: one batch in the
+# calling process, the others by a pool of worker processes (PDF_RENDER_WORKERS per job worker, started
+# with the first set that needs it; 0 renders everything in-process).
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", 1))
+
+class QuestionSet:
+    def __init__(self, key, sections, set_number):
+        self.key = key
+        self.sections = sections
+        self.set_number = set_number
+        self.date = format_date_from_key(key)
+
+def load_question_set(json_path=TEMP_JSON, set_number=0):
+    key, sections = get_key_and_sections(json_path)
+    return QuestionSet(key, sections, set_number)
+
+# Writes through a temporary file, so a hard-linked copy of the old file is never changed in place
+def replace_file(path, write):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def link_or_copy(src, dst):
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return
+    tmp_path = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+# ----------------- Font and image cache -----------------
+# The parsed fonts (metrics, cmap, glyph ids) and the decoded logo are kept per process and copied into
+# each new PDF, instead of parsing the TTFs and decoding the PNG again for every document. Every PDF
+# gets its own fontTools object, read from the cached font bytes, because fpdf subsets it in place on output.
+PDF_FONTS = [("DejaVu", "", DEJAVUSANS_FONT), ("DejaVu", "B", DEJAVUSANS_FONT), ("SpaceMono", "", SPACEMONO_FONT)]
+
+class PDFAssets:
+    def __init__(self):
+        template = PDF()
+        for family, style, path in PDF_FONTS:
+            template.add_font(family, style, path)
+        preload_image(template.image_cache, IELTS_LOGO)
+
+        self.fonts = dict(template.fonts)
+        self.font_data = {}
+        for _, _, path in PDF_FONTS:
+            if path not in self.font_data:
+                with open(path, "rb") as f:
+                    self.font_data[path] = f.read()
+        self.images = dict(template.image_cache.images)
+        self.icc_profiles = dict(template.image_cache.icc_profiles)
+
+    def copy_font(self, font):
+        clone = TTFFont.__new__(TTFFont)
+        for slot in TTFFont.__slots__:
+            if hasattr(font, slot):
+                setattr(clone, slot, getattr(font, slot))
+        clone.ttfont = ttLib.TTFont(io.BytesIO(self.font_data[str(font.ttffile)]), recalcTimestamp=False, lazy=True)
+        clone.cw = copy.copy(font.cw)
+        clone.missing_glyphs = []
+        clone.biggest_size_pt = 0
+        clone.subset = SubsetMap(clone)
+        return clone
+
+    def apply(self, pdf):
+        for fontkey, font in self.fonts.items():
+            pdf.fonts[fontkey] = self.copy_font(font)
+        for name, info in self.images.items():
+            info = copy.copy(info)
+            info["usages"] = 0
+            pdf.image_cache.images[name] = info
+        pdf.image_cache.icc_profiles.update(self.icc_profiles)
+        return pdf
+
+registry.register("pdf_assets", PDFAssets)
+
+def new_pdf():
+    pdf = registry.get("pdf_assets").apply(PDF())
 
     pdf.set_left_margin(25)
     pdf.set_right_margin(25)
     pdf.set_top_margin(10)
 
     pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.alias_nb_pages() 
-    
+    pdf.alias_nb_pages()
+    return pdf
+
+# ----------------- PDF fragments -----------------
+# The PDFs are stitched with PyMuPDF from fragments rendered separately: the title page, each part's
+# question pages, the answer key and each part's transcript. Fragments are cached in a fragment folder
+# under a hash of what they show, so regenerating one part only renders that part's fragments again
+# (and the answer key, whose question numbers run across the parts). Fragments have no page numbers;
+# they are added to the stitched document.
+FRAGMENT_DIR = "fragments"
+# Where fpdf's footer puts "Page N" (Arial italic 8, centred 25 mm above the bottom edge), in points
+PAGE_NUMBER_FONT = "Helvetica-Oblique"
+PAGE_NUMBER_SIZE = 8
+PAGE_NUMBER_BASELINE = (25 - 5) / 25.4 * 72 - 0.3 * PAGE_NUMBER_SIZE
+# What the question pages show of a section; the rest (answers, transcript) does not change them
+QUESTION_FIELDS = ["Section", "Type", "Instructions", "Questions", "Diagram", "Options"]
+
+def section_name(section):
+    return str(section.get("Section", "")).strip()
+
+# [(part name, [sections])], consecutive sections of the same part grouped together
+def group_parts(sections):
+    parts = []
+    for section in sections:
+        if not parts or parts[-1][0] != section_name(section):
+            parts.append((section_name(section), []))
+        parts[-1][1].append(section)
+    return parts
+
+def write_title_fragment(pdf, set_number, date_str):
     pdf.add_page()
-    pdf.title_page(next_set, formatted_date)
+    pdf.title_page(set_number, date_str)
 
+# Question pages of one part, a page per question group
+def write_question_fragment(pdf, sections):
     next_section = None
-    first_part = True
 
     for section in sections:
-        section_num = str(section.get("Section", "")).strip()
+        section_num = section_name(section)
         instructions = section.get("Instructions", "")
         questions = section.get("Questions", [])
         diagram = section.get("Diagram", "")
@@ -310,9 +422,9 @@ def export_full_pdf(set_folder, next_set, temp_folder):
         # Track section
         current_section = section_num
 
-        if not first_part:
-            pdf.add_page()
-        first_part = False
+        # Every group starts a page; the first one's page break used to end title_page, so the first part
+        # still starts on page 2 as in the exporters before the fragments
+        pdf.add_page()
 
         if current_section != next_section:
             pdf.part_header(section_num)
@@ -339,65 +451,160 @@ def export_full_pdf(set_folder, next_set, temp_folder):
 
         next_section = section_num
 
-    # Print Answers
+# answers: [[section name, [answers]]] for the whole set
+def write_answer_fragment(pdf, answers):
     pdf.add_page()
     question_number = 1
     pdf.write_answers()
 
-    for section in sections:
-        section_num = str(section.get("Section", "")).strip()
-        answers = section.get("Answers", [])
-
+    for section_num, section_answers in answers:
         pdf.part_header(section_num)
 
-        for ans in answers:
+        for ans in section_answers:
             pdf.write_answers_line([(question_number, ans)])
             question_number += 1
 
         pdf.break_line()
 
-    # Print Transcripts
+# transcripts: [[section name, transcript]] for one part; the first part carries the heading
+def write_transcript_fragment(pdf, heading, transcripts):
     pdf.add_page()
-    pdf.write_transcripts()
-
-    for section in sections:
-        section_num = str(section.get("Section", "")).strip()
-        transcripts = section.get("Transcript", "")
+    if heading:
+        pdf.write_transcripts()
 
+    for section_num, transcript in transcripts:
         pdf.part_header(section_num)
 
-        pdf.write_transcripts_line(transcripts)
+        pdf.write_transcripts_line(transcript)
         pdf.break_line()
 
-    pdf.output(full_pdf_path)
-    pdf.output(temp_pdf_path)
+# Fragment kind -> writer(pdf, *args)
+FRAGMENTS = {
+    "title": write_title_fragment,
+    "questions": write_question_fragment,
+    "answers": write_answer_fragment,
+    "transcript": write_transcript_fragment
+}
+
+# PDF file name -> [(kind, args)], in page order
+def set_fragments(qset):
+    parts = group_parts(qset.sections)
+    title = ("title", [qset.set_number, qset.date])
+    questions = [
+        ("questions", [[{field: s[field] for field in QUESTION_FIELDS if field in s} for s in sections]])
+        for _, sections in parts
+    ]
+    answers = ("answers", [[[section_name(s), s.get("Answers", [])] for s in qset.sections]])
+    transcripts = [
+        ("transcript", [index == 0, [[section_name(s), s.get("Transcript", "")] for s in sections]])
+        for index, (_, sections) in enumerate(parts)
+    ]
+    return {
+        "full_set.pdf": [title] + questions + [answers] + transcripts,
+        "questions.pdf": [title] + questions
+    }
+
+def fragment_path(folder, fragment):
+    kind, args = fragment
+    digest = hashlib.sha256(json.dumps([kind, args], ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    return os.path.join(folder, f"{kind}-{digest[:24]}.pdf")
+
+# Renders fragments ([(path, (kind, args))], in page order) as one document, so they share one font
+# subset and their fonts are merged again when stitched, then splits it into the fragment files
+def render_fragments(fragments):
+    pdf = new_pdf()
+    pdf.LOGO_FROM_PAGE = 2 if fragments[0][1][0] == "title" else 1
+    pdf.PAGE_NUMBERS = False
+    page_ranges = []
+    for path, (kind, args) in fragments:
+        first_page = pdf.page_no()
+        FRAGMENTS[kind](pdf, *args)
+        page_ranges.append((path, first_page, pdf.page_no() - 1))
+
+    with fitz.open(stream=bytes(pdf.output()), filetype="pdf") as doc:
+        for path, first_page, last_page in page_ranges:
+            with fitz.open() as fragment:
+                fragment.insert_pdf(doc, from_page=first_page, to_page=last_page)
+                replace_file(path, lambda tmp_path: fragment.save(tmp_path, garbage=4, deflate=True))
+    return [path for path, _, _ in page_ranges]
+
+def add_page_number(page, number):
+    text = f"Page {number}"
+    width = fitz.get_text_length(text, fontname=PAGE_NUMBER_FONT, fontsize=PAGE_NUMBER_SIZE)
+    point = ((page.rect.width - width) / 2, page.rect.height - PAGE_NUMBER_BASELINE)
+    page.insert_text(point, text, fontname=PAGE_NUMBER_FONT, fontsize=PAGE_NUMBER_SIZE)
+
+def stitch_pdf(fragment_paths, path):
+    doc = fitz.open()
+    try:
+        for fragment_path in fragment_paths:
+            with fitz.open(fragment_path) as fragment:
+                if doc.page_count == 0:
+                    doc.set_metadata(fragment.metadata)
+                doc.insert_pdf(fragment)
+        for number, page in enumerate(doc, 1):
+            add_page_number(page, number)
+        # garbage=4 merges the copies of the logo and fonts that fragments rendered together carry
+        replace_file(path, lambda tmp_path: doc.save(tmp_path, garbage=4, deflate=True))
+    finally:
+        doc.close()
+
+def render_pdf(name, qset, path):
+    with tempfile.TemporaryDirectory() as folder:
+        fragments = [(fragment_path(folder, fragment), fragment) for fragment in set_fragments(qset)[name]]
+        stitch_pdf(render_fragments(fragments), path)
+
+# 1. Full Set -> Question + Answers + Transcript PDF
+def render_full_pdf(qset, path):
+    render_pdf("full_set.pdf", qset, path)
 
 # 2. Questoins Only PDF
-def export_questions_pdf(set_folder, next_set, temp_folder):
-    key, sections = get_key_and_sections()
-    formatted_date = format_date_from_key(key)
-    questions_pdf_path = os.path.join(set_folder, "questions.pdf")
-    temp_pdf_path = os.path.join(temp_folder, "questions.pdf")
+def render_questions_pdf(qset, path):
+    render_pdf("questions.pdf", qset, path)
+
+def write_text(path, text):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+    replace_file(path, write)
+
+def txt_header(qset, padding):
+    return (
+        "                               IELTS Listening Test \n"
+        f"                                        Set {qset.set_number}{padding}\n"
+        f"                                   {qset.date}\n\n"
+    )
 
-    pdf = PDF()
-    pdf.add_font("DejaVu", "", DEJAVUSANS_FONT, uni=True)
-    pdf.add_font("DejaVu", "B", DEJAVUSANS_FONT, uni=True)
-    pdf.add_font("SpaceMono", "", SPACEMONO_FONT, uni=True)
+# 3. Transcript Only TXT
+def render_transcript_txt(qset, path):
+    lines = [txt_header(qset, "        ")]
+    next_section = None
 
-    pdf.set_left_margin(25)
-    pdf.set_right_margin(25)
-    pdf.set_top_margin(10)
+    for section in qset.sections:
+        section_num = str(section.get("Section", "")).strip()
+        transcript = section.get("Transcript", "")
 
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.alias_nb_pages() 
-    
-    pdf.add_page()
-    pdf.title_page(set_number=1, date_str=formatted_date)
+        # Track section
+        current_section = section_num
 
+        if current_section != next_section:
+            lines.append(f"Part {section_num}\n")
+        else:
+            lines.append("\n")
+
+        lines.append(f"{transcript}\n")
+        lines.append(f"\n -------------------------------------------------------------------------------------------------\n")
+
+        next_section = section_num
+
+    write_text(path, "".join(lines))
+
+# 4. Questions Only TXT
+def render_question_txt(qset, path):
+    lines = [txt_header(qset, "       ")]
     next_section = None
-    first_part = True
 
-    for section in sections:
+    for section in qset.sections:
         section_num = str(section.get("Section", "")).strip()
         instructions = section.get("Instructions", "")
         questions = section.get("Questions", [])
@@ -408,256 +615,172 @@ def export_questions_pdf(set_folder, next_set, temp_folder):
         # Track section
         current_section = section_num
 
-        if not first_part:
-            pdf.add_page()
-        first_part = False
-
         if current_section != next_section:
-            pdf.part_header(section_num)
+            lines.append(f"Part {section_num}\n")
+        else:
+            lines.append("\n")
 
-        pdf.write_instructions(instructions)
+        lines.append(f"{instructions}\n\n")
 
         if type_code in ["T001", "T003", "T004", "T008", "T011"]:
             if diagram and diagram.strip() != "":
-                pdf.write_diagram(diagram, questions)
+                lines.append(f"{diagram}\n\n")
+                lines.append(f"Answers: \n")
+                for q in questions:
+                    lines.append(f"{q}. ________________\n")
             else:
-                pdf.write_questions(questions)
+                for q in questions:
+                    lines.append(f"{q}\n")
 
         if type_code in ["T005", "T007"]:
-            pdf.write_mcq(questions, options)
-
-        if type_code in ["T006"]:
-            pdf.write_matching(questions, options)
+            if options and len(options) != 0:
+                for q in questions:
+                    lines.append(f"{q}\n")
+                    for o in options:
+                        if isinstance(o, list):
+                            o = " ".join(o)
+                        lines.append(f"{o}\n")
+                    lines.append(f"\n")
+
+        if type_code == "T006":
+            lines.append(f"--------------------------------\n")
+            for o in options:
+                if isinstance(o, list):
+                    o = " ".join(o)
+                lines.append(f"    {o}\n")
+            lines.append(f"--------------------------------\n\n")
+            for q in questions:
+                lines.append(f"{q} _____________________\n")
 
         if type_code in ["T009", "T010"]:
-            pdf.write_questions(questions)
+            for q in questions:
+                lines.append(f"{q}\n")
 
         if type_code in ["T002"]:
-            pdf.write_form(diagram)
-
-        next_section = section_num
+            lines.append(f"{diagram}\n")
 
-    pdf.output(questions_pdf_path)
-    pdf.output(temp_pdf_path)
+        lines.append(f"\n -------------------------------------------------------------------------------------------------\n")
 
-# 3. Transcript Only TXT
-def export_transcript_txt(set_folder, next_set, temp_folder):
-    key, sections = get_key_and_sections()
-    formatted_date = format_date_from_key(key)
-    transcript_txt_path = os.path.join(set_folder, "transcript.txt")
-    temp_txt_path = os.path.join(temp_folder, "transcript.txt")
-
-    with open(transcript_txt_path, "w", encoding="utf-8") as file:
-        # Header
-        file.write("                               IELTS Listening Test \n")
-        file.write(f"                                        Set {next_set}        \n")
-        file.write(f"                                   {formatted_date}\n\n")
-
-        # Body
-        next_section = None
-
-        for section in sections:
-
-            section_num = str(section.get("Section", "")).strip()
-            transcript = section.get("Transcript", "")
-
-            # Track section
-            current_section = section_num
-
-            if current_section != next_section:
-                file.write(f"Part {section_num}\n")
-            else:
-                file.write("\n")
-
-            file.write(f"{transcript}\n")
-
-            file.write(f"\n -------------------------------------------------------------------------------------------------\n")
-
-            next_section = section_num
-
-    with open(temp_txt_path, "w", encoding="utf-8") as file:
-        # Header
-        file.write("                               IELTS Listening Test \n")
-        file.write(f"                                        Set {next_set}        \n")
-        file.write(f"                                   {formatted_date}\n\n")
-
-        # Body
-        next_section = None
-
-        for section in sections:
-
-            section_num = str(section.get("Section", "")).strip()
-            transcript = section.get("Transcript", "")
-
-            # Track section
-            current_section = section_num
-
-            if current_section != next_section:
-                file.write(f"Part {section_num}\n")
-            else:
-                file.write("\n")
-
-            file.write(f"{transcript}\n")
-
-            file.write(f"\n -------------------------------------------------------------------------------------------------\n")
-
-            next_section = section_num
-
-# 4. Questions Only TXT
-def export_question_txt(set_folder, next_set, temp_folder):
-    key, sections = get_key_and_sections()
-    formatted_date = format_date_from_key(key)
-    question_txt_path = os.path.join(set_folder, "questions.txt")
-    temp_txt_path = os.path.join(temp_folder, "questions.txt")
-
-    with open(question_txt_path, "w", encoding="utf-8") as file:
-
-        # Header
-        file.write("                               IELTS Listening Test \n")
-        file.write(f"                                        Set {next_set}       \n")
-        file.write(f"                                   {formatted_date}\n\n")
-
-        # Body
-        next_section = None
-
-        for section in sections:
-
-            section_num = str(section.get("Section", "")).strip()
-            instructions = section.get("Instructions", "")
-            questions = section.get("Questions", [])
-            diagram = section.get("Diagram", "")
-            options = section.get("Options", [])
-            type_code = section.get("Type").split()[0]
-
-            # Track section
-            current_section = section_num
-
-            if current_section != next_section:
-                file.write(f"Part {section_num}\n")
-            else:
-                file.write("\n")
-
-            file.write(f"{instructions}\n\n")
-
-            if type_code in ["T001", "T003", "T004", "T008", "T011"]:
-                if diagram and diagram.strip() != "":
-                    file.write(f"{diagram}\n\n")
-                    file.write(f"Answers: \n")
-                    for q in questions:
-                        file.write(f"{q}. ________________\n")
-                else:
-                    for q in questions:
-                        file.write(f"{q}\n")
-
-            if type_code in ["T005", "T007"]:
-                if options and len(options) != 0:
-                    for q in questions:
-                        file.write(f"{q}\n")
-                        for o in options:
-                            if isinstance(o, list):  
-                                o = " ".join(o)
-                            file.write(f"{o}\n")
-                        file.write(f"\n")
-
-            if type_code == "T006":
-                file.write(f"--------------------------------\n")
-                for o in options:
-                    if isinstance(o, list):  
-                        o = " ".join(o)
-                    file.write(f"    {o}\n")
-                file.write(f"--------------------------------\n\n")
-                for q in questions:
-                    file.write(f"{q} _____________________\n")
-            
-            if type_code in ["T009", "T010"]:
-                for q in questions:
-                    file.write(f"{q}\n")
-
-            if type_code in ["T002"]:
-                file.write(f"{diagram}\n")
-
-            file.write(f"\n -------------------------------------------------------------------------------------------------\n")
-
-            next_section = section_num
- 
-        file.write("                               End of Paper")
-
-    with open(temp_txt_path, "w", encoding="utf-8") as file:
-
-        # Header
-        file.write("                               IELTS Listening Test \n")
-        file.write(f"                                        Set {next_set}       \n")
-        file.write(f"                                   {formatted_date}\n\n")
-
-        # Body
-        next_section = None
-
-        for section in sections:
-
-            section_num = str(section.get("Section", "")).strip()
-            instructions = section.get("Instructions", "")
-            questions = section.get("Questions", [])
-            diagram = section.get("Diagram", "")
-            options = section.get("Options", [])
-            type_code = section.get("Type").split()[0]
-
-            # Track section
-            current_section = section_num
-
-            if current_section != next_section:
-                file.write(f"Part {section_num}\n")
-            else:
-                file.write("\n")
-
-            file.write(f"{instructions}\n\n")
-
-            if type_code in ["T001", "T003", "T004", "T008", "T011"]:
-                if diagram and diagram.strip() != "":
-                    file.write(f"{diagram}\n\n")
-                    file.write(f"Answers: \n")
-                    for q in questions:
-                        file.write(f"{q}. ________________\n")
-                else:
-                    for q in questions:
-                        file.write(f"{q}\n")
-
-            if type_code in ["T005", "T007"]:
-                if options and len(options) != 0:
-                    for q in questions:
-                        file.write(f"{q}\n")
-                        for o in options:
-                            if isinstance(o, list):  
-                                o = " ".join(o)
-                            file.write(f"{o}\n")
-                        file.write(f"\n")
-
-            if type_code == "T006":
-                file.write(f"--------------------------------\n")
-                for o in options:
-                    if isinstance(o, list):  
-                        o = " ".join(o)
-                    file.write(f"    {o}\n")
-                file.write(f"--------------------------------\n\n")
-                for q in questions:
-                    file.write(f"{q} _____________________\n")
-            
-            if type_code in ["T009", "T010"]:
-                for q in questions:
-                    file.write(f"{q}\n")
-
-            if type_code in ["T002"]:
-                file.write(f"{diagram}\n")
-
-            file.write(f"\n -------------------------------------------------------------------------------------------------\n")
-
-            next_section = section_num
- 
-        file.write("                               End of Paper")
+        next_section = section_num
 
-def generate_files():
-    set_folder, next_set, temp_folder = get_set_folder()
-    export_full_pdf(set_folder, next_set, temp_folder)
-    export_questions_pdf(set_folder, next_set, temp_folder)
-    export_question_txt(set_folder, next_set, temp_folder)
-    export_transcript_txt(set_folder, next_set, temp_folder)
-    return set_folder
\ No newline at end of file
+    lines.append("                               End of Paper")
+    write_text(path, "".join(lines))
+
+# 5. Answer key, read by the marking
+def render_answer_key(qset, path):
+    key = build_answer_key(qset.sections, qset.set_number, qset.date)
+    write_text(path, json.dumps(key, indent=2, ensure_ascii=False))
+
+# File name -> renderer(qset, path)
+ARTIFACTS = {
+    "full_set.pdf": render_full_pdf,
+    "questions.pdf": render_questions_pdf,
+    "questions.txt": render_question_txt,
+    "transcript.txt": render_transcript_txt,
+    ANSWER_KEY_NAME: render_answer_key
+}
+PDF_ARTIFACTS = ["full_set.pdf", "questions.pdf"]
+
+def render_artifact(name, qset, path):
+    ARTIFACTS[name](qset, path)
+    return path
+
+# PDF workers load the fonts and logo once, when they start
+def init_pdf_worker():
+    registry.get("pdf_assets")
+
+def load_pdf_pool():
+    if PDF_RENDER_WORKERS <= 0:
+        return None
+    return ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=init_pdf_worker)
+
+registry.register("pdf_pool", load_pdf_pool)
+
+def prune_fragments(fragment_folder, keep):
+    for entry in os.scandir(fragment_folder):
+        if entry.name.endswith(".pdf") and entry.path not in keep:
+            os.remove(entry.path)
+
+# Renders the artifacts into set_folder, then links them into temp_folder. The PDFs are stitched from the
+# fragments in fragment_folder (default: a "fragments" folder in temp_folder, else in set_folder); only the
+# fragments missing from it are rendered, those of the question paper and the rest of the full set in
+# parallel, here and in the worker pool.
+def render_set(qset, set_folder, temp_folder=None, names=None, fragment_folder=None):
+    names = list(names or ARTIFACTS)
+    pdf_names = [n for n in names if n in PDF_ARTIFACTS]
+    fragment_folder = fragment_folder or os.path.join(temp_folder or set_folder, FRAGMENT_DIR)
+    os.makedirs(fragment_folder, exist_ok=True)
+
+    fragments = set_fragments(qset)
+    fragment_paths = {name: [fragment_path(fragment_folder, f) for f in fragments[name]] for name in PDF_ARTIFACTS}
+    batches, seen = [], set()
+    for name in sorted(pdf_names, key=lambda n: n != "questions.pdf"):
+        batch = []
+        for fragment, path in zip(fragments[name], fragment_paths[name]):
+            if path not in seen and not os.path.exists(path):
+                batch.append((path, fragment))
+            seen.add(path)
+        if batch:
+            batches.append(batch)
+
+    # The pool renders all but the last batch, which is rendered here with the text files
+    pool = registry.get("pdf_pool") if len(batches) > 1 else None
+    futures = [pool.submit(render_fragments, batch) for batch in batches[:-1]] if pool is not None else []
+    for name in names:
+        if name not in PDF_ARTIFACTS:
+            render_artifact(name, qset, os.path.join(set_folder, name))
+    for batch in batches[len(futures):]:
+        render_fragments(batch)
+    for index, future in enumerate(futures):
+        try:
+            future.result()
+        except BrokenProcessPool as e:
+            print(f"[CONVERTION] PDF worker pool failed ({e}), rendering the fragments in-process")
+            registry.discard("pdf_pool")
+            pool.shutdown(wait=False, cancel_futures=True)
+            for batch in batches[index:len(futures)]:
+                render_fragments(batch)
+            break
+
+    for name in pdf_names:
+        stitch_pdf(fragment_paths[name], os.path.join(set_folder, name))
+    prune_fragments(fragment_folder, {path for paths in fragment_paths.values() for path in paths})
+
+    if temp_folder:
+        for name in names:
+            link_or_copy(os.path.join(set_folder, name), os.path.join(temp_folder, name))
+
+# Single artifacts, for callers that render one file (e.g. the preview after a regeneration)
+def export_full_pdf(set_folder, next_set, temp_folder, json_path=TEMP_JSON):
+    render_set(load_question_set(json_path, next_set), set_folder, temp_folder, ["full_set.pdf"])
+
+def export_questions_pdf(set_folder, next_set, temp_folder, json_path=TEMP_JSON):
+    render_set(load_question_set(json_path, next_set), set_folder, temp_folder, ["questions.pdf"])
+
+def export_transcript_txt(set_folder, next_set, temp_folder, json_path=TEMP_JSON):
+    render_set(load_question_set(json_path, next_set), set_folder, temp_folder, ["transcript.txt"])
+
+def export_question_txt(set_folder, next_set, temp_folder, json_path=TEMP_JSON):
+    render_set(load_question_set(json_path, next_set), set_folder, temp_folder, ["questions.txt"])
+
+# json_path: the generated set to render; temp_folder: where the preview copies go;
+# params / user_id: recorded in the set's manifest
+# set_number: a set allocated by an earlier attempt, rendered again instead of taking a new number;
+# on_allocated(number) is called once a new number is taken
+def generate_files(json_path=TEMP_JSON, temp_folder=None, params=None, user_id=None, set_number=None, on_allocated=None):
+    # Parsed before a set number is taken, so a broken file does not use one up
+    qset = load_question_set(json_path)
+    entry = get_set_index().get(set_number) if set_number else None
+    if entry:
+        set_folder, next_set = entry["folder"], set_number
+        temp_folder = temp_folder or os.path.join(BASE_DIR, "static", "temp")
+        os.makedirs(set_folder, exist_ok=True)
+        os.makedirs(temp_folder, exist_ok=True)
+    else:
+        set_folder, next_set, temp_folder = get_set_folder(temp_folder, params, user_id)
+        if on_allocated:
+            on_allocated(next_set)
+    qset.set_number = next_set
+    render_set(qset, set_folder, temp_folder)
+    get_set_index().record(next_set)
+    return set_folder
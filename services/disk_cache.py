@@ -0,0 +1,138 @@
+# Import necessary libraries
+import os
+import json
+import time
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+# Content-addressed file store with LRU eviction.
+# One file per key under directory/<key[:2]>/; entries are evicted least-recently-used first once the
+# store is over max_bytes, or when older than max_age seconds (None keeps them until evicted by size).
+# Several processes can share a directory: a file another process wrote is adopted when it is first
+# read, and the index is rebuilt from disk (access times keep the shared LRU order) every rescan_every
+# seconds, so each process's size total follows what is on disk.
+class DiskLRUCache:
+    def __init__(self, directory, max_bytes, max_age=None, suffix=".bin", rescan_every=300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.suffix = suffix
+        self.rescan_every = rescan_every
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (size, created), oldest access first
+        self.total_bytes = 0
+        self.scanned = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scan()
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    # Rebuild the LRU order from disk, using file access times
+    def _scan(self):
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.scanned = time.time()
+        if not os.path.isdir(self.directory):
+            return
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((max(st.st_atime, st.st_mtime), name[:-len(self.suffix)], st.st_size, st.st_mtime))
+        for _, key, size, created in sorted(found):
+            self.entries[key] = (size, created)
+            self.total_bytes += size
+
+    # Index entry for a file written by another process, or None
+    def _adopt(self, key):
+        try:
+            st = os.stat(self._path(key))
+        except OSError:
+            return None
+        self.entries[key] = (st.st_size, st.st_mtime)
+        self.total_bytes += st.st_size
+        return self.entries[key]
+
+    def _expired(self, created, now):
+        return self.max_age is not None and now - created > self.max_age
+
+    def _drop(self, key):
+        size, _ = self.entries.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, (_, created) in self.entries.items() if self._expired(created, now)]:
+            self._drop(key)
+            self.evictions += 1
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def get_bytes(self, key):
+        with self.lock:
+            entry = self.entries.get(key) or self._adopt(key)
+            if entry is None or self._expired(entry[1], time.time()):
+                if entry is not None:
+                    self._drop(key)
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            try:
+                os.utime(self._path(key), (time.time(), entry[1]))
+            except OSError:
+                pass
+            self.hits += 1
+            return data
+
+    def put_bytes(self, key, data):
+        path = self._path(key)
+        with self.lock:
+            if time.time() - self.scanned > self.rescan_every:
+                self._scan()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[0]
+            self.entries[key] = (len(data), time.time())
+            self.total_bytes += len(data)
+            self._evict()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes
+            }
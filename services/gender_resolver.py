@@ -0,0 +1,111 @@
+# Import necessary libraries
+import os
+import re
+import json
+import threading
+
+# Speaker name -> "male" / "female" / None, without a model call for the common case.
+# Order: titles and role words ("Mr", "Woman"...), the bundled first-name table, then the memo of
+# earlier model answers. Names still unknown are sent to the model together, in one call per batch.
+TITLE_GENDERS = {
+    "mr": "male", "sir": "male", "man": "male", "boy": "male", "gentleman": "male", "father": "male",
+    "dad": "male", "husband": "male", "son": "male", "brother": "male", "uncle": "male", "grandfather": "male",
+    "mrs": "female", "ms": "female", "miss": "female", "madam": "female", "woman": "female", "girl": "female",
+    "lady": "female", "mother": "female", "mum": "female", "mom": "female", "wife": "female",
+    "daughter": "female", "sister": "female", "aunt": "female", "grandmother": "female"
+}
+
+UNKNOWN = "unknown"
+
+def name_tokens(name):
+    return re.findall(r"[a-z]+", str(name).lower())
+
+# Model reply -> {name: answer}, None when the reply is not a JSON object
+def parse_genders(text):
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        match = re.search(r"\{.*\}", str(text), re.DOTALL)
+        if not match:
+            return None
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            return None
+    if not isinstance(data, dict):
+        return None
+    return {str(k): str(v).strip().lower() for k, v in data.items()}
+
+class GenderResolver:
+    def __init__(self, table_path, memo_path=None):
+        with open(table_path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+        self.table = {n.lower(): gender for gender, names in table.items() for n in names}
+        self.memo_path = memo_path
+        self.memo = {}
+        self.lock = threading.Lock()
+        if memo_path and os.path.exists(memo_path):
+            try:
+                with open(memo_path, "r", encoding="utf-8") as f:
+                    self.memo = json.load(f)
+            except (OSError, ValueError):
+                self.memo = {}
+
+    @staticmethod
+    def memo_key(name):
+        return " ".join(name_tokens(name))
+
+    # Resolves without the model; returns "male", "female", UNKNOWN (asked before, no answer) or None (never asked)
+    def lookup(self, name):
+        tokens = name_tokens(name)
+        if not tokens:
+            return UNKNOWN
+        if tokens[0] in TITLE_GENDERS:
+            return TITLE_GENDERS[tokens[0]]
+        for token in tokens:
+            if token in self.table:
+                return self.table[token]
+        for token in tokens:
+            if token in TITLE_GENDERS:
+                return TITLE_GENDERS[token]
+        with self.lock:
+            return self.memo.get(self.memo_key(name))
+
+    def resolve(self, name, ask_model=None):
+        return self.resolve_many([name], ask_model).get(name)
+
+    # ask_model(names) -> {name: answer} or None on failure; called at most once, with every name still unknown
+    def resolve_many(self, names, ask_model=None):
+        results = {}
+        unknown = []
+        for name in dict.fromkeys(names):
+            gender = self.lookup(name)
+            if gender is None:
+                unknown.append(name)
+            else:
+                results[name] = gender
+
+        answers = ask_model(unknown) if unknown and ask_model is not None else None
+        # A failed call (None) is not memoised, so the names are asked again next time
+        if answers is not None:
+            answers = {k.strip().lower(): v for k, v in answers.items()}
+            with self.lock:
+                for name in unknown:
+                    answer = answers.get(name.strip().lower())
+                    gender = answer if answer in ("male", "female") else UNKNOWN
+                    self.memo[self.memo_key(name)] = gender
+                    results[name] = gender
+            self.save()
+
+        return {name: (None if results.get(name, UNKNOWN) == UNKNOWN else results[name]) for name in names}
+
+    def save(self):
+        if not self.memo_path:
+            return
+        with self.lock:
+            payload = json.dumps(self.memo, ensure_ascii=False, indent=2, sort_keys=True)
+        os.makedirs(os.path.dirname(self.memo_path) or ".", exist_ok=True)
+        tmp_path = f"{self.memo_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.memo_path)
@@ -0,0 +1,203 @@
+# Import necessary libraries
+import os
+import json
+import time
+import shutil
+
+from services.jobs import register_handler
+from services.workspaces import Workspace
+from services.set_index import get_set_index
+from services.bundles import build_bundles_in_background
+
+# Job handlers, run inside the job worker processes.
+# Importing the services registers their resources; a worker warms up those of the job kinds it runs.
+import services.question_generator
+import services.audio
+import services.automated_marking
+import services.convertion
+
+GENERATION_RESOURCES = ["gemini", "question_types", "similarity_index", "reward_scorer", "tts", "voices", "speaker_latents", "nltk_punkt", "pdf_assets"]
+WARM_UP_BY_KIND = {
+    "generate": GENERATION_RESOURCES,
+    "regenerate": GENERATION_RESOURCES,
+    "audio": ["tts", "voices", "speaker_latents", "nltk_punkt"],
+    "marking": ["gemini", "ocr_reader"]
+}
+
+# Resources used by the given job kinds (all kinds when None), in warm-up order
+def warm_up_order(kinds=None):
+    names = []
+    for kind in kinds or WARM_UP_BY_KIND:
+        names += [name for name in WARM_UP_BY_KIND.get(kind, []) if name not in names]
+    return names
+
+MARKING_OUTPUT_DIR = os.path.join("static", "marking_data")
+
+# Question generation (+ files, + audio when requested)
+def run_generate(payload, job):
+    from services.convertion import generate_files
+
+    # The generation's workspace is named after its job
+    workspace = Workspace(job.id).create()
+    section_choices = payload["section_choices"]
+    generation_mode = payload.get("generation_mode")
+
+    # A retry reuses the questions and the set number of the attempt that failed after them
+    if payload.get("questions_ready") and os.path.exists(workspace.questions_path):
+        with open(workspace.questions_path, "r", encoding="utf-8") as f:
+            full_set_output = json.load(f)
+        print(f"[JOBS] Generation {job.id} resumed from its questions (attempt {job.attempt})")
+    else:
+        full_set_output = generate_questions(workspace, section_choices, generation_mode, job)
+        job.checkpoint({"questions_ready": True})
+
+    timestamp_key = list(full_set_output.keys())[0]
+    questions_list = full_set_output[timestamp_key]
+
+    job.progress({'progress': 50, 'status': 'Questions Generated', 'task': f'Generated {len(questions_list)} question sets'})
+    params = {"section_choices": section_choices, "generation_mode": generation_mode, "with_audio": bool(payload.get("with_audio")), "job": job.id}
+    target_set_folder = generate_files(
+        workspace.questions_path, workspace.path, params, payload.get("user_id"),
+        set_number=payload.get("set_number"), on_allocated=lambda num: job.checkpoint({"set_number": num})
+    )
+
+    if payload.get("with_audio"):
+        job.progress({'progress': 60, 'status': 'Generating Audio', 'task': 'Synthesizing voices...'})
+        synthesize_set_audio(questions_list, workspace.audio_dir, target_set_folder, job)
+        # The manifest is updated with the audio files
+        set_index = get_set_index()
+        set_index.record(set_index.get_by_name(os.path.basename(target_set_folder))["num"])
+
+    # Download bundles are built while the user reviews the set
+    build_bundles_in_background(target_set_folder)
+
+    return {"questions": questions_list, "section_choices": section_choices, "generation_mode": generation_mode, "set_folder": target_set_folder, "workspace": workspace.id}
+
+# The model's questions, written to the workspace
+def generate_questions(workspace, section_choices, generation_mode, job):
+    from services.question_generator import generate_full_set
+
+    job.progress({'progress': 20, 'status': 'Generating Questions', 'task': 'Calling AI model...'})
+
+    # Streaming progress from the model, written to the job at most twice a second
+    last = {"sent": 0, "counts": None}
+    def on_progress(event):
+        counts = (event["questions"], event["transcripts"], event["groups_done"])
+        if counts == last["counts"] and time.time() - last["sent"] < 0.5:
+            return
+        last["counts"], last["sent"] = counts, time.time()
+
+        done = 0.5 * event["questions"] / max(1, event["question_total"]) + 0.5 * event["transcripts"] / max(1, event["transcript_total"])
+        task = (f"{event['label']}: {event['questions']}/{event['question_total']} questions, "
+                f"{event['transcripts']}/{event['transcript_total']} transcripts, {event['tokens']} tokens")
+        job.progress({'progress': 20 + int(29 * done), 'status': 'Generating Questions', 'task': task, 'tokens': event['tokens'], 'questions': event['questions'], 'transcripts': event['transcripts']})
+
+    full_set_output = generate_full_set(section_choices, mode=generation_mode, on_progress=on_progress, output_path=workspace.questions_path)
+    if not full_set_output:
+        raise Exception("No questions generated.")
+    if not full_set_output[list(full_set_output.keys())[0]]:
+        raise Exception("Generated questions list empty.")
+    return full_set_output
+
+# Parts are synthesized in parallel when TTS workers are configured, reported as they finish
+def synthesize_set_audio(questions, audio_dir, set_folder, job):
+    from services.audio import iter_parts_audio, transcripts_by_part, save_full_audio, write_wav
+
+    part_audios = {}
+    for done, (part_num, audio_seg) in enumerate(iter_parts_audio(transcripts_by_part(questions), audio_dir), 1):
+        if set_folder != audio_dir:
+            write_wav(os.path.join(audio_dir, f"part_{part_num}.wav"), audio_seg)
+        part_audios[part_num] = audio_seg
+        job.progress({'progress': 60 + (done * 8), 'status': 'Generating Audio', 'task': f'Part {part_num} audio ready ({done}/4)'})
+    part_audios = [part_audios[p] for p in sorted(part_audios)]
+
+    if part_audios:
+        save_full_audio(part_audios, set_folder)
+    return part_audios
+
+# Audio for a generation's workspace, or for payload["audio_dir"] when there is none
+def workspace_audio_dir(payload):
+    if payload.get("workspace"):
+        return Workspace(payload["workspace"]).create().audio_dir
+    return payload["audio_dir"]
+
+def run_audio(payload, job):
+    audio_dir = workspace_audio_dir(payload)
+    job.progress({'progress': 0, 'status': 'Generating Audio', 'task': 'Synthesizing voices...'})
+    synthesize_set_audio(payload["questions"], audio_dir, audio_dir, job)
+    return {"audio_dir": audio_dir}
+
+def run_regenerate(payload, job):
+    from services.question_generator import generate_specific_part
+    from services.audio import generate_part_audio, write_wav
+    from services.convertion import export_full_pdf
+
+    workspace = Workspace(payload["workspace"]).create()
+    part_num = payload["part"]
+    job.progress({'status': 'Regenerating', 'task': f'Generating Part {part_num}...'})
+    updated_part_wrapper = generate_specific_part(part_num, payload.get("spec"), payload.get("section_choices"), mode=payload.get("generation_mode"), questions_path=workspace.questions_path)
+    timestamp_key = list(updated_part_wrapper.keys())[0]
+    merged = updated_part_wrapper[timestamp_key]
+    updated_json = next((item for item in merged if str(item.get("Section", "")).strip() == f"Part {part_num}"), merged[0])
+
+    job.progress({'status': 'Regenerating', 'task': f'Synthesizing Part {part_num} audio...'})
+    audio_seg = generate_part_audio(updated_json.get("Transcript", ""), part_num, workspace.audio_dir)
+    write_wav(os.path.join(workspace.audio_dir, f"part_{part_num}.wav"), audio_seg)
+
+    job.progress({'status': 'Regenerating', 'task': 'Exporting preview PDF...'})
+    try:
+        export_full_pdf(workspace.path, 0, workspace.path, workspace.questions_path)
+    except Exception as e:
+        print(f"Error regenerating preview PDF: {e}")
+
+    return {"updated_data": updated_json}
+
+# The uploads are kept for a retry, and removed once the job succeeded or failed its last attempt
+def run_marking(payload, job):
+    try:
+        result = mark_uploads(payload, job)
+    except Exception:
+        if job.last_attempt:
+            remove_uploads(payload)
+        raise
+    remove_uploads(payload)
+    return result
+
+def remove_uploads(payload):
+    shutil.rmtree(payload["upload_dir"], ignore_errors=True)
+
+def mark_uploads(payload, job):
+    from services.automated_marking import extract_text_from_pdf, extract_text_from_upload, mark_batch_answers, mark_answers, export_results_to_pdf
+    from services.answer_key import load_answer_key
+
+    set_folder = os.path.join("static", "output", payload["set_name"])
+    full_pdf_path = os.path.join(set_folder, "full_set.pdf")
+    # The set's answer key; sets generated before keys were written are marked from the full set PDF
+    answer_key = load_answer_key(set_folder)
+    if answer_key is None and not os.path.exists(full_pdf_path):
+        raise Exception("Official full_set.pdf not found")
+
+    job.progress({'status': 'Marking', 'task': 'Reading answer sheets...'})
+    upload_dir = payload["upload_dir"]
+    student_texts = [extract_text_from_upload(os.path.join(upload_dir, name)) for name in payload["files"]]
+
+    job.progress({'status': 'Marking', 'task': f'Marking {len(student_texts)} answer sheet(s)...'})
+    if answer_key:
+        # Matched locally, the model only sees the ambiguous answers
+        results = mark_answers(answer_key, student_texts)
+    else:
+        raw_result = mark_batch_answers(extract_text_from_pdf(full_pdf_path), student_texts)
+        try:
+            results = json.loads(raw_result)
+        except Exception as e:
+            raise Exception(f"AI output parsing failed: {e}")
+
+    os.makedirs(MARKING_OUTPUT_DIR, exist_ok=True)
+    output_name = f"marking_result_{job.id}.pdf"
+    export_results_to_pdf(results, full_pdf_path, os.path.join(MARKING_OUTPUT_DIR, output_name))
+    return {"pdf_url": f"/static/marking_data/{output_name}"}
+
+register_handler("generate", run_generate)
+register_handler("regenerate", run_regenerate)
+register_handler("audio", run_audio)
+register_handler("marking", run_marking, cleanup=remove_uploads)
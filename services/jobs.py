@@ -0,0 +1,326 @@
+# Import necessary libraries
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import sqlite3
+import threading
+import traceback
+import multiprocessing
+
+# Durable job queue.
+# Jobs (question generation, regeneration, audio, marking) are rows in a SQLite database and run in
+# separate worker processes. A job whose worker stops sending heartbeats (crash, web restart) is
+# queued again; failures are retried with exponential backoff up to the job's max_attempts.
+JOB_DATA_DIR = os.getenv("JOB_DATA_DIR", "jobs")
+JOB_DB_PATH = os.getenv("JOB_DB", os.path.join(JOB_DATA_DIR, "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 3))
+# Job kinds of the workers started together. From MARKING_WORKER_FROM workers on, the last one only
+# marks and the others take the generation kinds, so each loads only its own models; with fewer workers
+# every worker runs every kind, so two workers still run two generations side by side.
+GENERATION_KINDS = ["generate", "regenerate", "audio"]
+MARKING_KINDS = ["marking"]
+MARKING_WORKER_FROM = 3
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 0.5))
+JOB_HEARTBEAT_SECONDS = 5
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", 60))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", 5))
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", 7))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    heartbeat REAL,
+    worker TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, run_after, created);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    pid INTEGER,
+    started REAL,
+    heartbeat REAL,
+    resources TEXT
+);
+"""
+
+# Job kind -> handler(payload, job), registered by services.job_tasks; cleanup(payload) runs when a
+# job of the kind fails for good without its handler seeing it (its worker stopped responding)
+HANDLERS = {}
+CLEANUPS = {}
+
+def register_handler(kind, handler, cleanup=None):
+    HANDLERS[kind] = handler
+    if cleanup:
+        CLEANUPS[kind] = cleanup
+
+class JobStore:
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn().executescript(SCHEMA)
+
+    # One connection per thread; autocommit, transactions are opened explicitly
+    def conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    # Closes this thread's connection; the web process calls it when a request ends, its request
+    # threads would otherwise each keep one open
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    @staticmethod
+    def to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("payload", "progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def enqueue(self, kind, payload, max_attempts=3, delay=0):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.conn().execute(
+            "INSERT INTO jobs (id, kind, payload, status, max_attempts, run_after, created, updated) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), max_attempts, now + delay, now, now)
+        )
+        return job_id
+
+    def get(self, job_id):
+        return self.to_dict(self.conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    # Atomically takes the oldest runnable job, or returns None
+    def claim(self, worker_id, kinds=None):
+        conn = self.conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            query = "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ?"
+            params = [now]
+            if kinds:
+                query += f" AND kind IN ({','.join('?' * len(kinds))})"
+                params += list(kinds)
+            row = conn.execute(query + " ORDER BY created LIMIT 1", params).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, heartbeat = ?, updated = ? WHERE id = ?",
+                (worker_id, now, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def set_progress(self, job_id, progress):
+        now = time.time()
+        self.conn().execute(
+            "UPDATE jobs SET progress = ?, heartbeat = ?, updated = ? WHERE id = ?",
+            (json.dumps(progress, ensure_ascii=False), now, now, job_id)
+        )
+
+    # Merges fields into the job's payload, so a retry resumes from what an earlier attempt finished
+    def update_payload(self, job_id, fields):
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            payload = dict(json.loads(row["payload"]), **fields)
+            conn.execute("UPDATE jobs SET payload = ?, updated = ? WHERE id = ?", (json.dumps(payload, ensure_ascii=False), time.time(), job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def heartbeat(self, job_id):
+        self.conn().execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def complete(self, job_id, result):
+        self.conn().execute(
+            "UPDATE jobs SET status = 'completed', result = ?, error = NULL, updated = ? WHERE id = ?",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id)
+        )
+
+    # Queues the job again after a backoff, or marks it failed once its attempts are used up
+    def fail(self, job_id, error):
+        job = self.get(job_id)
+        now = time.time()
+        if job["attempts"] < job["max_attempts"]:
+            delay = JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+            self.conn().execute(
+                "UPDATE jobs SET status = 'queued', error = ?, run_after = ?, updated = ? WHERE id = ?",
+                (error, now + delay, now, job_id)
+            )
+            return "queued"
+        self.conn().execute("UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?", (error, now, job_id))
+        return "failed"
+
+    # Running jobs without a recent heartbeat lost their worker
+    def recover_stale(self, stale_after=JOB_STALE_SECONDS):
+        cutoff = time.time() - stale_after
+        rows = self.conn().execute("SELECT id, kind, payload FROM jobs WHERE status = 'running' AND heartbeat < ?", (cutoff,)).fetchall()
+        for row in rows:
+            state = self.fail(row["id"], "Worker stopped responding")
+            print(f"[JOBS] Job {row['id']} lost its worker, {state}")
+            if state == "failed" and row["kind"] in CLEANUPS:
+                CLEANUPS[row["kind"]](json.loads(row["payload"]))
+        return len(rows)
+
+    def prune(self, older_than_days=JOB_RETENTION_DAYS):
+        cutoff = time.time() - older_than_days * 86400
+        self.conn().execute("DELETE FROM jobs WHERE status IN ('completed', 'failed') AND updated < ?", (cutoff,))
+
+    def worker_heartbeat(self, worker_id, resources=None):
+        now = time.time()
+        self.conn().execute(
+            "INSERT INTO workers (id, pid, started, heartbeat, resources) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat, resources = excluded.resources",
+            (worker_id, os.getpid(), now, now, json.dumps(resources or {}))
+        )
+
+    def live_workers(self, stale_after=JOB_STALE_SECONDS):
+        rows = self.conn().execute("SELECT * FROM workers WHERE heartbeat >= ?", (time.time() - stale_after,)).fetchall()
+        return [dict(row, resources=json.loads(row["resources"] or "{}")) for row in rows]
+
+    def remove_worker(self, worker_id):
+        self.conn().execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+# What a handler sees of its job: id, attempt number, progress and checkpoint callbacks
+class JobContext:
+    def __init__(self, store, job):
+        self.store = store
+        self.id = job["id"]
+        self.attempt = job["attempts"]
+        self.last_attempt = job["attempts"] >= job["max_attempts"]
+
+    def progress(self, progress):
+        self.store.set_progress(self.id, progress)
+
+    def checkpoint(self, fields):
+        self.store.update_payload(self.id, fields)
+
+# Worker
+def run_job(store, job, worker_id, resource_names=None):
+    handler = HANDLERS.get(job["kind"])
+    if handler is None:
+        store.fail(job["id"], f"No handler for job kind '{job['kind']}'")
+        return
+
+    from services.resources import registry
+
+    # The worker keeps reporting itself alive while the job runs
+    stop = threading.Event()
+    def beat():
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            store.heartbeat(job["id"])
+            store.worker_heartbeat(worker_id, registry.status(resource_names))
+    threading.Thread(target=beat, daemon=True).start()
+
+    start = time.perf_counter()
+    try:
+        result = handler(job["payload"], JobContext(store, job))
+        store.complete(job["id"], result)
+        print(f"[JOBS] {job['kind']} {job['id']} completed in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        traceback.print_exc()
+        state = store.fail(job["id"], str(e))
+        print(f"[JOBS] {job['kind']} {job['id']} failed (attempt {job['attempts']}/{job['max_attempts']}), {state}")
+    finally:
+        stop.set()
+
+# kinds: the job kinds this worker takes (None: all); it warms up only the resources they use
+def run_worker(db_path=JOB_DB_PATH, warm_up=True, kinds=None):
+    # Importing the tasks registers the handlers and the resources they use
+    import services.job_tasks
+    from services.resources import registry
+    from services.workspaces import prune_workspaces
+
+    worker_id = f"{os.uname().nodename if hasattr(os, 'uname') else 'worker'}-{os.getpid()}"
+    store = JobStore(db_path)
+    store.prune()
+    prune_workspaces()
+    resource_names = services.job_tasks.warm_up_order(kinds)
+    if warm_up:
+        registry.warm_up(resource_names)
+    print(f"[JOBS] Worker {worker_id} started ({', '.join(kinds) if kinds else 'all jobs'})")
+
+    last_beat = 0
+    try:
+        while True:
+            if time.time() - last_beat > JOB_HEARTBEAT_SECONDS:
+                store.worker_heartbeat(worker_id, registry.status(resource_names))
+                store.recover_stale()
+                last_beat = time.time()
+
+            job = store.claim(worker_id, kinds)
+            if job is None:
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+            run_job(store, job, worker_id, resource_names)
+    finally:
+        store.remove_worker(worker_id)
+
+# Job kinds of the index-th of count workers (None: all)
+def worker_kinds(index, count):
+    if count < MARKING_WORKER_FROM:
+        return None
+    return MARKING_KINDS if index == count - 1 else GENERATION_KINDS
+
+worker_processes = []
+
+def stop_workers():
+    for process in worker_processes:
+        if process.is_alive():
+            process.terminate()
+    for process in worker_processes:
+        process.join(timeout=5)
+
+# Starts worker processes owned by this (web) process; they are not daemonic so they can run their
+# own TTS process pool, and are terminated when the web process exits
+def start_workers(count=JOB_WORKERS, db_path=JOB_DB_PATH, warm_up=True):
+    context = multiprocessing.get_context("spawn")
+    for index in range(count):
+        process = context.Process(target=run_worker, args=(db_path, warm_up, worker_kinds(index, count)), daemon=False)
+        process.start()
+        worker_processes.append(process)
+    if count:
+        atexit.register(stop_workers)
+    return worker_processes
+
+# Standalone workers, e.g. next to a multi-process web server started with JOB_WORKERS=0:
+#   python -m services.jobs [count]
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else max(1, JOB_WORKERS)
+    if count == 1:
+        run_worker()
+    else:
+        start_workers(count)
+        for process in worker_processes:
+            process.join()
@@ -0,0 +1,159 @@
+# Incremental scanner for streamed JSON question sets.
+# It does not build the document, it only follows the structure chunk by chunk and counts what has
+# completed so far: question strings, finished transcripts and finished entries. The full text is
+# still parsed with safe_json_parse once the stream ends.
+
+import json
+
+WHITESPACE = " \t\r\n"
+
+class JSONProgressParser:
+    def __init__(self):
+        self.stack = []          # frames: {"type": "obj"/"arr", "name": key in parent, "key": current key}
+        self.in_string = False
+        self.escape = False
+        self.string_is_key = False
+        self.key_chars = []
+        self.in_literal = False
+        self.chars = 0
+        self.questions = 0
+        self.transcripts = 0
+        self.entries = 0
+
+    def snapshot(self):
+        return {
+            "chars": self.chars,
+            "questions": self.questions,
+            "transcripts": self.transcripts,
+            "entries": self.entries
+        }
+
+    def feed(self, text):
+        self.chars += len(text)
+        for ch in text:
+            self._step(ch)
+        return self.snapshot()
+
+    # Name of a container opened now: its key in the parent object; items of an array have none
+    def _current_name(self):
+        frame = self.stack[-1] if self.stack else None
+        if frame is None or frame["type"] != "obj":
+            return None
+        return frame["key"]
+
+    # A value (string, literal or container) finished inside the current frame
+    def _value_done(self, kind):
+        if not self.stack:
+            return
+        frame = self.stack[-1]
+        if frame["type"] == "arr" and frame["name"] == "Questions":
+            self.questions += 1
+        if frame["type"] == "obj" and frame["key"] == "Transcript" and kind == "string":
+            self.transcripts += 1
+
+    def _step(self, ch):
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+                if self.string_is_key:
+                    self.key_chars.append(ch)
+            elif ch == "\\":
+                self.escape = True
+            elif ch == '"':
+                self.in_string = False
+                if self.string_is_key:
+                    self.stack[-1]["key"] = "".join(self.key_chars)
+                    self.stack[-1]["expect_key"] = False
+                else:
+                    self._value_done("string")
+            elif self.string_is_key:
+                self.key_chars.append(ch)
+            return
+
+        if self.in_literal:
+            if ch in WHITESPACE or ch in ",]}":
+                self.in_literal = False
+                self._value_done("literal")
+            else:
+                return
+
+        if ch in WHITESPACE or ch == ":":
+            return
+
+        if ch == '"':
+            self.in_string = True
+            frame = self.stack[-1] if self.stack else None
+            self.string_is_key = bool(frame and frame["type"] == "obj" and frame.get("expect_key"))
+            self.key_chars = []
+        elif ch in "{[":
+            name = self._current_name()
+            self.stack.append({
+                "type": "obj" if ch == "{" else "arr",
+                "name": name,
+                "key": None,
+                "expect_key": ch == "{"
+            })
+        elif ch in "}]":
+            if not self.stack:
+                return
+            frame = self.stack.pop()
+            # An entry is an object at the top level, or directly inside the top-level array
+            if frame["type"] == "obj" and (not self.stack or (len(self.stack) == 1 and self.stack[0]["type"] == "arr")):
+                self.entries += 1
+            self._value_done("container")
+        elif ch == ",":
+            if self.stack and self.stack[-1]["type"] == "obj":
+                self.stack[-1]["expect_key"] = True
+        else:
+            self.in_literal = True
+
+# Responses the parser must count exactly however they are chunked: (name, response text,
+# (questions, transcripts, entries)). Strings hold quotes, backslashes, brackets and key names.
+def entry(section, questions, transcript):
+    return {"Section": section, "Questions": questions, "Options": [["A", "B"], None], "Transcript": transcript}
+
+TRICKY = 'She said "Questions": ["x", {"Transcript": 1}] \\ then \\"left\\" C:\\path\\ {}[],: \u201cquoted\u201d'
+
+CHECKS = [
+    ("plain entry", json.dumps(entry("Part 1", ["Name?", "Age?"], "Hello there.")), (2, 1, 1)),
+    ("array of entries", json.dumps([entry("Part 1", ["a", "b", "c"], "One."), entry("Part 2", ["d"], "Two.")]), (4, 2, 2)),
+    ("escapes in strings", json.dumps([entry(TRICKY, [TRICKY, "b\\"], TRICKY)]), (2, 1, 1)),
+    ("unicode escapes", json.dumps([entry("Part 3", ["caf\u00e9 \u201cx\u201d"], "na\u00efve \"quote\"")], ensure_ascii=True), (1, 1, 1)),
+    ("non-string questions", json.dumps([entry("Part 4", [1, None, True, {"q": "x"}, ["y"]], "Text.")]), (5, 1, 1)),
+    ("fenced, indented", "```json\n" + json.dumps([entry("Part 1", ["a"], "T")], indent=2) + "\n```", (1, 1, 1)),
+]
+
+# A streamed response as the model returns it: chunks with a .text attribute
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+def fake_response(text, sizes):
+    position = 0
+    for size in sizes:
+        yield FakeChunk(text[position:position + size])
+        position += size
+    if position < len(text):
+        yield FakeChunk(text[position:])
+
+def count_stream(chunks):
+    parser = JSONProgressParser()
+    last = parser.snapshot()
+    for chunk in chunks:
+        stats = parser.feed(chunk.text)
+        # Counts only ever grow while the response streams in
+        assert all(stats[k] >= last[k] for k in last), (last, stats)
+        last = stats
+    return last["questions"], last["transcripts"], last["entries"]
+
+# python -m services.json_stream
+if __name__ == "__main__":
+    failed = 0
+    for name, text, expected in CHECKS:
+        # Fixed chunk sizes, then every split of the text in two (boundaries inside strings and escapes)
+        splits = [[size] * (len(text) // size) for size in range(1, 40)] + [[cut] for cut in range(1, len(text))]
+        bad = [sizes for sizes in splits if count_stream(fake_response(text, sizes)) != expected]
+        failed += bool(bad)
+        result = count_stream(fake_response(text, []))
+        print(f"{'ok' if not bad else 'FAIL':4s} {name}: {result} (expected {expected}), {len(splits)} chunkings, {len(bad)} wrong")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,29 @@
+# Import necessary libraries
+import json
+import time
+
+from services.disk_cache import DiskLRUCache
+
+# Content-addressed cache of parsed Gemini responses.
+# Entries are keyed by sha256(model name + prompt) and evicted least-recently-used first,
+# once the cache is over max_bytes or an entry is older than max_age seconds.
+class ResponseCache(DiskLRUCache):
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024, max_age=7 * 24 * 3600):
+        super().__init__(directory, max_bytes, max_age, suffix=".json")
+
+    @staticmethod
+    def make_key(model_name, prompt):
+        return DiskLRUCache.make_key(model_name, prompt)
+
+    def get(self, key):
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode("utf-8"))["response"]
+        except Exception:
+            return None
+
+    def put(self, key, value, model_name=""):
+        payload = json.dumps({"model": model_name, "created": time.time(), "response": value}, ensure_ascii=False)
+        self.put_bytes(key, payload.encode("utf-8"))
@@ -2,15 +2,15 @@
 import os
 import re
 import json
-import time
-import pandas as pd
-import google.generativeai as genai
-import textstat
+import threading
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from config.setting import model
+from services.rate_limiter import TokenBucket
+from services.llm_cache import ResponseCache
+from services.json_stream import JSONProgressParser
+from services.resources import registry, LazyResource
 
 # Configuration
 QUESTION_TYPE_CSV = "model_training/processed_data/questionType.csv"
@@ -18,20 +18,67 @@ WORD_CSV = "model_training/processed_data/ielts_vocab.csv"
 TRAINING_CSV = "model_training/processed_data/training_set.csv"
 GENERATED_JSON = "model_training/generated_questions/generated_questions.json"
 TEMP_CSV = "model_training/generated_questions/temp_generated_questions.json"
+TEMP_QUESTIONS_PATH = os.path.join("static", "temp", "temp_generated_questions.json")
+SIMILARITY_INDEX = "model_training/generated_questions/similarity_index.npz"
+ACCEPTED_LOG = "model_training/generated_questions/accepted_transcripts.jsonl"
 
 MAX_ATTEMPT = 2 
 REWARD_GOAL = 4
 
-MAX_API_CALLS_PER_RUN = 10 
-API_CALL_COUNT = 0
+MAX_API_CALLS_PER_RUN = int(os.getenv("MAX_API_CALLS_PER_RUN", 10))
 
-MIN_DELAY_BETWEEN_CALLS = 13
-LAST_API_CALL_TIME = 0
+# Gemini quota (requests per minute + burst) and number of entries generated in parallel
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", 10))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", 2))
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", 4))
+
+# "entry": one request per (part, typeID), "part": one request per part, "set": one request for the whole set
+GENERATION_MODES = ("entry", "part", "set")
+GENERATION_MODE = os.getenv("GENERATION_MODE", "entry")
+
+# Candidates requested at once per entry (best-of-N), 1 keeps the serial MAX_ATTEMPT loop
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", 1))
+
+rate_limiter = TokenBucket(GEMINI_RPM, GEMINI_BURST)
+
+# Opt-in on-disk cache of parsed responses, keyed by prompt + model name
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "0") == "1"
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join("cache", "llm"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", 50))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", 7))
+
+response_cache = ResponseCache(
+    LLM_CACHE_DIR,
+    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+    max_age=LLM_CACHE_MAX_AGE_DAYS * 24 * 3600
+) if LLM_CACHE_ENABLED else None
 
 # Load Data
-question_type_df = pd.read_csv(QUESTION_TYPE_CSV)
-common_vocab_df = pd.read_csv(WORD_CSV)
-training_df = pd.read_csv(TRAINING_CSV)
+# (pandas, scikit-learn and textstat are only imported when the resources load)
+def load_question_types():
+    import pandas as pd
+    return pd.read_csv(QUESTION_TYPE_CSV)
+
+# Similarity index over all known transcripts, loaded from disk or rebuilt once
+def load_similarity_index():
+    import pandas as pd
+    from services.similarity_index import PersistentSimilarityIndex
+    training_df = pd.read_csv(TRAINING_CSV)
+    return PersistentSimilarityIndex(SIMILARITY_INDEX, ACCEPTED_LOG, training_df, TRAINING_CSV, GENERATED_JSON)
+
+# Reward metrics, with the common vocabulary loaded once
+def load_reward_scorer():
+    import pandas as pd
+    from services.reward_scorer import RewardScorer
+    common_vocab_df = pd.read_csv(WORD_CSV)
+    return RewardScorer(common_vocab_df["Words"], registry.get("similarity_index"))
+
+registry.register("question_types", load_question_types)
+registry.register("similarity_index", load_similarity_index)
+registry.register("reward_scorer", load_reward_scorer)
+
+similarity_index = LazyResource("similarity_index")
+reward_scorer = LazyResource("reward_scorer")
 
 # Prompt Template
 PROMPT_TEMPLATE = """
@@ -76,6 +123,53 @@ Key Features: {key_features}
 Return the JSON format only.
 """
 
+# Batched Prompt Template (several question groups in one request)
+BATCH_PROMPT_TEMPLATE = """
+You are an expert IELTS Listening question generator.
+Create realistic IELTS Listening questions and transcripts following the official format.
+Generate {entry_count} independent question groups, described below.
+
+Theme: {theme}
+{entries}
+--- OUTPUT REQUIREMENTS ---
+1. Output MUST be a valid JSON array ONLY, with exactly {entry_count} objects in the order of the entries above.
+2. Each object must have these keys:
+   "Entry", "Section", "Type", "Instructions", "Diagram",
+   "Questions", "Answers", "Options", "Transcript".
+3. "Entry" is the entry number given above.
+4. Each object must produce exactly the number of questions of its entry.
+5. "Questions" must be a list of strings.
+6. "Answers" must be a list of strings of equal length.
+7. The type should be T001, T002, T003 and so on only.
+8. Question instruction should be the instructions to display and expected answer format.
+9. For multiple-choice types, include "Options" (list of lists).
+10. The diagram should be drawn in the characters and plain text only. You should handle the space and next line correctly.
+11. The maximum width of the diagram is 75 characters including the border line.
+12. Each transcript MUST naturally reference ALL question numbers of its entry.
+13. Each transcript should include the introduction as the exact IELTS listening test. Do not include other explanations including question numbers and pause. Only the Narrator, People and their conversation.
+14. No Markdown. No explanations. JSON ONLY.
+
+Return the JSON array only.
+"""
+
+BATCH_ENTRY_TEMPLATE = """
+--- ENTRY {entry_number} ---
+Section: {section}
+Question Type: {typeID} - {type_name}
+Question Numbers: {question_range}
+Number of Questions: {question_count}
+Specific Topic: {specific_topic}
+Additional Specifications from Test Creator: {specifications}
+Instructions to Display: {instruction}
+Expected Answer Format: {answer_format}
+Format Rules: {format}
+Key Listening Skills: {key_skills}
+Typical Duration: {avg_duration}
+Expected Transcript Length: {avg_script_length} words
+Audio Speed: {audio_speed}
+Key Features: {key_features}
+"""
+
 # JSON Parser
 def safe_json_parse(raw):
     if not raw: return None
@@ -85,79 +179,27 @@ def safe_json_parse(raw):
     except:
         return None
     
-# Reward Functions
+# Reward Functions (single metrics, generation scores through reward_scorer)
 def calculate_readability_score(text):
-    return textstat.flesch_reading_ease(str(text))
-
-def is_in_average_word_count(text, section_label):
-    if not text: return False
-    words = re.findall(r'\b\w+\b', str(text))
-    wc = len(words)
-    expected = {
-        "Section 1": (500, 700),
-        "Section 2": (600, 800),
-        "Section 3": (800, 1000),
-        "Section 4": (1000, 1200)
-    }
-    low, high = expected.get(section_label, (0, 99999))
-    return low <= wc <= high
+    return reward_scorer.readability(str(text))
+
+def is_in_average_word_count(text, section_label, question_count=None):
+    return reward_scorer.score(text, section_label, question_count)["checks"]["word_count"]
 
 def calculate_common_word_ratio(text):
-    common_vocab = set(common_vocab_df["Words"].str.lower())
-    words = [w.lower() for w in re.findall(r'\b\w+\b', str(text))]
-    if not words: return 0
-    uncommon = [w for w in words if w not in common_vocab]
-    return len(uncommon) / len(words)
+    return reward_scorer.uncommon_ratio(reward_scorer.tokenize(str(text)))
 
 def calculate_similarity(text):
-    existing_texts = []
-
-    # 1. From training_df
-    if "transcript" in training_df.columns:
-        existing_texts += training_df["transcript"].dropna().astype(str).tolist()
-
-    # 2. From generated JSON
-    if os.path.exists(GENERATED_JSON):
-        with open(GENERATED_JSON, "r", encoding="utf-8") as f:
-            saved_data = json.load(f)
-
-            for item in saved_data:
-
-                # CASE A: item is dict
-                if isinstance(item, dict):
-                    transcript = item.get("Transcript", "")
+    return similarity_index.max_similarity(text)
 
-                # CASE B: item is string
-                elif isinstance(item, str):
-                    transcript = item
-
-                # CASE C: item is list
-                elif isinstance(item, list):
-                    transcript = " ".join(map(str, item))
-
-                # Unknown type
-                else:
-                    continue
-
-                # Normalise to string
-                existing_texts.append(str(transcript))
-
-    # No existing corpus
-    if not existing_texts:
-        return 0.0
-
-    # Normalise input text
-    if isinstance(text, list):
-        text = " ".join(map(str, text))
-    text = str(text)
-
-    # Build TF-IDF Similarity
-    corpus = existing_texts + [text]
-
-    vec = TfidfVectorizer().fit_transform(corpus)
-    sims = cosine_similarity(vec[-1], vec[:-1]).flatten()
-
-    return max(sims) if len(sims) else 0.0
+# Accepted transcripts join the corpus so later sets are scored against them too. Only entries that
+# reached REWARD_GOAL and ended up in the saved set are recorded, once the set (or part) is saved.
+def record_accepted(result):
+    if isinstance(result, dict) and result.get("Transcript"):
+        try:
+            similarity_index.add(result["Transcript"])
+        except Exception as e:
+            print(f"[SIMILARITY] Could not record transcript: {e}")
 
 # Question number calculation
 def get_question_counts(types):
@@ -174,44 +216,102 @@ def number_ranges(counts, section_num):
         cur += c
     return ranges
 
-def model_generate(prompt, max_retries=3, base_delay=20):
-    global API_CALL_COUNT, LAST_API_CALL_TIME
+# API call budget of one run (a full set or a part regeneration), shared by the run's threads.
+# Each run has its own, so generations running side by side in one worker do not spend each other's.
+class ApiBudget:
+    def __init__(self, limit=MAX_API_CALLS_PER_RUN):
+        self.limit = limit
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            if self.count >= self.limit:
+                return False
+            self.count += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.count = max(0, self.count - 1)
+
+    def remaining(self):
+        with self.lock:
+            return max(0, self.limit - self.count)
+
+    def exhausted(self):
+        return self.remaining() == 0
+
+def parse_retry_delay(error_str, default):
+    match = re.search(r'retry in (\d+(?:\.\d+)?)', error_str.lower())
+    if match:
+        return float(match.group(1)) + 2
+    return default
+
+# Stream the response, reporting progress (tokens, questions, transcripts) after every chunk
+def stream_generate(prompt, on_progress):
+    parser = JSONProgressParser()
+    parts = []
+    for chunk in model.generate_content(prompt, stream=True):
+        piece = chunk.text
+        parts.append(piece)
+        stats = parser.feed(piece)
+        usage = getattr(chunk, "usage_metadata", None)
+        stats["tokens"] = getattr(usage, "candidates_token_count", 0) or stats["chars"] // 4
+        on_progress(stats)
+    return "".join(parts)
+
+def model_generate(prompt, max_retries=3, base_delay=20, use_cache=True, cancelled=None, on_progress=None, budget=None):
+    # budget (ApiBudget) limits the calls of the run, None leaves them unlimited
+    # use_cache=False skips the lookup (e.g. a retry wants a fresh answer) but still stores the result
+    # cancelled (threading.Event) drops the call if it is set while waiting for a rate-limit slot
+    # on_progress switches to the streaming API and receives the parser snapshot after each chunk
+    cache_key = None
+    if response_cache is not None:
+        cache_key = ResponseCache.make_key(model.model_name, prompt)
+        if use_cache:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                print("[GEMINI] Cache hit, skipping API call.")
+                if on_progress is not None:
+                    on_progress(dict(JSONProgressParser().feed(json.dumps(cached)), tokens=0))
+                return cached
 
-    if API_CALL_COUNT >= MAX_API_CALLS_PER_RUN:
-        print("[GEMINI] Local per-run API limit reached, skipping further calls.")
-        return None
+    for attempt in range(max_retries):
+        if budget is not None and not budget.reserve():
+            print("[GEMINI] Local per-run API limit reached, skipping further calls.")
+            return None
 
-    current_time = time.time()
-    time_since_last_call = current_time - LAST_API_CALL_TIME
-    if time_since_last_call < MIN_DELAY_BETWEEN_CALLS:
-        wait_time = MIN_DELAY_BETWEEN_CALLS - time_since_last_call
-        print(f"[GEMINI] Rate limiting: waiting {wait_time:.1f} seconds before next API call...")
-        time.sleep(wait_time)
+        waited = rate_limiter.acquire()
+        if waited > 0:
+            print(f"[GEMINI] Rate limiting: waited {waited:.1f} seconds for a request slot.")
+
+        if cancelled is not None and cancelled.is_set():
+            if budget is not None:
+                budget.release()
+            return None
 
-    for attempt in range(max_retries):
         try:
-            LAST_API_CALL_TIME = time.time()
-            response = model.generate_content(prompt)
-            API_CALL_COUNT += 1
-            return safe_json_parse(response.text)
+            if on_progress is not None:
+                parsed = safe_json_parse(stream_generate(prompt, on_progress))
+            else:
+                parsed = safe_json_parse(model.generate_content(prompt).text)
+            if cache_key is not None and parsed is not None:
+                response_cache.put(cache_key, parsed, model.model_name)
+            return parsed
             
         except Exception as e:
             error_str = str(e)
             
             if "429" in error_str or "quota" in error_str.lower() or "rate" in error_str.lower():
-                retry_delay = base_delay
-                if "retry in" in error_str.lower():
-                    try:
-                        import re
-                        delay_match = re.search(r'retry in (\d+(?:\.\d+)?)', error_str.lower())
-                        if delay_match:
-                            retry_delay = float(delay_match.group(1)) + 2
-                    except:
-                        pass
+                # Rejected calls do not use up the per-run budget
+                if budget is not None:
+                    budget.release()
+                retry_delay = parse_retry_delay(error_str, base_delay)
                 
                 if attempt < max_retries - 1:
-                    print(f"[GEMINI] Rate limit exceeded. Waiting {retry_delay:.1f} seconds before retry {attempt + 1}/{max_retries}...")
-                    time.sleep(retry_delay)
+                    print(f"[GEMINI] Rate limit exceeded. Pausing requests for {retry_delay:.1f} seconds before retry {attempt + 1}/{max_retries}...")
+                    rate_limiter.defer(retry_delay)
                     base_delay = min(base_delay * 1.5, 60)
                     continue
                 else:
@@ -223,29 +323,323 @@ def model_generate(prompt, max_retries=3, base_delay=20):
     
     return None
 
-def generate_full_set(section_choices):
-    global API_CALL_COUNT, LAST_API_CALL_TIME
-    API_CALL_COUNT = 0
-    LAST_API_CALL_TIME = 0
+def get_type_info(typeID):
+    question_type_df = registry.get("question_types")
+    type_row = question_type_df[question_type_df["typeID"] == typeID]
+    if type_row.empty:
+        print(f" WARNING: typeID '{typeID}' not found. Using placeholder info.")
+        return {
+            "type": f"Unknown Type ({typeID})",
+            "instruction": "Follow standard instructions.",
+            "answer_format": "List of answers",
+            "format": "Text",
+            "key_skills": "Listening",
+            "avg_duration": "3-4 min",
+            "avg_script_length": "600",
+            "key_features": "IELTS standard",
+            "audio_speed": "Normal"
+        }
+    return type_row.iloc[0]
+
+# spec: specifications used instead of the entry's own (a part regenerated with a new spec)
+def build_prompt_fields(section_label, entry, question_count, question_range, type_info, spec=None):
+    return dict(
+        section=section_label,
+        question_range=question_range,
+        question_count=question_count,
+        typeID=entry["typeID"],
+        type_name=type_info["type"],
+        theme=entry["theme"],
+        specific_topic=entry["topic"],
+        specifications=entry["spec"] if spec is None else spec,
+        instruction=type_info.get("instruction", ""),
+        answer_format=type_info.get("answer_format", ""),
+        format=type_info.get("format", ""),
+        key_skills=type_info.get("key_skills", ""),
+        avg_duration=type_info.get("avg_duration", ""),
+        avg_script_length=type_info.get("avg_script_length", ""),
+        key_features=type_info.get("key_features", ""),
+        audio_speed=type_info.get("audio_speed", ""),
+    )
+
+# The part's entries, one per question type, as chosen in section_choices
+def part_entries(section_choices, part_data):
+    entries = []
+    for i, typeID in enumerate(part_data.get("type1", [])):
+        entries.append({
+            "typeID": typeID,
+            "theme": section_choices.get("Themes", [""])[0],
+            "topic": part_data.get("topic", [""])[i] if i < len(part_data.get("topic", [])) else "",
+            "spec": part_data.get("specifications", [""])[i] if i < len(part_data.get("specifications", [])) else "",
+            "number_of_questions": part_data.get("number_of_questions", [0])[i] if i < len(part_data.get("number_of_questions", [])) else 0
+        })
+    return entries
+
+def placeholder_entry(section_label, type_info, question_count, question_range):
+    return {
+        "Section": section_label,
+        "Type": type_info["type"],
+        "Instructions": type_info.get("instruction", ""),
+        "Diagram": None,
+        "Questions": [f"Placeholder Q{i}" for i in range(1, question_count+1)],
+        "Answers": [f"Answer_{i}" for i in range(1, question_count+1)],
+        "Options": [None]*question_count,
+        "Transcript": f"Placeholder transcript {question_range}"
+    }
+
+# Structural check used by the batched mode before an entry is scored
+def validate_entry(model_json, question_count):
+    if not isinstance(model_json, dict):
+        return False
+    transcript = model_json.get("Transcript")
+    if not isinstance(transcript, str) or not transcript.strip():
+        return False
+    if not isinstance(model_json.get("Questions"), list):
+        return False
+    answers = model_json.get("Answers")
+    if not isinstance(answers, list) or len(answers) != question_count:
+        return False
+    return True
+
+# Request n candidates for the same prompt at once and score them as they arrive.
+# Once one reaches REWARD_GOAL the rest are cancelled, or ignored if already in flight.
+def generate_speculative(prompt, section_label, label, n, on_progress=None, question_count=None, budget=None):
+    n = min(n, budget.remaining()) if budget is not None else n
+    if n <= 0:
+        print("  API call limit reached, using placeholder")
+        return None, -99
+
+    print(f"\n[GENERATING] {label} - {n} candidates in parallel")
+    cancelled = threading.Event()
+    best_reward = -99
+    best_json = None
+
+    executor = ThreadPoolExecutor(max_workers=n)
+    try:
+        # Only the first candidate may come from the cache, the others must be fresh
+        futures = [
+            executor.submit(model_generate, prompt, use_cache=(k == 0), cancelled=cancelled, on_progress=on_progress, budget=budget)
+            for k in range(n)
+        ]
+        for future in as_completed(futures):
+            model_json = future.result()
+            if not isinstance(model_json, dict):
+                continue
+
+            reward = reward_scorer.score(model_json.get("Transcript", ""), section_label, question_count)["reward"]
+            print(f" -> {label} candidate Reward: {reward}")
+
+            if reward > best_reward:
+                best_reward = reward
+                best_json = model_json
+            if reward == REWARD_GOAL:
+                break
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return best_json, best_reward
+
+# Generate one (part, typeID) entry, keeping the best of MAX_ATTEMPT (or SPECULATIVE_CANDIDATES) candidates
+# accepted: list the result is appended to when it reached REWARD_GOAL; budget: the run's ApiBudget
+def generate_entry(section_label, entry, question_count, question_range, candidates=None, on_progress=None, accepted=None, budget=None):
+    candidates = SPECULATIVE_CANDIDATES if candidates is None else candidates
+    type_info = get_type_info(entry["typeID"])
+    q_type_name = type_info["type"]
+
+    best_reward = -99
+    best_json = None
+    prompt = PROMPT_TEMPLATE.format(**build_prompt_fields(section_label, entry, question_count, question_range, type_info))
+
+    # Best-of-N replaces the serial attempts
+    serial_attempts = MAX_ATTEMPT
+    if candidates > 1:
+        best_json, best_reward = generate_speculative(prompt, section_label, f"{section_label} - {q_type_name}", candidates, on_progress, question_count, budget)
+        serial_attempts = 0
+
+    for attempt in range(1, serial_attempts + 1):
+        print(f"\n[GENERATING] {section_label} - {q_type_name} Attempt {attempt}")
+
+        # Later attempts want a different candidate, not the cached one
+        model_json = model_generate(prompt, use_cache=(attempt == 1), on_progress=on_progress, budget=budget)
+
+        if model_json is None:
+            if budget is not None and budget.exhausted():
+                print("  API call limit reached, using placeholder")
+                break
+            continue
+
+        if not isinstance(model_json, dict):
+            print("  Invalid JSON, trying again...")
+            continue
+
+        reward = reward_scorer.score(model_json.get("Transcript", ""), section_label, question_count)["reward"]
+
+        print(f" -> {section_label} - {q_type_name} Reward: {reward}")
+
+        if reward > best_reward:
+            best_reward = reward
+            best_json = model_json
+
+        if reward == REWARD_GOAL:
+            break
+
+    if best_json is None:
+        return placeholder_entry(section_label, type_info, question_count, question_range)
+
+    if accepted is not None and best_reward >= REWARD_GOAL:
+        accepted.append(best_json)
+    return best_json
+
+# Split a batched response into one candidate per requested entry
+def split_batch_response(model_json, entry_count):
+    if isinstance(model_json, dict):
+        model_json = model_json.get("Entries", model_json.get("entries", [model_json]))
+    if not isinstance(model_json, list):
+        return [None] * entry_count
+
+    candidates = [None] * entry_count
+    leftovers = []
+    for item in model_json:
+        number = item.get("Entry") if isinstance(item, dict) else None
+        try:
+            idx = int(number) - 1
+        except (TypeError, ValueError):
+            idx = -1
+        if 0 <= idx < entry_count and candidates[idx] is None:
+            candidates[idx] = item
+        else:
+            leftovers.append(item)
+
+    # Objects without a usable "Entry" fill the remaining slots in order
+    for idx in range(entry_count):
+        if candidates[idx] is None and leftovers:
+            candidates[idx] = leftovers.pop(0)
+    return candidates
+
+# Generate several entries with one request per round.
+# Entries that fail validation or miss REWARD_GOAL are re-requested together, up to MAX_ATTEMPT rounds.
+# spec: specifications used instead of the entries' own
+def generate_batch(jobs, use_cache=True, on_progress=None, spec=None, accepted=None, budget=None):
+    infos = [get_type_info(entry["typeID"]) for _, entry, _, _ in jobs]
+    best = [None] * len(jobs)
+    best_reward = [-99] * len(jobs)
+    pending = list(range(len(jobs)))
+
+    for attempt in range(1, MAX_ATTEMPT + 1):
+        if not pending:
+            break
+        labels = ", ".join(f"{jobs[i][0]} {infos[i]['type']}" for i in pending)
+        print(f"\n[GENERATING] Batch of {len(pending)} ({labels}) Attempt {attempt}")
+
+        blocks = []
+        for number, i in enumerate(pending, 1):
+            section_label, entry, question_count, question_range = jobs[i]
+            fields = build_prompt_fields(section_label, entry, question_count, question_range, infos[i], spec=spec)
+            blocks.append(BATCH_ENTRY_TEMPLATE.format(entry_number=number, **fields))
+
+        prompt = BATCH_PROMPT_TEMPLATE.format(
+            entry_count=len(pending),
+            theme=jobs[pending[0]][1]["theme"],
+            entries="".join(blocks)
+        )
+
+        model_json = model_generate(prompt, use_cache=(use_cache and attempt == 1), on_progress=on_progress, budget=budget)
+        if model_json is None and budget is not None and budget.exhausted():
+            print("  API call limit reached, using placeholder")
+            break
+
+        candidates = split_batch_response(model_json, len(pending))
+        still_pending = []
+        valid = []
+        for i, candidate in zip(pending, candidates):
+            section_label, _, question_count, _ = jobs[i]
+            if not validate_entry(candidate, question_count):
+                print(f" -> {section_label} - {infos[i]['type']} failed validation")
+                still_pending.append(i)
+                continue
+            candidate.pop("Entry", None)
+            candidate.setdefault("Section", section_label)
+            valid.append((i, candidate))
+
+        # Every valid candidate of the round is scored in one pass
+        scores = reward_scorer.score_batch([(c.get("Transcript", ""), jobs[i][0], jobs[i][2]) for i, c in valid])
+        for (i, candidate), score in zip(valid, scores):
+            section_label = jobs[i][0]
+            reward = score["reward"]
+            print(f" -> {section_label} - {infos[i]['type']} Reward: {reward}")
+
+            if reward > best_reward[i]:
+                best_reward[i] = reward
+                best[i] = candidate
+            if reward < REWARD_GOAL:
+                still_pending.append(i)
+        pending = sorted(still_pending)
+
+    results = []
+    for i, (section_label, _, question_count, question_range) in enumerate(jobs):
+        if best[i] is None:
+            results.append(placeholder_entry(section_label, infos[i], question_count, question_range))
+        else:
+            if accepted is not None and best_reward[i] >= REWARD_GOAL:
+                accepted.append(best[i])
+            results.append(best[i])
+    return results
+
+# Aggregates the streaming progress of every group of a set into one running total
+class SetProgress:
+    def __init__(self, jobs, group_count, on_progress):
+        self.on_progress = on_progress
+        self.question_total = sum(job[2] for job in jobs)
+        self.transcript_total = len(jobs)
+        self.group_total = group_count
+        self.groups_done = 0
+        self.groups = {}
+        self.lock = threading.Lock()
+
+    def emit(self, label):
+        totals = {"tokens": 0, "questions": 0, "transcripts": 0}
+        for stats in self.groups.values():
+            for k in totals:
+                totals[k] += stats.get(k, 0)
+        self.on_progress(dict(
+            totals,
+            label=label,
+            questions=min(totals["questions"], self.question_total),
+            transcripts=min(totals["transcripts"], self.transcript_total),
+            question_total=self.question_total,
+            transcript_total=self.transcript_total,
+            groups_done=self.groups_done,
+            group_total=self.group_total
+        ))
+
+    # Callback for one group; counts only move forward across retries and parallel candidates
+    def reporter(self, index, label):
+        def report(stats):
+            with self.lock:
+                current = self.groups.setdefault(index, {})
+                for k in ("tokens", "questions", "transcripts"):
+                    current[k] = max(current.get(k, 0), stats.get(k, 0))
+                self.emit(label)
+        return report
+
+    def group_done(self, label):
+        with self.lock:
+            self.groups_done += 1
+            self.emit(label)
+
+# output_path: where the wrapped set is written (defaults to the shared TEMP_QUESTIONS_PATH)
+def generate_full_set(section_choices, mode=None, on_progress=None, output_path=None):
+    mode = mode if mode in GENERATION_MODES else GENERATION_MODE
+    budget = ApiBudget()
 
-    all_results = []
     dt_key = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+    jobs = []
 
     for part_num_str, part_data in section_choices.get("Part", {}).items():
         # Convert part_num to integer
         part_num = int(part_num_str)
-        entries = []
-
-        # Prepare entries for this part
-        for i, typeID in enumerate(part_data.get("type1", [])):
-            entry = {
-                "typeID": typeID,
-                "theme": section_choices.get("Themes", [""])[0],
-                "topic": part_data.get("topic", [""])[i] if i < len(part_data.get("topic", [])) else "",
-                "spec": part_data.get("specifications", [""])[i] if i < len(part_data.get("specifications", [])) else "",
-                "number_of_questions": part_data.get("number_of_questions", [0])[i] if i < len(part_data.get("number_of_questions", [])) else 0
-            }
-            entries.append(entry)
+        entries = part_entries(section_choices, part_data)
 
         section_label = f"Part {part_num}"
 
@@ -256,122 +650,64 @@ def generate_full_set(section_choices):
 
         for entry in entries:
             typeID = entry["typeID"]
-            theme = entry["theme"]
-            topic = entry["topic"]
-            spec = entry["spec"]
-
-            # Find type info in question_type_df
-            type_row = question_type_df[question_type_df["typeID"] == typeID]
-            if type_row.empty:
-                print(f" WARNING: typeID '{typeID}' not found. Using placeholder info.")
-                type_info = {
-                    "type": f"Unknown Type ({typeID})",
-                    "instruction": "Follow standard instructions.",
-                    "answer_format": "List of answers",
-                    "format": "Text",
-                    "key_skills": "Listening",
-                    "avg_duration": "3-4 min",
-                    "avg_script_length": "600",
-                    "key_features": "IELTS standard",
-                    "audio_speed": "Normal"
-                }
-            else:
-                type_info = type_row.iloc[0]
-
-            q_type_name = type_info["type"]
             question_count = counts.get(typeID, 0)
             question_range = ranges.get(typeID, (1, question_count))
+            jobs.append((section_label, entry, question_count, question_range))
+
+    # Group entries into requests: one per entry, one per part, or the whole set at once
+    if mode == "set":
+        groups = [jobs] if jobs else []
+    elif mode == "part":
+        groups = []
+        for job in jobs:
+            if groups and groups[-1][0][0] == job[0]:
+                groups[-1].append(job)
+            else:
+                groups.append([job])
+    else:
+        groups = [[job] for job in jobs]
+
+    # Split the call budget so every entry can afford its speculative candidates
+    candidates = max(1, min(SPECULATIVE_CANDIDATES, budget.limit // max(1, len(groups))))
+
+    progress = SetProgress(jobs, len(groups), on_progress) if on_progress else None
+    accepted = []
+
+    def run_group(indexed_group):
+        index, group = indexed_group
+        label = group[0][0] if mode != "set" else "Full set"
+        report = progress.reporter(index, label) if progress else None
+        if mode == "entry":
+            results = [generate_entry(*group[0], candidates=candidates, on_progress=report, accepted=accepted, budget=budget)]
+        else:
+            results = generate_batch(group, on_progress=report, accepted=accepted, budget=budget)
+        if progress:
+            progress.group_done(label)
+        return results
 
-            best_reward = -99
-            best_json = None
-            rate_limit_hit = False
-
-            for attempt in range(1, MAX_ATTEMPT + 1):
-                print(f"\n[GENERATING] {section_label} - {q_type_name} Attempt {attempt}")
-
-                prompt = PROMPT_TEMPLATE.format(
-                    section=section_label,
-                    question_range=question_range,
-                    question_count=question_count,
-                    typeID=typeID,
-                    type_name=q_type_name,
-                    theme=theme,
-                    specific_topic=topic,
-                    specifications=spec,
-                    instruction=type_info.get("instruction", ""),
-                    answer_format=type_info.get("answer_format", ""),
-                    format=type_info.get("format", ""),
-                    key_skills=type_info.get("key_skills", ""),
-                    avg_duration=type_info.get("avg_duration", ""),
-                    avg_script_length=type_info.get("avg_script_length", ""),
-                    key_features=type_info.get("key_features", ""),
-                    audio_speed=type_info.get("audio_speed", ""),
-                )
-
-                model_json = model_generate(prompt)
-
-                if model_json is None:
-                    if API_CALL_COUNT >= MAX_API_CALLS_PER_RUN:
-                        print("  API call limit reached, using placeholder")
-                        rate_limit_hit = True
-                        break
-                    continue
-
-                if not isinstance(model_json, dict):
-                    print("  Invalid JSON, trying again...")
-                    continue
-
-                transcript = model_json.get("Transcript", "")
-                reward = 0
-                if calculate_readability_score(transcript) >= 55: reward += 1
-                if is_in_average_word_count(transcript, section_label): reward += 1
-                if calculate_common_word_ratio(transcript) >= 0.1: reward += 1
-                if calculate_similarity(transcript) <= 0.85: reward += 1
-
-                print(f" -> Reward: {reward}")
-
-                if reward > best_reward:
-                    best_reward = reward
-                    best_json = model_json
-
-                if reward == REWARD_GOAL:
-                    break
-                
-                if attempt < MAX_ATTEMPT:
-                    time.sleep(10)
-
-            if best_json is None:
-                best_json = {
-                    "Section": section_label,
-                    "Type": q_type_name,
-                    "Instructions": type_info.get("instruction", ""),
-                    "Diagram": None,
-                    "Questions": [f"Placeholder Q{i}" for i in range(1, question_count+1)],
-                    "Answers": [f"Answer_{i}" for i in range(1, question_count+1)],
-                    "Options": [None]*question_count,
-                    "Transcript": f"Placeholder transcript {question_range}"
-                }
-
-            all_results.append(best_json)
-            
-            time.sleep(10)
+    # Groups run in parallel, pacing is left to the shared rate limiter
+    all_results = []
+    if groups:
+        with ThreadPoolExecutor(max_workers=max(1, min(GENERATION_WORKERS, len(groups)))) as executor:
+            for group_results in executor.map(run_group, enumerate(groups)):
+                all_results += group_results
 
     wrapped_output = {dt_key: all_results}
 
-    output_dir = os.path.join("static", "temp")
-    os.makedirs(output_dir, exist_ok=True)
-
-    output_path = os.path.join(output_dir, "temp_generated_questions.json")
+    output_path = output_path or TEMP_QUESTIONS_PATH
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(wrapped_output, f, indent=2, ensure_ascii=False)
 
     print(f"\nFull question set saved to {output_path}")
+    for result in accepted:
+        record_accepted(result)
     return wrapped_output
 
-def generate_specific_part(part_num, new_spec, section_choices):
-    global API_CALL_COUNT, LAST_API_CALL_TIME
-    API_CALL_COUNT = 0
-    LAST_API_CALL_TIME = 0
+# questions_path: the set the part is merged into (defaults to the shared TEMP_QUESTIONS_PATH)
+def generate_specific_part(part_num, new_spec, section_choices, mode=None, questions_path=None):
+    mode = mode if mode in GENERATION_MODES else GENERATION_MODE
+    budget = ApiBudget()
 
     dt_key = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
     part_num_str = str(part_num)
@@ -388,57 +724,44 @@ def generate_specific_part(part_num, new_spec, section_choices):
     part_results = []
     section_label = f"Part {part_num}"
 
-    for i, typeID in enumerate(types):
-        type_row = question_type_df[question_type_df["typeID"] == typeID]
-        type_info = type_row.iloc[0] if not type_row.empty else {}
-        
-        q_type_name = type_info.get("type", "Standard Question")
-        question_count = counts.get(typeID, 0)
-        question_range = ranges.get(typeID, "")
+    # The new spec replaces the one each entry was generated with
+    entries = part_entries(section_choices, part_data)
+    accepted = []
+
+    if mode in ("part", "set"):
+        # The whole part in one request, only failing entries are asked for again
+        jobs = [(section_label, entry, counts.get(entry["typeID"], 0), ranges.get(entry["typeID"], "")) for entry in entries]
+        part_results = generate_batch(jobs, use_cache=False, spec=new_spec, accepted=accepted, budget=budget)
+    else:
+        for entry in entries:
+            type_info = get_type_info(entry["typeID"])
+            q_type_name = type_info["type"]
+            question_count = counts.get(entry["typeID"], 0)
+            question_range = ranges.get(entry["typeID"], "")
+            prompt = PROMPT_TEMPLATE.format(**build_prompt_fields(section_label, entry, question_count, question_range, type_info, spec=new_spec))
 
-        best_reward = -99
-        best_json = None
+            best_reward = -99
+            best_json = None
 
-        for attempt in range(1, MAX_ATTEMPT + 1):
-            print(f"\n[RE-GENERATING] {section_label} - {q_type_name} Attempt {attempt}")
-            
-            prompt = PROMPT_TEMPLATE.format(
-                section=section_label,
-                question_range=question_range,
-                question_count=question_count,
-                typeID=typeID,
-                type_name=q_type_name,
-                theme=section_choices.get("Themes", [""])[0],
-                specific_topic=part_data.get("topic", [""])[i] if i < len(part_data.get("topic", [])) else "",
-                specifications=new_spec, # Applied here
-                instruction=type_info.get("instruction", ""),
-                answer_format=type_info.get("answer_format", ""),
-                format=type_info.get("format", ""),
-                key_skills=type_info.get("key_skills", ""),
-                avg_duration=type_info.get("avg_duration", ""),
-                avg_script_length=type_info.get("avg_script_length", ""),
-                key_features=type_info.get("key_features", ""),
-                audio_speed=type_info.get("audio_speed", ""),
-            )
-
-            model_json = model_generate(prompt)
-
-            if isinstance(model_json, dict):
-                transcript = model_json.get("Transcript", "")
-                reward = 0
-                if calculate_readability_score(transcript) >= 55: reward += 1
-                if is_in_average_word_count(transcript, section_label): reward += 1
-                if calculate_common_word_ratio(transcript) >= 0.1: reward += 1
-                if calculate_similarity(transcript) <= 0.85: reward += 1
-
-                if reward > best_reward:
-                    best_reward = reward
-                    best_json = model_json
-                if reward == REWARD_GOAL: break
-
-        part_results.append(best_json if best_json else {"Error": "Failed to generate"})
-
-    temp_path = os.path.join("static", "temp", "temp_generated_questions.json")
+            for attempt in range(1, MAX_ATTEMPT + 1):
+                print(f"\n[RE-GENERATING] {section_label} - {q_type_name} Attempt {attempt}")
+
+                # A regeneration always asks for a fresh candidate
+                model_json = model_generate(prompt, use_cache=False, budget=budget)
+
+                if isinstance(model_json, dict):
+                    reward = reward_scorer.score(model_json.get("Transcript", ""), section_label, question_count)["reward"]
+
+                    if reward > best_reward:
+                        best_reward = reward
+                        best_json = model_json
+                    if reward == REWARD_GOAL: break
+
+            if best_json is not None and best_reward >= REWARD_GOAL:
+                accepted.append(best_json)
+            part_results.append(best_json if best_json else {"Error": "Failed to generate"})
+
+    temp_path = questions_path or TEMP_QUESTIONS_PATH
 
     try:
         if os.path.exists(temp_path):
@@ -489,4 +812,6 @@ def generate_specific_part(part_num, new_spec, section_choices):
         print(f"Error writing merged temp file: {e}")
 
     print(f"\nPart {part_num} updated and merged into {temp_path}")
+    for result in accepted:
+        record_accepted(result)
     return wrapped_output
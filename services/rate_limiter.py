@@ -0,0 +1,51 @@
+# Import necessary libraries
+import threading
+import time
+
+# Token bucket shared by every thread that talks to Gemini.
+# Tokens refill continuously at `rate_per_minute`; up to `burst` calls may go out back to back.
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = max(rate_per_minute, 0.001) / 60.0
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = max(self.updated, now)
+
+    # Block until a token is available, returns the seconds spent waiting
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    # Server asked us to back off ("retry in N s"): pause the whole bucket, not just one caller
+    def defer(self, seconds):
+        with self.lock:
+            until = time.monotonic() + max(0.0, seconds)
+            if until > self.blocked_until:
+                self.blocked_until = until
+                self.tokens = 0.0
+                self.updated = until
+
+    def reset(self):
+        with self.lock:
+            self.tokens = float(self.capacity)
+            self.updated = time.monotonic()
+            self.blocked_until = 0.0
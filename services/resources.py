@@ -0,0 +1,107 @@
+# Import necessary libraries
+import time
+import threading
+
+# Registry of heavy resources (models, readers, datasets).
+# Each resource is loaded once, on first use or by the background warm-up started at boot.
+class ResourceRegistry:
+    def __init__(self):
+        self.loaders = {}
+        self.values = {}
+        self.errors = {}
+        self.timings = {}
+        self.loading = set()
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.warmup_thread = None
+
+    def register(self, name, loader):
+        with self.lock:
+            self.loaders.setdefault(name, loader)
+            self.locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name not in self.loaders:
+            raise KeyError(f"Resource '{name}' is not registered")
+
+        # Callers arriving while the resource loads wait for the same load
+        with self.locks[name]:
+            if name in self.values:
+                return self.values[name]
+            self.loading.add(name)
+            start = time.perf_counter()
+            try:
+                value = self.loaders[name]()
+            except Exception as e:
+                self.errors[name] = str(e)
+                print(f"[RESOURCES] Failed to load {name}: {e}")
+                raise
+            finally:
+                self.loading.discard(name)
+            self.timings[name] = time.perf_counter() - start
+            self.values[name] = value
+            self.errors.pop(name, None)
+            print(f"[RESOURCES] Loaded {name} in {self.timings[name]:.2f}s")
+            return value
+
+    # Forget a loaded value, the next get() loads it again
+    def discard(self, name):
+        with self.locks[name]:
+            self.values.pop(name, None)
+            self.timings.pop(name, None)
+
+    def is_ready(self, name=None):
+        names = [name] if name else list(self.loaders)
+        return all(n in self.values for n in names)
+
+    # State of every registered resource, or of the given names
+    def status(self, names=None):
+        result = {}
+        for name in names or list(self.loaders):
+            if name in self.values:
+                state = "ready"
+            elif name in self.loading:
+                state = "loading"
+            elif name in self.errors:
+                state = "error"
+            else:
+                state = "pending"
+            entry = {"state": state}
+            if name in self.timings:
+                entry["seconds"] = round(self.timings[name], 3)
+            if name in self.errors:
+                entry["error"] = self.errors[name]
+            result[name] = entry
+        return result
+
+    # Load every registered resource (or the given names) in order, failures are recorded, not raised
+    def warm_up(self, names=None, background=True):
+        def run():
+            for name in names or list(self.loaders):
+                try:
+                    self.get(name)
+                except Exception:
+                    pass
+
+        if not background:
+            run()
+            return None
+        self.warmup_thread = threading.Thread(target=run, daemon=True)
+        self.warmup_thread.start()
+        return self.warmup_thread
+
+registry = ResourceRegistry()
+
+# Stand-in for a registered resource, so `from module import name` keeps working.
+# Attribute access loads the real object through the registry.
+class LazyResource:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(registry.get(self._name), attr)
+
+    def __repr__(self):
+        return f"<LazyResource {self._name}>"
@@ -0,0 +1,117 @@
+# Import necessary libraries
+import re
+import textstat
+
+# Reward thresholds, one point per metric
+READABILITY_MIN = 55
+UNCOMMON_RATIO_MIN = 0.1
+SIMILARITY_MAX = 0.85
+
+# Expected transcript length of a whole part (QUESTIONS_PER_PART questions), "Section N" and "Part N"
+# labels are both accepted. An entry covering part of the questions gets its share of the range.
+WORD_COUNT_RANGES = {
+    1: (500, 700),
+    2: (600, 800),
+    3: (800, 1000),
+    4: (1000, 1200)
+}
+QUESTIONS_PER_PART = 10
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+def expected_word_range(section_label, question_count=None):
+    match = re.search(r'(?:section|part)\s*(\d+)', str(section_label), re.IGNORECASE)
+    if not match or int(match.group(1)) not in WORD_COUNT_RANGES:
+        return (0, 99999)
+    low, high = WORD_COUNT_RANGES[int(match.group(1))]
+    if question_count:
+        share = min(int(question_count), QUESTIONS_PER_PART) / QUESTIONS_PER_PART
+        low, high = round(low * share), round(high * share)
+    return (low, high)
+
+def normalise_transcript(text):
+    if isinstance(text, list):
+        text = " ".join(map(str, text))
+    return str(text) if text else ""
+
+# Scores transcripts against the four reward metrics.
+# The vocabulary set is built once, each transcript is tokenised once and the similarity of
+# a whole batch is one query against the similarity index.
+class RewardScorer:
+    def __init__(self, common_words, similarity_index):
+        self.common_vocab = set(str(w).lower() for w in common_words if isinstance(w, str))
+        self.similarity_index = similarity_index
+
+    def tokenize(self, text):
+        return [w.lower() for w in WORD_PATTERN.findall(text)]
+
+    def readability(self, text):
+        return textstat.flesch_reading_ease(text)
+
+    def uncommon_ratio(self, words):
+        if not words: return 0
+        uncommon = sum(1 for w in words if w not in self.common_vocab)
+        return uncommon / len(words)
+
+    # candidates: list of (transcript, section_label) or (transcript, section_label, question_count),
+    # returns one breakdown dict per candidate
+    def score_batch(self, candidates):
+        candidates = [tuple(c) + (None,) * (3 - len(c)) for c in candidates]
+        texts = [normalise_transcript(c[0]) for c in candidates]
+        words = [self.tokenize(text) for text in texts]
+
+        # The TF-IDF analyzer keeps tokens of two or more characters
+        similarities = self.similarity_index.max_similarity_batch(
+            texts, [[w for w in ws if len(w) > 1] for ws in words]
+        ) if texts else []
+
+        results = []
+        for (_, section_label, question_count), text, ws, similarity in zip(candidates, texts, words, similarities):
+            low, high = expected_word_range(section_label, question_count)
+            breakdown = {
+                "readability": self.readability(text),
+                "word_count": len(ws),
+                "uncommon_ratio": self.uncommon_ratio(ws),
+                "similarity": similarity
+            }
+            breakdown["checks"] = {
+                "readability": breakdown["readability"] >= READABILITY_MIN,
+                "word_count": bool(text) and low <= len(ws) <= high,
+                "uncommon_ratio": breakdown["uncommon_ratio"] >= UNCOMMON_RATIO_MIN,
+                "similarity": similarity <= SIMILARITY_MAX
+            }
+            breakdown["reward"] = sum(breakdown["checks"].values())
+            results.append(breakdown)
+        return results
+
+    def score(self, text, section_label, question_count=None):
+        return self.score_batch([(text, section_label, question_count)])[0]
+
+# Transcripts of the given length the word-count check must judge as expected:
+# (section label, question count, words, passes)
+CHECKS = [
+    ("Part 1", 10, 600, True),
+    ("Part 1", 5, 300, True),
+    ("Part 1", 5, 600, False),
+    ("Part 3", 5, 450, True),
+    ("Part 3", 5, 900, False),
+    ("Section 4", 10, 1100, True),
+    ("Part 4", 5, 400, False),
+    ("Part 2", None, 700, True)
+]
+
+# python -m services.reward_scorer
+if __name__ == "__main__":
+    class NoSimilarity:
+        def max_similarity_batch(self, texts, token_lists=None):
+            return [0.0] * len(texts)
+
+    # Only the word count is checked; readability needs the NLTK data textstat downloads
+    scorer = RewardScorer([], NoSimilarity())
+    scorer.readability = lambda text: READABILITY_MIN
+    failed = 0
+    for label, count, length, expected in CHECKS:
+        passed = scorer.score(" ".join(["word"] * length), label, count)["checks"]["word_count"]
+        failed += passed != expected
+        print(f"{'ok' if passed == expected else 'FAIL':4s} {label}, {count} questions, {length} words: {passed} (expected {expected}, range {expected_word_range(label, count)})")
+    raise SystemExit(1 if failed else 0)
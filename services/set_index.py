@@ -0,0 +1,279 @@
+# Import necessary libraries
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from services.jobs import JOB_DATA_DIR
+
+# Index of the generated sets in static/output.
+# Set numbers come from a counter taken inside a write transaction, so concurrent generations never
+# get the same number. Each set has a manifest.json (files with sizes and hashes, creation time,
+# generation parameters) mirrored in the index, so the latest / next set is found without listing
+# static/output. Sets created before the index existed are indexed once, the first time it is opened.
+# The history is served from the index too, a page at a time, filtered by user, date or theme.
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+OUTPUT_ROOT = os.path.join(BASE_DIR, "static", "output")
+SET_INDEX_DB = os.getenv("SET_INDEX_DB", os.path.join(JOB_DATA_DIR, "sets.sqlite3"))
+MANIFEST_NAME = "manifest.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sets (
+    num INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    user_id TEXT,
+    files TEXT,
+    params TEXT
+);
+CREATE INDEX IF NOT EXISTS sets_status ON sets (status, num);
+CREATE INDEX IF NOT EXISTS sets_user ON sets (user_id, num);
+CREATE INDEX IF NOT EXISTS sets_created ON sets (created);
+CREATE TABLE IF NOT EXISTS set_themes (
+    theme TEXT NOT NULL,
+    num INTEGER NOT NULL,
+    PRIMARY KEY (theme, num)
+);
+"""
+
+def set_name(num):
+    return f"set{num}"
+
+def params_themes(params):
+    themes = ((params or {}).get("section_choices") or {}).get("Themes") or []
+    return sorted({str(t).strip() for t in themes if str(t).strip()})
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# {file name: {size, mtime, sha256}} for a set folder; unchanged files keep their previous hash
+def describe_files(folder, previous=None):
+    previous = previous or {}
+    files = {}
+    for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+        if not entry.is_file() or entry.name == MANIFEST_NAME or ".tmp" in entry.name or entry.name.startswith("."):
+            continue
+        st = entry.stat()
+        known = previous.get(entry.name)
+        if known and known.get("size") == st.st_size and known.get("mtime") == st.st_mtime:
+            files[entry.name] = known
+        else:
+            files[entry.name] = {"size": st.st_size, "mtime": st.st_mtime, "sha256": file_sha256(entry.path)}
+    return files
+
+class SetIndex:
+    def __init__(self, path=SET_INDEX_DB, output_root=OUTPUT_ROOT):
+        self.path = path
+        self.output_root = output_root
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        os.makedirs(output_root, exist_ok=True)
+        self.conn().executescript(SCHEMA)
+        self.bootstrap()
+        self.index_themes()
+
+    # One connection per thread; autocommit, transactions are opened explicitly
+    def conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def folder(self, name):
+        return os.path.join(self.output_root, name)
+
+    def to_dict(self, row):
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["files"] = json.loads(entry["files"]) if entry["files"] else {}
+        entry["params"] = json.loads(entry["params"]) if entry["params"] else {}
+        entry["folder"] = self.folder(entry["name"])
+        return entry
+
+    # First use: index the set folders that already exist and start the counter after them
+    def bootstrap(self):
+        if self.conn().execute("SELECT 1 FROM counters WHERE name = 'set'").fetchone():
+            return
+        existing = []
+        for entry in os.scandir(self.output_root):
+            match = re.fullmatch(r"set(\d+)", entry.name)
+            if match and entry.is_dir():
+                manifest = self.read_manifest(entry.name)
+                existing.append((
+                    int(match.group(1)), entry.name,
+                    manifest.get("created", entry.stat().st_ctime),
+                    manifest.get("user_id"),
+                    manifest.get("files") or describe_files(entry.path),
+                    manifest.get("params", {})
+                ))
+
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM counters WHERE name = 'set'").fetchone() is None:
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO sets (num, name, status, created, updated, user_id, files, params) "
+                    "VALUES (?, ?, 'complete', ?, ?, ?, ?, ?)",
+                    [(num, name, created, now, user_id, json.dumps(files), json.dumps(params)) for num, name, created, user_id, files, params in existing]
+                )
+                conn.execute("INSERT INTO counters (name, value) VALUES ('set', ?)", (max((e[0] for e in existing), default=0),))
+                conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('version', 1)")
+                print(f"[SETS] Indexed {len(existing)} existing set(s)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # Indexes created before themes were indexed: fill set_themes once from the stored parameters
+    def index_themes(self):
+        conn = self.conn()
+        if conn.execute("SELECT 1 FROM counters WHERE name = 'themes'").fetchone():
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM counters WHERE name = 'themes'").fetchone() is None:
+                for row in conn.execute("SELECT num, params FROM sets").fetchall():
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO set_themes (theme, num) VALUES (?, ?)",
+                        [(theme, row["num"]) for theme in params_themes(json.loads(row["params"] or "{}"))]
+                    )
+                conn.execute("INSERT INTO counters (name, value) VALUES ('themes', 1)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # Takes the next set number and creates its folder; returns (number, folder)
+    def allocate(self, params=None, user_id=None):
+        conn = self.conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'set'")
+            num = conn.execute("SELECT value FROM counters WHERE name = 'set'").fetchone()["value"]
+            conn.execute(
+                "INSERT INTO sets (num, name, status, created, updated, user_id, params) VALUES (?, ?, 'allocated', ?, ?, ?, ?)",
+                (num, set_name(num), now, now, user_id, json.dumps(params or {}, ensure_ascii=False))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        folder = self.folder(set_name(num))
+        os.makedirs(folder, exist_ok=True)
+        return num, folder
+
+    def read_manifest(self, name):
+        path = os.path.join(self.folder(name), MANIFEST_NAME)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # Describes the set's current files in its manifest and the index; call again when files are added
+    def record(self, num, params=None, user_id=None):
+        entry = self.get(num)
+        if entry is None:
+            raise KeyError(f"Set {num} was not allocated")
+        params = params if params is not None else entry["params"]
+        user_id = user_id if user_id is not None else entry["user_id"]
+        files = describe_files(entry["folder"], entry["files"])
+
+        manifest = {"set": entry["name"], "created": entry["created"], "user_id": user_id, "params": params, "files": files}
+        path = os.path.join(entry["folder"], MANIFEST_NAME)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE sets SET status = 'complete', updated = ?, user_id = ?, files = ?, params = ? WHERE num = ?",
+                (time.time(), user_id, json.dumps(files), json.dumps(params, ensure_ascii=False), num)
+            )
+            conn.execute("DELETE FROM set_themes WHERE num = ?", (num,))
+            conn.executemany("INSERT INTO set_themes (theme, num) VALUES (?, ?)", [(theme, num) for theme in params_themes(params)])
+            conn.execute("INSERT INTO counters (name, value) VALUES ('version', 1) ON CONFLICT(name) DO UPDATE SET value = value + 1")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return manifest
+
+    def get(self, num):
+        return self.to_dict(self.conn().execute("SELECT * FROM sets WHERE num = ?", (num,)).fetchone())
+
+    def get_by_name(self, name):
+        return self.to_dict(self.conn().execute("SELECT * FROM sets WHERE name = ?", (name,)).fetchone())
+
+    def latest(self):
+        return self.to_dict(self.conn().execute("SELECT * FROM sets WHERE status = 'complete' ORDER BY num DESC LIMIT 1").fetchone())
+
+    def next_number(self):
+        return self.conn().execute("SELECT value FROM counters WHERE name = 'set'").fetchone()["value"] + 1
+
+    # Changes whenever a set is completed or its files change
+    def version(self):
+        row = self.conn().execute("SELECT value FROM counters WHERE name = 'version'").fetchone()
+        return row["value"] if row else 0
+
+    # Completed sets, newest first, after the cursor (a set number); returns (sets, next cursor or None)
+    def history(self, limit=50, cursor=None, user_id=None, since=None, until=None, theme=None):
+        query = "SELECT sets.* FROM sets"
+        where, params = ["status = 'complete'"], []
+        if theme:
+            query += " JOIN set_themes ON set_themes.num = sets.num AND set_themes.theme = ?"
+            params.append(theme)
+        if cursor is not None:
+            where.append("sets.num < ?")
+            params.append(cursor)
+        if user_id is not None:
+            where.append("user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            where.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created < ?")
+            params.append(until)
+        query += f" WHERE {' AND '.join(where)} ORDER BY sets.num DESC LIMIT ?"
+        rows = self.conn().execute(query, params + [limit + 1]).fetchall()
+        entries = [self.to_dict(row) for row in rows[:limit]]
+        next_cursor = entries[-1]["num"] if len(rows) > limit else None
+        return entries, next_cursor
+
+    def themes(self):
+        return [row["theme"] for row in self.conn().execute("SELECT DISTINCT theme FROM set_themes ORDER BY theme")]
+
+# One index per process, opened on first use
+set_index_instance = None
+set_index_lock = threading.Lock()
+
+def get_set_index():
+    global set_index_instance
+    with set_index_lock:
+        if set_index_instance is None:
+            set_index_instance = SetIndex()
+        return set_index_instance
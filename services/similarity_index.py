@@ -0,0 +1,398 @@
+# Import necessary libraries
+import os
+import json
+import threading
+import numpy as np
+import scipy.sparse as sp
+
+from collections import Counter
+from contextlib import contextmanager
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Bump when the vectorizer settings or the file layout change, old snapshots are then rebuilt
+INDEX_VERSION = 3
+
+# Fold buffered rows into the count matrix (and rewrite the snapshot) after this many appends
+COMPACT_EVERY = 64
+
+# Read transcripts from the generated questions JSON.
+# The file is {timestamp: [entries]}, older files may be a plain list of entries/strings.
+def load_generated_transcripts(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        saved_data = json.load(f)
+
+    items = []
+    if isinstance(saved_data, dict):
+        for value in saved_data.values():
+            items += value if isinstance(value, list) else [value]
+    elif isinstance(saved_data, list):
+        items = saved_data
+
+    texts = []
+    for item in items:
+        if isinstance(item, dict):
+            transcript = item.get("Transcript", "")
+        elif isinstance(item, str):
+            transcript = item
+        elif isinstance(item, list):
+            transcript = " ".join(map(str, item))
+        else:
+            continue
+        texts.append(normalise_text(transcript))
+    return texts
+
+def normalise_text(text):
+    if isinstance(text, list):
+        text = " ".join(map(str, text))
+    return str(text)
+
+# Exclusive lock on path across processes (the web process and every job worker share the log);
+# without fcntl only the threads of one process are kept apart
+@contextmanager
+def file_lock(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def file_signature(path):
+    if not os.path.exists(path):
+        return "missing"
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+# TF-IDF index over raw term counts. The document frequencies and the number of transcripts are kept
+# with the counts, so an appended transcript updates them like a refit would: the idf and the row norms
+# are recomputed from them before the next query, and stored rows and queries are always weighted with
+# the same idf. A batch of queries is two sparse mat-mat products of the counts against dense blocks.
+#
+# Scores are those of the old refit-per-query calculate_similarity (TfidfVectorizer over the corpus plus
+# the query, cosine similarity): same analyzer and smoothed idf, the query counts as one more document,
+# and the row norms are corrected for the idf of the query's terms. python -m services.similarity_index
+# builds on part of the shipped corpus, appends the rest and checks the scores against a refit.
+SIMILARITY_TOLERANCE = 1e-4
+
+class SimilarityIndex:
+    def __init__(self, terms, df, counts, meta):
+        self.terms = list(terms)
+        self.vocabulary = {t: i for i, t in enumerate(self.terms)}
+        self.df = np.asarray(df, dtype=np.float64)
+        self.counts = sp.csr_matrix(counts, dtype=np.float32)
+        self.meta = meta
+        self.pending = []
+        self.analyzer = TfidfVectorizer().build_analyzer()
+        self.lock = threading.Lock()
+        # idf, squared counts and squared row norms, recomputed after appends (see refresh)
+        self.idf = None
+        self.counts_sq = None
+        self.norms_sq = None
+        self.pending_sq = []
+        self.pending_norms_sq = []
+
+    @classmethod
+    def build(cls, texts, meta):
+        vectorizer = CountVectorizer()
+        counts = vectorizer.fit_transform(texts).tocsr()
+        terms = vectorizer.get_feature_names_out()
+        df = np.bincount(counts.indices, minlength=len(terms))
+        meta = dict(meta, n_docs=len(texts))
+        return cls(terms, df, counts, meta)
+
+    @property
+    def size(self):
+        return self.counts.shape[0] + len(self.pending)
+
+    # Smoothed idf as the old per-query fit gives it: the query is one more document, and df counts it
+    # for the query's own terms (in_query=1)
+    def query_idf(self, df, in_query=1):
+        return np.log((2 + self.meta.get("n_docs", 0)) / (1 + df + in_query)) + 1.0
+
+    # idf of every term for a query that does not contain it, and the norm of every stored row under it;
+    # the caller holds self.lock
+    def refresh(self):
+        if self.idf is not None:
+            return
+        self.idf = self.query_idf(self.df, in_query=0)
+        idf_sq = self.idf ** 2
+        # The squared counts only change when pending rows are folded in
+        if self.counts_sq is None:
+            self.counts_sq = self.counts.multiply(self.counts).tocsr()
+        self.norms_sq = self.counts_sq @ idf_sq
+        self.pending_sq = [row.multiply(row).tocsr() for row in self.pending]
+        self.pending_norms_sq = [(row_sq @ idf_sq[:row_sq.shape[1]])[0] for row_sq in self.pending_sq]
+
+    # In-vocabulary (columns, weights, idf) plus the squared weight of the out-of-vocabulary terms.
+    # Pre-split tokens (lowercased, 2+ characters, as the analyzer produces) can be passed instead of text.
+    # The caller holds self.lock and has called refresh.
+    def vectorize(self, text, tokens=None):
+        counts = Counter(self.analyzer(normalise_text(text)) if tokens is None else tokens)
+        cols, tfs, oov_sq = [], [], 0.0
+        oov_idf = self.query_idf(0)
+        for term, tf in counts.items():
+            idx = self.vocabulary.get(term)
+            if idx is None:
+                oov_sq += (tf * oov_idf) ** 2
+            else:
+                cols.append(idx)
+                tfs.append(tf)
+        cols = np.asarray(cols, dtype=np.int64)
+        idf = self.query_idf(self.df[cols])
+        return cols, np.asarray(tfs, dtype=np.float64) * idf, idf, oov_sq
+
+    # Raw count row of text, adding its new terms to the vocabulary; the caller holds self.lock
+    def row_for(self, text):
+        counts = Counter(self.analyzer(normalise_text(text)))
+        new_terms = [t for t in counts if t not in self.vocabulary]
+        if new_terms:
+            for term in new_terms:
+                self.vocabulary[term] = len(self.terms)
+                self.terms.append(term)
+            self.df = np.concatenate([self.df, np.zeros(len(new_terms))])
+            self.counts.resize((self.counts.shape[0], len(self.terms)))
+            if self.counts_sq is not None:
+                self.counts_sq.resize(self.counts.shape)
+        cols = np.asarray([self.vocabulary[t] for t in counts], dtype=np.int64)
+        vals = np.asarray(list(counts.values()), dtype=np.float32)
+        return sp.csr_matrix((vals, (np.zeros(len(cols), dtype=np.int64), cols)), shape=(1, len(self.terms)))
+
+    def max_similarity(self, text, tokens=None):
+        return self.max_similarity_batch([text], [tokens])[0]
+
+    # Score several queries with one sparse mat-mat product (V x k dense query block)
+    def max_similarity_batch(self, texts, token_lists=None):
+        token_lists = token_lists or [None] * len(texts)
+        best = np.zeros(len(texts), dtype=np.float32)
+
+        # Under the lock, appends change the vocabulary and the idf
+        with self.lock:
+            if not len(texts) or not len(self.terms):
+                return best.astype(float).tolist()
+            self.refresh()
+            # Query weights times the idf, so the raw counts come out as tf-idf dot products, and the
+            # change of the squared idf on the query's terms, which the row norms are corrected by
+            queries = np.zeros((len(self.terms), len(texts)), dtype=np.float32)
+            shifts = np.zeros((len(self.terms), len(texts)), dtype=np.float32)
+            for j, (text, tokens) in enumerate(zip(texts, token_lists)):
+                cols, vals, idf, oov_sq = self.vectorize(text, tokens)
+                norm = np.sqrt(np.sum(vals ** 2) + oov_sq)
+                if norm > 0 and len(cols):
+                    queries[cols, j] = vals / norm * idf
+                    shifts[cols, j] = idf ** 2 - self.idf[cols] ** 2
+
+            if self.counts.shape[0]:
+                norms_sq = self.norms_sq[:, None] + self.counts_sq @ shifts
+                best = np.maximum(best, scaled_max(self.counts @ queries, norms_sq))
+            # Pending rows are as wide as the vocabulary was when they were added
+            for row, row_sq, norm_sq in zip(self.pending, self.pending_sq, self.pending_norms_sq):
+                width = row.shape[1]
+                best = np.maximum(best, scaled_max(row @ queries[:width], norm_sq + row_sq @ shifts[:width]))
+        return best.astype(float).tolist()
+
+    # Append an accepted transcript, counting it towards the document frequencies
+    def add(self, text):
+        with self.lock:
+            row = self.row_for(text)
+            self.df[row.indices] += 1
+            self.meta["n_docs"] = self.meta.get("n_docs", 0) + 1
+            self.pending.append(row)
+            self.idf = None
+            if len(self.pending) >= COMPACT_EVERY:
+                self.compact()
+        return row
+
+    def compact(self):
+        if not self.pending:
+            return
+        width = len(self.terms)
+        for row in self.pending:
+            row.resize((1, width))
+        self.counts = sp.vstack([self.counts] + self.pending, format="csr")
+        self.pending = []
+        self.idf = None
+        self.counts_sq = None
+
+    def save(self, path):
+        with self.lock:
+            self.compact()
+            csr = self.counts
+            df = self.df.copy()
+            meta = json.dumps(self.meta)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            data=csr.data, indices=csr.indices, indptr=csr.indptr, shape=np.asarray(csr.shape),
+            df=df, terms=np.asarray(self.terms, dtype=str), meta=np.asarray(meta)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            counts = sp.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+            return cls(f["terms"].tolist(), f["df"], counts, json.loads(str(f["meta"])))
+
+# Per-query max of dot products divided by the row norms (rows x queries, rows without weight score 0)
+def scaled_max(dots, norms_sq):
+    dots = np.asarray(dots, dtype=np.float64)
+    norms = np.sqrt(np.maximum(np.asarray(norms_sq, dtype=np.float64), 0))
+    scaled = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+    return scaled.max(axis=0).astype(np.float32)
+
+# Index over the training transcripts, the generated JSON and the app's append log.
+# The snapshot is reused while the version stamp matches, new log lines are replayed on top of it.
+# Several processes append to the log: a snapshot records the byte offset of the log it includes, and
+# appends and saves hold a lock on the log, so a snapshot never claims lines it does not contain. Lines
+# other processes appended are read from the log before scoring.
+class PersistentSimilarityIndex:
+    def __init__(self, index_path, log_path, training_df, training_csv, generated_json):
+        self.index_path = index_path
+        self.log_path = log_path
+        self.training_df = training_df
+        self.training_csv = training_csv
+        self.generated_json = generated_json
+        self.lock_path = log_path + ".lock"
+        self.lock = threading.Lock()
+        self.unsaved = 0
+        self.index = self.load_or_build()
+
+    def stamp(self):
+        return f"v{INDEX_VERSION}:{file_signature(self.training_csv)}:{file_signature(self.generated_json)}"
+
+    # Complete lines of the log from a byte offset, and the offset after them
+    def read_log(self, offset=0):
+        if not os.path.exists(self.log_path):
+            return [], 0
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # A line still being written by another process is left for the next read
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].decode("utf-8").splitlines()
+        return [json.loads(line) for line in lines if line.strip()], offset + end
+
+    def source_texts(self):
+        texts = []
+        if "transcript" in self.training_df.columns:
+            texts += self.training_df["transcript"].dropna().astype(str).tolist()
+        texts += load_generated_transcripts(self.generated_json)
+        return texts
+
+    def load_or_build(self):
+        with file_lock(self.lock_path):
+            return self.load_or_build_locked()
+
+    def load_or_build_locked(self):
+        stamp = self.stamp()
+
+        if os.path.exists(self.index_path):
+            try:
+                index = SimilarityIndex.load(self.index_path)
+                if index.meta.get("stamp") == stamp:
+                    logged, offset = self.read_log(index.meta.get("log_offset", 0))
+                    for text in logged:
+                        index.add(text)
+                    index.meta["log_offset"] = offset
+                    if logged:
+                        index.save(self.index_path)
+                    return index
+                print("[SIMILARITY] Index stamp changed, rebuilding.")
+            except Exception as e:
+                print(f"[SIMILARITY] Could not load index ({e}), rebuilding.")
+
+        logged, offset = self.read_log()
+        texts = self.source_texts() + logged
+        meta = {"stamp": stamp, "log_offset": offset}
+        if texts:
+            index = SimilarityIndex.build(texts, meta)
+        else:
+            index = SimilarityIndex([], np.zeros(0), sp.csr_matrix((0, 0)), dict(meta, n_docs=0))
+        try:
+            index.save(self.index_path)
+        except Exception as e:
+            print(f"[SIMILARITY] Could not save index: {e}")
+        print(f"[SIMILARITY] Built index over {index.size} transcripts, {len(index.terms)} terms.")
+        return index
+
+    # Adds the lines appended to the log since the index last read it; the caller holds self.lock
+    def catch_up(self):
+        offset = self.index.meta.get("log_offset", 0)
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) <= offset:
+            return
+        logged, offset = self.read_log(offset)
+        for text in logged:
+            self.index.add(text)
+        self.index.meta["log_offset"] = offset
+        self.unsaved += len(logged)
+
+    def max_similarity(self, text, tokens=None):
+        return self.max_similarity_batch([text], [tokens])[0]
+
+    def max_similarity_batch(self, texts, token_lists=None):
+        with self.lock:
+            self.catch_up()
+        return self.index.max_similarity_batch(texts, token_lists)
+
+    # Record a newly accepted transcript in the append log and in the live index
+    def add(self, text):
+        text = normalise_text(text)
+        if not text.strip():
+            return
+        with self.lock, file_lock(self.lock_path):
+            self.catch_up()
+            with open(self.log_path, "ab") as f:
+                f.write((json.dumps(text, ensure_ascii=False) + "\n").encode("utf-8"))
+                offset = f.tell()
+            self.index.add(text)
+            self.index.meta["log_offset"] = offset
+            self.unsaved += 1
+            if self.unsaved >= COMPACT_EVERY:
+                self.index.save(self.index_path)
+                self.unsaved = 0
+
+# Check: build on half of the shipped corpus, append the rest (through a save and load), and compare
+# the max similarity of prefixes of the corpus, and of text not in it, with a refit per query
+TRAINING_CSV = "model_training/processed_data/training_set.csv"
+GENERATED_JSON = "model_training/generated_questions/generated_questions.json"
+
+def refit_max_similarity(docs, text):
+    from sklearn.metrics.pairwise import cosine_similarity
+    matrix = TfidfVectorizer().fit_transform(docs + [text])
+    return float(cosine_similarity(matrix[-1], matrix[:-1]).max())
+
+if __name__ == "__main__":
+    import tempfile
+    import pandas as pd
+
+    corpus = pd.read_csv(TRAINING_CSV)["transcript"].dropna().astype(str).tolist()
+    corpus += load_generated_transcripts(GENERATED_JSON)
+    half = len(corpus) // 2
+    index = SimilarityIndex.build(corpus[:half], {})
+    for text in corpus[half:half + len(corpus) // 4]:
+        index.add(text)
+    with tempfile.TemporaryDirectory() as folder:
+        index.save(os.path.join(folder, "index.npz"))
+        index = SimilarityIndex.load(os.path.join(folder, "index.npz"))
+    for text in corpus[half + len(corpus) // 4:]:
+        index.add(text)
+
+    queries = [text[:800] for text in corpus[::3]] + [text[:1500] + " zyxword" for text in corpus[1::5]]
+    queries += ["A completely unrelated sentence about quasars.", "zyxword"]
+    scores = index.max_similarity_batch(queries)
+    worst = max(abs(score - refit_max_similarity(corpus, query)) for score, query in zip(scores, queries))
+    failed = worst > SIMILARITY_TOLERANCE
+    print(f"{'FAIL' if failed else 'ok':4s} {len(queries)} queries against a refit over {len(corpus)} transcripts "
+          f"({half} built, {len(corpus) - half} appended): worst difference {worst:.6f}")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,35 @@
+# Import necessary libraries
+import io
+import numpy as np
+
+from services.disk_cache import DiskLRUCache
+
+def normalise_utterance(text):
+    return " ".join(str(text).split())
+
+# Synthesized utterances keyed by (normalised text, speaker, language, model, sample rate, synthesis path).
+# Audio is stored as int16 .npy, the same precision as the exported 16-bit WAVs.
+class UtteranceCache(DiskLRUCache):
+    def __init__(self, directory, max_bytes=500 * 1024 * 1024):
+        super().__init__(directory, max_bytes, suffix=".npy")
+
+    @staticmethod
+    def make_key(text, speaker, language, model_name, sample_rate, synthesis="tts"):
+        return DiskLRUCache.make_key(normalise_utterance(text), speaker, language, model_name, int(sample_rate), synthesis)
+
+    # Returns float32 samples in [-1, 1], or None on a miss
+    def get(self, key):
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        try:
+            samples = np.load(io.BytesIO(data), allow_pickle=False)
+        except Exception:
+            return None
+        return samples.astype(np.float32) / 32767.0
+
+    def put(self, key, samples):
+        pcm = (np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0) * 32767.0).astype(np.int16)
+        buffer = io.BytesIO()
+        np.save(buffer, pcm, allow_pickle=False)
+        self.put_bytes(key, buffer.getvalue())
@@ -0,0 +1,45 @@
+# Import necessary libraries
+import os
+import re
+import time
+import shutil
+
+from services.jobs import JOB_DATA_DIR
+
+# Per-generation workspaces.
+# A generation job writes its questions, preview files and audio under jobs/workspaces/<job id>/, and the
+# regeneration and audio jobs that follow it work in the same directory, so concurrent users never share
+# a temp file. Workspaces are removed after WORKSPACE_RETENTION_DAYS.
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", os.path.join(JOB_DATA_DIR, "workspaces"))
+WORKSPACE_RETENTION_DAYS = float(os.getenv("WORKSPACE_RETENTION_DAYS", 7))
+
+class Workspace:
+    def __init__(self, workspace_id, root=WORKSPACE_ROOT):
+        if not re.fullmatch(r"[0-9a-f]{32}", str(workspace_id)):
+            raise ValueError(f"Invalid workspace id: {workspace_id}")
+        self.id = workspace_id
+        self.path = os.path.join(root, workspace_id)
+        self.questions_path = os.path.join(self.path, "questions.json")
+        self.audio_dir = os.path.join(self.path, "audio")
+
+    def create(self):
+        os.makedirs(self.audio_dir, exist_ok=True)
+        return self
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+def prune_workspaces(root=WORKSPACE_ROOT, older_than_days=WORKSPACE_RETENTION_DAYS):
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - older_than_days * 86400
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -1,3 +1,5 @@
+import { waitForJob } from "./jobs.js";
+
 document.addEventListener('DOMContentLoaded', async () => {
     const select = document.querySelector('.question-set-select');
     const markBtn = document.getElementById('mark-btn');
@@ -7,16 +9,20 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     // Load available sets
     try {
-        const res = await fetch('/api/get-history');
-        const data = await res.json();
-        if (data.success) {
+        // The history is paged; follow next_cursor until every set is listed
+        let cursor = null;
+        do {
+            const res = await fetch(`/api/get-history?limit=200${cursor ? `&cursor=${cursor}` : ''}`);
+            const data = await res.json();
+            if (!data.success) break;
             data.history.forEach(item => {
                 const option = document.createElement('option');
                 option.value = item.folder_name;
                 option.textContent = item.folder_name.toUpperCase();
                 select.appendChild(option);
             });
-        }
+            cursor = data.next_cursor;
+        } while (cursor);
     } catch (err) {
         console.error('Failed to load sets', err);
     }
@@ -44,7 +50,8 @@ document.addEventListener('DOMContentLoaded', async () => {
                 method: 'POST',
                 body: formData
             });
-            const result = await res.json();
+            const job = await res.json();
+            const result = job.success ? await waitForJob(job.job_id).then(r => ({ success: true, ...r }), err => ({ success: false, error: err.message })) : job;
 
             if (result.success) {
                 // Show PDF in iframe
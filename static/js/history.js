@@ -2,31 +2,25 @@ document.addEventListener('DOMContentLoaded', async () => {
     const historyList = document.getElementById('history-list');
     const template = document.getElementById('history-card-template');
 
-    try {
-        const response = await fetch('/api/get-history');
+    // One page of sets at a time; "Load more" fetches the page after next_cursor
+    const loadMoreBtn = document.createElement('button');
+    loadMoreBtn.className = 'btn-primary load-more';
+    loadMoreBtn.innerText = 'Load more';
+
+    async function loadPage(cursor) {
+        const params = new URLSearchParams(window.location.search);
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/api/get-history?${params}`);
         const result = await response.json();
 
         if (!result.success) {
             throw new Error(result.error || 'Failed to load history');
         }
+        return result;
+    }
 
-        if (result.history.length === 0) {
-            historyList.innerHTML = `
-                <div class="empty-history">
-                    <img src="../static/images/empty_box.png" alt="Empty" class="empty-icon">
-                    <h3>No Practice History Found</h3>
-                    <p>You haven’t saved any question sets yet.</p>
-                    <a href="/question-generator" class="btn-primary">
-                        Generate Your First Set
-                    </a>
-                </div>
-            `;
-            return;
-        }
-
-        historyList.innerHTML = '';
-
-        result.history.forEach(item => {
+    function renderItems(items) {
+        items.forEach(item => {
             const clone = template.content.cloneNode(true);
 
             clone.querySelector('.set-name').innerText = item.folder_name.toUpperCase();
@@ -64,6 +58,46 @@ document.addEventListener('DOMContentLoaded', async () => {
 
             historyList.appendChild(clone);
         });
+    }
+
+    function showLoadMore(nextCursor) {
+        loadMoreBtn.remove();
+        if (!nextCursor) return;
+        loadMoreBtn.onclick = async () => {
+            loadMoreBtn.disabled = true;
+            try {
+                const result = await loadPage(nextCursor);
+                renderItems(result.history);
+                showLoadMore(result.next_cursor);
+            } catch (error) {
+                console.error('History load error:', error);
+            } finally {
+                loadMoreBtn.disabled = false;
+            }
+        };
+        historyList.after(loadMoreBtn);
+    }
+
+    try {
+        const result = await loadPage();
+
+        if (result.history.length === 0) {
+            historyList.innerHTML = `
+                <div class="empty-history">
+                    <img src="../static/images/empty_box.png" alt="Empty" class="empty-icon">
+                    <h3>No Practice History Found</h3>
+                    <p>You haven’t saved any question sets yet.</p>
+                    <a href="/question-generator" class="btn-primary">
+                        Generate Your First Set
+                    </a>
+                </div>
+            `;
+            return;
+        }
+
+        historyList.innerHTML = '';
+        renderItems(result.history);
+        showLoadMore(result.next_cursor);
 
     } catch (error) {
         console.error('History load error:', error);
@@ -84,7 +118,7 @@ async function checkAudioStatus(taskId, setName) {
             clearInterval(interval);
             alert(`Audio for set ${setName} is ready!`);
             const audioLink = document.getElementById('download-audio');
-            audioLink.href = `/static/output/${setName}/full_set_audio.wav`;
+            audioLink.href = `/get_set_audio/${setName}`;
             audioLink.style.display = 'inline-block';
         } else if (data.status.startsWith("error")) {
             clearInterval(interval);
@@ -0,0 +1,21 @@
+// Polls /api/jobs/<id> until the job completes (resolves with its result) or fails (rejects)
+export async function waitForJob(jobId, { onProgress = null, interval = 1000 } = {}) {
+    while (true) {
+        const res = await fetch(`/api/jobs/${jobId}`);
+        const job = await res.json();
+
+        if (!res.ok) {
+            throw new Error(job.error || `Job ${jobId} not found`);
+        }
+        if (onProgress && job.progress) {
+            onProgress(job.progress);
+        }
+        if (job.status === "completed") {
+            return job.result;
+        }
+        if (job.status === "failed") {
+            throw new Error(job.error || "Job failed");
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
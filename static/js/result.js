@@ -1,3 +1,13 @@
+import { waitForJob } from "./jobs.js";
+
+// Generation job of this page; its files live in their own workspace on the server
+let generationJob = null;
+
+function jobUrl(path) {
+    if (!generationJob) return path;
+    return path + (path.includes("?") ? "&" : "?") + `job=${generationJob}`;
+}
+
 document.addEventListener("DOMContentLoaded", (e) => {
     const progressBar = document.getElementById("progress-bar");
     const progressPercent = document.getElementById("progress-percent");
@@ -42,6 +52,7 @@ document.addEventListener("DOMContentLoaded", (e) => {
         .then(response => {
             const reader = response.body.getReader();
             const decoder = new TextDecoder();
+            let buffer = "";
 
             function readStream() {
                 reader.read().then(({ done, value }) => {
@@ -55,8 +66,10 @@ document.addEventListener("DOMContentLoaded", (e) => {
                         return;
                     }
 
-                    const chunk = decoder.decode(value);
-                    const lines = chunk.split('\n');
+                    // Keep any incomplete line for the next chunk
+                    buffer += decoder.decode(value, { stream: true });
+                    const lines = buffer.split('\n');
+                    buffer = lines.pop();
 
                     for (const line of lines) {
                         if (line.startsWith('data: ')) {
@@ -82,6 +95,10 @@ document.addEventListener("DOMContentLoaded", (e) => {
     }
 
     function updateProgress(data) {
+        if (data.job_id) {
+            generationJob = data.job_id;
+        }
+
         if (data.progress !== undefined) {
             progressBar.style.width = `${data.progress}%`;
             progressPercent.textContent = `${data.progress}%`;
@@ -105,11 +122,13 @@ document.addEventListener("DOMContentLoaded", (e) => {
             method: "POST",
             headers: {
                 "Content-Type": "application/json"
-            }
+            },
+            body: JSON.stringify({ job: generationJob })
         })
         .then(response => response.json())
         .then(data => {
             if (data.task_id) {
+                attachStreamingAudio();
                 pollAudioStatus(data.task_id);
             }
         })
@@ -118,23 +137,29 @@ document.addEventListener("DOMContentLoaded", (e) => {
         });
     }
 
+    // Parts can be played while they are still being synthesized
+    function attachStreamingAudio() {
+        document.querySelectorAll(".editor-group").forEach(group => {
+            const i = group.dataset.part;
+            const audioBtn = group.querySelector(".audio-icon-btn");
+            const player = group.querySelector(".mini-player");
+            const audio = player.querySelector("audio");
+            const audioSource = player.querySelector("source");
+
+            audio.preload = "none";
+            audioSource.src = jobUrl(`/stream_audio/${i}?ts=${Date.now()}`);
+            audio.load();
+            audioBtn.style.display = "";
+            audioBtn.onclick = () => {
+                player.style.display = player.style.display === "none" ? "block" : "none";
+            };
+        });
+    }
+
     function pollAudioStatus(taskId) {
-        const checkInterval = setInterval(() => {
-            fetch(`/api/check-audio-status/${taskId}`)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.status === "completed") {
-                        clearInterval(checkInterval);
-                        showAudioNotification("Audio generation completed successfully!");
-                    } else if (data.status === "error") {
-                        clearInterval(checkInterval);
-                        showAudioNotification(`Audio generation failed: ${data.error}`, true);
-                    }
-                })
-                .catch(error => {
-                    console.error("Error checking audio status:", error);
-                });
-        }, 2000);
+        waitForJob(taskId, { interval: 2000 })
+            .then(() => showAudioNotification("Audio generation completed successfully!"))
+            .catch(error => showAudioNotification(`Audio generation failed: ${error.message}`, true));
     }
 
     function showAudioNotification(message, isError = false) {
@@ -195,7 +220,7 @@ document.addEventListener("DOMContentLoaded", (e) => {
             const audioSource = clone.querySelector("source");
 
             if (generateWithAudio) {
-                audioSource.src = `/get_audio/${i}`;
+                audioSource.src = jobUrl(`/get_audio/${i}`);
                 audioBtn.onclick = () => {
                     player.style.display = player.style.display === "none" ? "block" : "none";
                 };
@@ -219,7 +244,7 @@ document.addEventListener("DOMContentLoaded", (e) => {
         }
 
         const pdfFrame = document.getElementById("pdf-frame");
-        pdfFrame.src = "/generate_pdf_preview"; 
+        pdfFrame.src = jobUrl("/generate_pdf_preview");
     }
 });
 
@@ -273,11 +298,15 @@ async function saveAllChanges() {
                     const resp = await fetch('/api/regenerate-part', {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ part: parseInt(e.part), spec: e.spec })
+                        body: JSON.stringify({ part: parseInt(e.part), spec: e.spec, job: generationJob })
                     });
                     const json = await resp.json().catch(() => ({}));
                     if (!resp.ok || !json.success) {
                         alert('Regeneration failed for part ' + e.part + ': ' + (json.error || 'Unknown'));
+                    } else {
+                        await waitForJob(json.job_id).catch(err => {
+                            alert('Regeneration failed for part ' + e.part + ': ' + err.message);
+                        });
                     }
                 } catch (err) {
                     console.error('Regenerate error:', err);
@@ -286,13 +315,13 @@ async function saveAllChanges() {
 
             // Refresh preview PDF and audio sources
             const pdfFrame = document.getElementById('pdf-frame');
-            pdfFrame.src = '/generate_pdf_preview?ts=' + Date.now();
+            pdfFrame.src = jobUrl('/generate_pdf_preview?ts=' + Date.now());
 
             // Refresh audio sources for parts that exist
             for (let i = 1; i <= 4; i++) {
                 const audioEl = document.querySelector(`.editor-group[data-part='${i}'] .mini-player source`);
                 if (audioEl) {
-                    audioEl.src = `/get_audio/${i}?ts=${Date.now()}`;
+                    audioEl.src = jobUrl(`/get_audio/${i}?ts=${Date.now()}`);
                     const player = audioEl.closest('.mini-player');
                     if (player) player.style.display = 'none';
                 }
@@ -303,7 +332,7 @@ async function saveAllChanges() {
         const response = await fetch('/api/download-files', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ files: selectedFiles })
+            body: JSON.stringify({ files: selectedFiles, job: generationJob })
         });
 
         if (!response.ok) {